@@ -0,0 +1,89 @@
+import time
+
+import re
+
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from backend import tracing
+from backend.metrics import REQUEST_DURATION, REQUESTS_IN_FLIGHT
+from config import conf
+
+
+def _get_route(scope: Scope) -> str:
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware(object):
+    """
+    Records the latency and the number of in-flight requests per route template. Requests that match no route are
+    recorded as route 'unmatched' so that requests of arbitrary paths do not create new time series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], _get_route(scope)
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # streamed responses (e.g. model downloads) are measured until the last chunk is sent
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            in_flight.dec()
+
+
+class TracingMiddleware(object):
+    """
+    Records a trace per request. If the request sets the X-Server-Timing header, the durations of the phases of the
+    request are returned in the Server-Timing header of the response (e.g. 'predictor.load_model;dur=153.2').
+    """
+    _metric_name_pattern = re.compile(r"[^A-Za-z0-9_.-]")
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not bool(conf.backend.tracing.enabled):
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], _get_route(scope)
+        server_timing = Headers(scope=scope).get("x-server-timing", "").lower() in ["1", "true"]
+
+        with tracing.trace(f"{method} {route}", **{"http.method": method, "http.route": route}) as t:
+            async def send_with_timing(message: Message):
+                if message["type"] == "http.response.start":
+                    t.root.attributes["http.status_code"] = message["status"]
+                    if server_timing:
+                        message.setdefault("headers", []).append((b"server-timing", self._server_timing(t)))
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+    @staticmethod
+    def _server_timing(t: tracing.Trace) -> bytes:
+        metrics = [f"{TracingMiddleware._metric_name_pattern.sub('_', name)};dur={duration:.1f}"
+                   for name, duration in t.phases()]
+        metrics.append(f"total;dur={t.root.duration_ms:.1f}")
+        return ", ".join(metrics).encode("latin-1")
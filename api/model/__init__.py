@@ -1,29 +1,57 @@
 from api.model.boolean_response import BooleanResponse
+from api.model.dataset_manifest import DatasetManifest, ManifestEntry
 from api.model.dataset_metadata import DatasetMetadata
+from api.model.dataset_statistics import DatasetStatistics, SplitStatistics, LengthStatistics
 from api.model.document_dto import DocumentDTO
-from api.model.model_config import ModelConfig, OptimizerIdentifier, ActivationFunctionIdentifier
+from api.model.embedding_metadata import EmbeddingMetadata
+from api.model.model_compaction import ModelCompaction, CompactionResult
+from api.model.model_config import ModelConfig, OptimizerIdentifier, ActivationFunctionIdentifier, \
+    EarlyStoppingMetric
 from api.model.model_metadata import ModelMetadata
-from api.model.prediction_request import PredictionRequest, MultiDocumentPredictionRequest
+from api.model.model_variant import ModelVariant
+from api.model.prediction_request import ProbabilityOutputOptions, PredictionRequest, MultiDocumentPredictionRequest
 from api.model.prediction_result import PredictionResult, MultiDocumentPredictionResult
+from api.model.profiling import ProfilingTarget, PythonProfiler, ProfilingRequest, ProfilingSession, ProfilingArtifact
 from api.model.string_response import StringResponse
 from api.model.tag_label_mapping import TagLabelMapping
+from api.model.training_performance import TrainingPerformance
 from api.model.training_request import TrainingRequest
 from api.model.training_response import TrainingResponse
 from api.model.training_status import TrainingState, TrainingStatus
+from api.model.upload_session import ChunkedUploadRequest, UploadSession
 
 __all__ = [DocumentDTO,
            TagLabelMapping,
+           ProbabilityOutputOptions,
            PredictionRequest,
            MultiDocumentPredictionRequest,
            PredictionResult,
            MultiDocumentPredictionResult,
            ModelMetadata,
+           ModelVariant,
+           ModelCompaction,
+           CompactionResult,
            BooleanResponse,
            StringResponse,
            TrainingRequest,
            ModelConfig,
            OptimizerIdentifier,
            ActivationFunctionIdentifier,
+           EarlyStoppingMetric,
            TrainingState,
            TrainingStatus,
-           DatasetMetadata]
+           DatasetMetadata,
+           DatasetManifest,
+           ManifestEntry,
+           DatasetStatistics,
+           SplitStatistics,
+           LengthStatistics,
+           EmbeddingMetadata,
+           TrainingPerformance,
+           ChunkedUploadRequest,
+           UploadSession,
+           ProfilingTarget,
+           PythonProfiler,
+           ProfilingRequest,
+           ProfilingSession,
+           ProfilingArtifact]
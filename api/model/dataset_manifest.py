@@ -0,0 +1,16 @@
+from typing import Dict
+
+from pydantic import BaseModel, Field
+
+
+class ManifestEntry(BaseModel):
+    sha256: str
+    size: int
+
+
+class DatasetManifest(BaseModel):
+    codebook_name: str
+    version: str
+    files: Dict[str, ManifestEntry]
+    content_hash: str = Field(description="Hash of the contents of all files. Datasets with the same content hash "
+                                          "share their derived artifacts.")
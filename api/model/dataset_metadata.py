@@ -1,6 +1,6 @@
-from typing import Dict
+from typing import Dict, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class DatasetMetadata(BaseModel):
@@ -9,3 +9,9 @@ class DatasetMetadata(BaseModel):
     labels: Dict[str, str]
     num_training_samples: int
     num_test_samples: int
+    label_counts: Optional[Dict[str, int]] = Field(default=None,
+                                                   description="Number of training samples per label")
+    is_valid: Optional[bool] = Field(default=None,
+                                     description="Result of the schema validation of the dataset")
+    content_hash: Optional[str] = Field(default=None,
+                                        description="Hash of the contents of the dataset files")
@@ -0,0 +1,35 @@
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class LengthStatistics(BaseModel):
+    min: int
+    mean: float
+    p50: int
+    p90: int
+    p95: int
+    p99: int
+    max: int
+
+
+class SplitStatistics(BaseModel):
+    num_samples: int
+    label_counts: Dict[str, int]
+    label_distribution: Dict[str, float] = Field(description="Fraction of samples per label")
+    char_lengths: LengthStatistics = Field(description="Lengths of the texts in characters")
+    token_lengths: LengthStatistics = Field(description="Lengths of the texts in whitespace separated tokens")
+    num_duplicates: int = Field(description="Number of samples whose text occurs more than once")
+    duplicate_rate: float
+
+
+class DatasetStatistics(BaseModel):
+    codebook_name: str
+    version: str
+    train: SplitStatistics
+    test: SplitStatistics
+    shared_labels: List[str] = Field(description="Labels that occur in the training and the test split")
+    train_only_labels: List[str]
+    test_only_labels: List[str]
+    num_test_samples_in_train: int = Field(description="Number of test samples whose text also occurs in the "
+                                                       "training split")
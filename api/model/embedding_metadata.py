@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+
+
+class EmbeddingMetadata(BaseModel):
+    handle: str = Field(description="The TF Hub handle (URL) of the embedding module",
+                        example="https://tfhub.dev/google/universal-sentence-encoder/2")
+    size: int = Field(description="Size of the locally stored module in bytes")
@@ -0,0 +1,15 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class ModelCompaction(BaseModel):
+    codebook_name: str
+    version: str
+    removed_checkpoints: int = Field(description="Number of removed training checkpoints")
+    bytes_freed: int
+
+
+class CompactionResult(BaseModel):
+    models: List[ModelCompaction]
+    bytes_freed: int
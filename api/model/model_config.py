@@ -26,6 +26,15 @@ class ActivationFunctionIdentifier(str, Enum):
     exponential: str = "exponential"
 
 
+class EarlyStoppingMetric(str, Enum):
+    """
+    Possible evaluation metrics of the DNNClassifier that can be monitored for early stopping
+    """
+    loss: str = "loss"
+    average_loss: str = "average_loss"
+    accuracy: str = "accuracy"
+
+
 class ModelConfig(BaseModel):
     embedding_type: str = Field(default="https://tfhub.dev/google/universal-sentence-encoder/2",
                                 example="https://tfhub.dev/google/universal-sentence-encoder/2")
@@ -33,4 +42,18 @@ class ModelConfig(BaseModel):
     dropout: float = Field(default=0.2, example=0.2)
     optimizer: OptimizerIdentifier = "Adam"
     early_stopping: bool = Field(default=False, example=False)
+    early_stopping_metric: EarlyStoppingMetric = Field(default=EarlyStoppingMetric.loss, example="loss",
+                                                       description="Validation metric that gets monitored.")
+    early_stopping_patience: int = Field(default=5, example=5,
+                                         description="Number of evaluations without improvement before the "
+                                                     "training gets stopped.")
+    early_stopping_min_delta: float = Field(default=0.0, example=0.001,
+                                            description="Minimum change of the monitored metric to count as "
+                                                        "an improvement.")
+    early_stopping_eval_interval: int = Field(default=500, example=500,
+                                              description="Number of training steps between two evaluations "
+                                                          "on the validation split.")
+    validation_split: float = Field(default=0.1, example=0.1,
+                                    description="Fraction of the training data that is held out as validation "
+                                                "split if early stopping is enabled.")
     activation_fn: ActivationFunctionIdentifier = "relu"
@@ -1,7 +1,10 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from pydantic import BaseModel
 
+from api.model.model_variant import ModelVariant
+from api.model.training_performance import TrainingPerformance
+
 
 class ModelMetadata(BaseModel):
     codebook_name: str
@@ -11,3 +14,8 @@ class ModelMetadata(BaseModel):
     model_type: str
     evaluation: Dict[str, float]
     model_config: Dict[Any, Any]
+    stopped_at_step: Optional[int] = None
+    best_step: Optional[int] = None
+    base_model_version: Optional[str] = None
+    performance: Optional[TrainingPerformance] = None
+    optimized_variant: Optional[ModelVariant] = None
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+
+
+class ModelVariant(BaseModel):
+    name: str = "optimized"
+    frozen: bool = Field(description="True if the variables are folded into constants of the graph")
+    preferred: bool = Field(description="True if the variant is stored and used for predictions instead of the "
+                                        "SavedModel")
+    num_samples: int = Field(description="Number of test samples used for the comparison with the SavedModel")
+    latency_ms: float = Field(description="Median latency of a single document prediction")
+    baseline_latency_ms: float
+    accuracy: float
+    baseline_accuracy: float
+    prediction_agreement: float = Field(description="Fraction of samples with the same predicted class as the "
+                                                    "SavedModel")
+    max_probability_deviation: float
@@ -1,19 +1,30 @@
 from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from api.model.document_dto import DocumentDTO
 from api.model.tag_label_mapping import TagLabelMapping
 
 
-class PredictionRequest(BaseModel):
+class ProbabilityOutputOptions(BaseModel):
+    top_k: Optional[int] = Field(default=None, ge=1, example=5,
+                                 description="Only return the probabilities of the k most probable tags of a "
+                                             "document. All probabilities are returned if not set.")
+    min_probability: Optional[float] = Field(default=None, ge=0.0, le=1.0, example=0.01,
+                                             description="Only return the probabilities that are at least this high. "
+                                                         "Can be combined with top_k.")
+    argmax_only: bool = Field(default=False,
+                              description="Only return the probability of the predicted tag of a document")
+
+
+class PredictionRequest(ProbabilityOutputOptions):
     doc: DocumentDTO
     cb_name: str
     mapping: TagLabelMapping = None
     model_version: Optional[str] = "default"
 
 
-class MultiDocumentPredictionRequest(BaseModel):
+class MultiDocumentPredictionRequest(ProbabilityOutputOptions):
     docs: List[DocumentDTO]
     cb_name: str
     mapping: Optional[TagLabelMapping] = None
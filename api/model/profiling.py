@@ -0,0 +1,44 @@
+from datetime import datetime
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class ProfilingTarget(str, Enum):
+    prediction: str = "prediction"
+    training: str = "training"
+
+
+class PythonProfiler(str, Enum):
+    cprofile: str = "cProfile"
+    pyinstrument: str = "pyinstrument"
+
+
+class ProfilingRequest(BaseModel):
+    cb_name: str = Field(example="MyCodebook")
+    model_version: str = Field(default="default", example="default")
+    target: ProfilingTarget = Field(default=ProfilingTarget.prediction,
+                                    description="Profile the next predictions with the model or the next training "
+                                                "of the model.")
+    num_predictions: int = Field(default=1, ge=1, example=1,
+                                 description="Number of the next predictions that get profiled. Only used if the "
+                                             "target is 'prediction'.")
+    python_profiler: PythonProfiler = Field(default=PythonProfiler.cprofile,
+                                            description="Profiler of the Python stacks. pyinstrument has to be "
+                                                        "installed separately.")
+    tensorflow_profiler: bool = Field(default=True, description="Capture a TensorFlow profiler trace of the graph "
+                                                                "side, which can be inspected with TensorBoard.")
+
+
+class ProfilingSession(BaseModel):
+    request: ProfilingRequest
+    remaining: int = Field(description="Number of the next predictions or trainings that still get profiled")
+
+
+class ProfilingArtifact(BaseModel):
+    name: str = Field(example="prediction_20210301-120000_4242")
+    target: ProfilingTarget
+    files: List[str] = Field(description="Files of the profile relative to its directory")
+    size: int = Field(description="Size of the files in bytes")
+    created: datetime
@@ -0,0 +1,18 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class TrainingPerformance(BaseModel):
+    phase_durations: Dict[str, float] = Field(description="Wall time in seconds per phase of the train-eval-export "
+                                                          "cycle (preparing, training, evaluating, exporting)")
+    train_steps: int = Field(description="Number of performed training steps")
+    steps_per_sec: float = Field(description="Training steps per second")
+    examples_per_sec: float = Field(description="Training examples per second")
+    peak_rss: int = Field(description="Peak resident set size of the training process in bytes. For data-parallel "
+                                      "trainings, the peak of the largest training process including the workers.")
+    model_size: int = Field(description="Size of the exported model in bytes")
+    num_workers: int = Field(default=1, description="Number of data-parallel training workers")
+    scaling_efficiency: Optional[float] = Field(default=None,
+                                                description="Training throughput of the workers relative to the "
+                                                            "throughput of as many independent single workers")
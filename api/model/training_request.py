@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 from api.model.model_config import ModelConfig
@@ -12,3 +14,11 @@ class TrainingRequest(BaseModel):
     batch_size_test: int = Field(default=32, example=32)
     max_steps_train: int = Field(default=100, example=10000)
     max_steps_test: int = Field(default=100, example=1000)
+    num_workers: int = Field(default=1, ge=1, example=1,
+                             description="Number of local worker processes for data-parallel training. Each "
+                                         "worker processes batches of batch_size_train per step.")
+    base_model_version: Optional[str] = Field(default=None, example=None,
+                                              description="Optional version of an existing model of the Codebook "
+                                                          "whose weights are used to warm-start the training. The "
+                                                          "base model has to share the label set and the "
+                                                          "architecture of the new model!")
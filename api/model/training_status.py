@@ -4,6 +4,8 @@ from pydantic import BaseModel
 
 
 class TrainingState(str, Enum):
+    # waiting for the worker service ('redis' worker mode)
+    queued: str = "queued"
     preparing: str = "preparing"
     training: str = "training"
     evaluating: str = "evaluating"
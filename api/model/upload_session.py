@@ -0,0 +1,24 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ChunkedUploadRequest(BaseModel):
+    cb_name: str = Field(description="The name of the Codebook. Case-sensitive!")
+    dataset_version: str = Field(default="default", example="default")
+    total_size: int = Field(description="Size of the dataset zip-archive in bytes")
+    chunk_size: int = Field(default=16 * 1024 * 1024, example=16 * 1024 * 1024,
+                            description="Size of the chunks in bytes. All chunks except the last have this size.")
+    checksum: Optional[str] = Field(default=None, description="Optional SHA-256 hex digest of the whole archive")
+
+
+class UploadSession(BaseModel):
+    upload_id: str = Field(description="Use this ID to upload the chunks and to resume or complete the upload!")
+    cb_name: str
+    dataset_version: str
+    total_size: int
+    chunk_size: int
+    num_chunks: int
+    checksum: Optional[str] = None
+    created: float = Field(description="Creation time of the upload session as UNIX timestamp")
+    received_chunks: List[int] = Field(default=[], description="Indices of the chunks that are already received")
@@ -3,7 +3,7 @@ from typing import List
 from fastapi import APIRouter, Form, UploadFile, File
 from loguru import logger as log
 
-from api.model import BooleanResponse, DatasetMetadata
+from api.model import BooleanResponse, DatasetMetadata, ChunkedUploadRequest, UploadSession, DatasetStatistics
 from backend.dataset_manager import DatasetManager
 
 PREFIX = "/dataset"
@@ -23,6 +23,40 @@ async def upload(cb_name: str = Form(..., description="The name of the Codebook.
     return DatasetManager.store_archive(cb_name, dataset_version, dataset_archive)
 
 
+@router.post("/upload/init/", response_model=UploadSession, tags=["dataset"])
+async def init_chunked_upload(req: ChunkedUploadRequest):
+    log.info(f"POST request on  {PREFIX}/upload/init/ with Codebook {req.cb_name}")
+    return DatasetManager.init_chunked_upload(req)
+
+
+# not async so that writing large chunks to disk runs in the threadpool instead of blocking the event loop
+@router.put("/upload/chunk/", response_model=UploadSession, tags=["dataset"])
+def upload_chunk(upload_id: str = Form(..., description="The ID of the upload session."),
+                 index: int = Form(..., description="The zero-based index of the chunk."),
+                 checksum: str = Form(..., description="SHA-256 hex digest of the chunk."),
+                 chunk: UploadFile = File(..., description="The chunk of the zip-archive.")):
+    log.info(f"PUT request on  {PREFIX}/upload/chunk/ with chunk {index} of upload <{upload_id}>")
+    return DatasetManager.store_upload_chunk(upload_id, index, checksum, chunk)
+
+
+@router.get("/upload/status/", response_model=UploadSession, tags=["dataset"])
+async def get_upload_status(upload_id: str):
+    log.info(f"GET request on  {PREFIX}/upload/status/ with upload <{upload_id}>")
+    return DatasetManager.get_upload_session(upload_id)
+
+
+@router.post("/upload/complete/", response_model=DatasetMetadata, tags=["dataset"])
+def complete_chunked_upload(upload_id: str):
+    log.info(f"POST request on  {PREFIX}/upload/complete/ with upload <{upload_id}>")
+    return DatasetManager.complete_chunked_upload(upload_id)
+
+
+@router.delete("/upload/abort/", response_model=BooleanResponse, tags=["dataset"])
+async def abort_chunked_upload(upload_id: str):
+    log.info(f"DELETE request on  {PREFIX}/upload/abort/ with upload <{upload_id}>")
+    return BooleanResponse(value=DatasetManager.abort_chunked_upload(upload_id))
+
+
 @router.get("/available/", response_model=BooleanResponse, tags=["dataset"])
 async def is_available(cb_name: str, dataset_version: str):
     log.info(f"POST request on  {PREFIX}/available/ with model version '{dataset_version}'for Codebook {cb_name}")
@@ -41,6 +75,12 @@ async def get_metadata(cb_name: str, dataset_version: str):
     return DatasetManager.get_metadata(cb_name, dataset_version)
 
 
+@router.get("/stats/", response_model=DatasetStatistics, tags=["dataset"])
+async def get_statistics(cb_name: str, dataset_version: str):
+    log.info(f"GET request on  {PREFIX}/stats/ with dataset version '{dataset_version}' for Codebook {cb_name}")
+    return DatasetManager.get_statistics(cb_name, dataset_version)
+
+
 @router.delete("/remove/", response_model=BooleanResponse, tags=["dataset"])
 async def remove(cb_name: str, dataset_version: str):
     log.info(f"DELETE request on  {PREFIX}/remove/ with model version '{dataset_version}'for Codebook {cb_name}")
@@ -0,0 +1,45 @@
+from typing import List
+
+from fastapi import APIRouter, Form, UploadFile, File
+from loguru import logger as log
+
+from api.model import BooleanResponse, EmbeddingMetadata
+from backend import EmbeddingManager
+
+PREFIX = "/embedding"
+router = APIRouter()
+
+
+# not async so that downloading the module runs in the threadpool instead of blocking the event loop
+@router.put("/register/", response_model=EmbeddingMetadata, tags=["embedding"])
+def register(handle: str = Form(..., description="The TF Hub handle (URL) of the embedding module. "
+                                                  "E.g. https://tfhub.dev/google/universal-sentence-encoder/2")):
+    log.info(f"PUT request on {PREFIX}/register/ with embedding module {handle}")
+    return EmbeddingManager.register(handle)
+
+
+# not async so that extracting the module runs in the threadpool instead of blocking the event loop
+@router.put("/upload/", response_model=EmbeddingMetadata, tags=["embedding"])
+def upload(handle: str = Form(..., description="The TF Hub handle (URL) under which the module gets "
+                                                "registered. Use the handle as embedding_type in the ModelConfig."),
+           module_archive: UploadFile = File(..., description="Zip- or tar(.gz)-archive of the module.")):
+    log.info(f"PUT request on {PREFIX}/upload/ with embedding module {handle}")
+    return EmbeddingManager.store_archive(handle, module_archive)
+
+
+@router.get("/available/", response_model=BooleanResponse, tags=["embedding"])
+async def is_available(handle: str):
+    log.info(f"GET request on {PREFIX}/available/ with embedding module {handle}")
+    return BooleanResponse(value=EmbeddingManager.is_available(handle))
+
+
+@router.get("/list/", response_model=List[EmbeddingMetadata], tags=["embedding"])
+async def list_embeddings():
+    log.info(f"GET request on {PREFIX}/list/")
+    return EmbeddingManager.list_embeddings()
+
+
+@router.delete("/remove/", response_model=BooleanResponse, tags=["embedding"])
+async def remove(handle: str):
+    log.info(f"DELETE request on {PREFIX}/remove/ with embedding module {handle}")
+    return BooleanResponse(value=EmbeddingManager.remove(handle))
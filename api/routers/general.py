@@ -1,8 +1,11 @@
-from fastapi import APIRouter
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import RedirectResponse, Response
 from loguru import logger as log
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 
 from api.model import BooleanResponse
+from backend import JobBroker
+from config import conf
 
 router = APIRouter()
 
@@ -13,6 +16,29 @@ async def heartbeat():
     return BooleanResponse(value=True)
 
 
+@router.get("/ready", response_model=BooleanResponse, tags=["general"],
+            responses={503: {"model": BooleanResponse}},
+            description="Whether the API is ready to serve requests, i.e. it started and (in the 'redis' worker mode) "
+                        "the prediction workers preloaded and warmed up their models. Responds with status 503 if not.")
+def ready(request: Request, response: Response):
+    # probes are frequent, so they are not logged on INFO level
+    log.debug("GET request on /ready")
+    is_ready = getattr(request.app.state, "started", False)
+    if is_ready and conf.backend.workers.mode == "redis":
+        is_ready = JobBroker().are_prediction_workers_ready()
+    if not is_ready:
+        response.status_code = 503
+    return BooleanResponse(value=is_ready)
+
+
+@router.get("/metrics", response_class=Response, tags=["general"],
+            description="Metrics of the API, the predictions and the trainings in the Prometheus text format")
+def metrics():
+    # scrapes are frequent, so they are not logged on INFO level
+    log.debug("GET request on /metrics")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @router.get("/", tags=["general"], description="Redirection to /docs")
 async def root_to_docs():
     log.info("GET request on / -> redirecting to /docs")
@@ -1,9 +1,11 @@
-from typing import Optional, List
+import re
+from typing import Optional, List, Tuple
 
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, Header, Query
+from fastapi.responses import StreamingResponse, Response
 from loguru import logger as log
 
-from api.model import BooleanResponse, StringResponse, ModelMetadata
+from api.model import BooleanResponse, StringResponse, ModelMetadata, CompactionResult
 from backend import ModelManager
 
 PREFIX = "/model"
@@ -44,6 +46,68 @@ async def upload(codebook_name: str = Form(..., description="The name of the Cod
     return StringResponse(value=ModelManager.store_uploaded_model(codebook_name, model_version, model_archive))
 
 
+@router.get("/download/", response_class=StreamingResponse, tags=["model"],
+            responses={200: {"content": {"application/zip": {}}},
+                       206: {"description": "The requested byte range of the archive"},
+                       416: {"description": "The requested byte range is not satisfiable"}})
+def download(cb_name: str,
+             model_version: Optional[str] = "default",
+             serving_only: bool = Query(True, description="If true, training checkpoints and event files are not "
+                                                          "part of the archive."),
+             range_header: Optional[str] = Header(None, alias="Range"),
+             if_range: Optional[str] = Header(None)):
+    log.info(f"GET request on {PREFIX}/download with model version '{model_version}'for Codebook {cb_name}")
+    archive = ModelManager.get_archive(cb_name, model_version=model_version, serving_only=serving_only)
+
+    headers = {"Accept-Ranges": "bytes",
+               "ETag": archive.etag,
+               "Content-Disposition": f'attachment; filename="{cb_name}_{model_version}.zip"'}
+
+    # a range of an outdated archive must not be combined with the rest of a newer archive
+    byte_range = None
+    if range_header is not None and (if_range is None or if_range == archive.etag):
+        byte_range = _parse_range(range_header, archive.size)
+        if byte_range is not None and byte_range[0] >= byte_range[1]:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{archive.size}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(archive.size)
+        return StreamingResponse(archive.iter_range(), media_type="application/zip", headers=headers)
+
+    start, stop = byte_range
+    headers["Content-Length"] = str(stop - start)
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{archive.size}"
+    return StreamingResponse(archive.iter_range(start, stop), status_code=206, media_type="application/zip",
+                             headers=headers)
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single byte range ('bytes=<first>-<last>', 'bytes=<first>-' or 'bytes=-<suffix length>')
+    :return: the range as [start, stop), which is empty if the range is not satisfiable, or None if the header is not
+    supported (e.g. multiple ranges) and has to be ignored
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", range_header)
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.group(1), match.group(2)
+    if first == "":
+        start, stop = max(size - int(last), 0), size
+    else:
+        start = int(first)
+        stop = size if last == "" else min(int(last) + 1, size)
+        if last != "" and int(last) < start:
+            return None
+    return start, stop
+
+
+@router.post("/compact/", response_model=CompactionResult, tags=["model"])
+def compact(cb_name: Optional[str] = Query(None, description="The name of the Codebook whose models get compacted. "
+                                                             "If not provided, all models get compacted.")):
+    log.info(f"POST request on {PREFIX}/compact for Codebook {cb_name}")
+    return ModelManager.compact(cb_name)
+
+
 @router.delete("/remove/", response_model=BooleanResponse, tags=['model'])
 async def remove(cb_name: str, model_version: Optional[str] = "default"):
     log.info(
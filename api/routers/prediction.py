@@ -8,15 +8,16 @@ PREFIX = "/prediction"
 router = APIRouter()
 
 
+# the routes are no coroutines, because they block until the prediction process or prediction worker is done
 @router.post("/single", response_model=PredictionResult, tags=["prediction"])
-async def predict(req: PredictionRequest):
+def predict(req: PredictionRequest):
     log.info(f"POST request on %s/predict with %s" % (PREFIX, req.json()))
     predictor = Predictor()
     return predictor.predict(req)
 
 
 @router.post("/multiple", response_model=MultiDocumentPredictionResult, tags=["prediction"])
-async def predict_multi(req: MultiDocumentPredictionRequest):
+def predict_multi(req: MultiDocumentPredictionRequest):
     log.info(f"POST request on %s/predict_multi with %s" % (PREFIX, req.json()))
     predictor = Predictor()
     return predictor.predict(req)
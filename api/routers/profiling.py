@@ -0,0 +1,57 @@
+from typing import List
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from loguru import logger as log
+
+from api.model import BooleanResponse, ProfilingRequest, ProfilingSession, ProfilingTarget, ProfilingArtifact
+from backend import Profiler
+
+PREFIX = "/profiling"
+
+router = APIRouter()
+
+
+@router.post("/start/", response_model=ProfilingSession, tags=["profiling"],
+             description="Turns on profiling for the next predictions with a model or for the next training of a "
+                         "model. The profiles are stored next to the training.log of the model.")
+async def start(req: ProfilingRequest):
+    log.info(f"POST request on {PREFIX}/start with {req.json()}")
+    return Profiler.start_session(req)
+
+
+@router.delete("/cancel/", response_model=BooleanResponse, tags=["profiling"])
+async def cancel(cb_name: str, model_version: str, target: ProfilingTarget):
+    log.info(f"DELETE request on {PREFIX}/cancel with target '{target.value}' of model version '{model_version}' for "
+             f"Codebook {cb_name}")
+    return BooleanResponse(value=Profiler.cancel_session(target, cb_name, model_version))
+
+
+@router.get("/sessions/", response_model=List[ProfilingSession], tags=["profiling"])
+async def list_sessions():
+    log.info(f"GET request on {PREFIX}/sessions")
+    return Profiler.list_sessions()
+
+
+@router.get("/list/", response_model=List[ProfilingArtifact], tags=["profiling"])
+def list_profiles(cb_name: str, model_version: str):
+    log.info(f"GET request on {PREFIX}/list with model version '{model_version}' for Codebook {cb_name}")
+    return Profiler.list_profiles(cb_name, model_version)
+
+
+@router.get("/download/", response_class=StreamingResponse, tags=["profiling"],
+            responses={200: {"content": {"application/zip": {}}}})
+def download(cb_name: str, model_version: str, name: str):
+    log.info(f"GET request on {PREFIX}/download with profile '{name}' of model version '{model_version}' for "
+             f"Codebook {cb_name}")
+    archive = Profiler.get_archive(cb_name, model_version, name)
+    return StreamingResponse(archive.iter_range(), media_type="application/zip",
+                             headers={"Content-Length": str(archive.size),
+                                      "Content-Disposition": f'attachment; filename="{name}.zip"'})
+
+
+@router.delete("/remove/", response_model=BooleanResponse, tags=["profiling"])
+def remove(cb_name: str, model_version: str, name: str):
+    log.info(f"DELETE request on {PREFIX}/remove with profile '{name}' of model version '{model_version}' for "
+             f"Codebook {cb_name}")
+    return BooleanResponse(value=Profiler.remove(cb_name, model_version, name))
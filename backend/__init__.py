@@ -1,8 +1,11 @@
 from backend.data_handler import DataHandler
 from backend.dataset_manager import DatasetManager
+from backend.db.job_broker import JobBroker
 from backend.db.redis_handler import RedisHandler
+from backend.embedding_manager import EmbeddingManager
 from backend.model_manager import ModelManager
 from backend.predictor import Predictor
+from backend.profiler import Profiler
 from backend.training.model_factory import ModelFactory
 from backend.training.trainer import Trainer
 
@@ -12,4 +15,7 @@ __all__ = [ModelManager,
            ModelFactory,
            DataHandler,
            DatasetManager,
-           RedisHandler]
+           RedisHandler,
+           JobBroker,
+           EmbeddingManager,
+           Profiler]
@@ -1,14 +1,25 @@
+import hashlib
+import os
+import re
 import shutil
+import tarfile
+import time
+import uuid
 import zipfile
 from pathlib import Path
+from typing import List, BinaryIO, Tuple, Optional, Dict, Callable
 from zipfile import ZipFile
 
 from fastapi import UploadFile
 from loguru import logger as log
 
-from api.model import DatasetMetadata, ModelMetadata
+from api.model import DatasetMetadata, ModelMetadata, EmbeddingMetadata, UploadSession, DatasetStatistics, \
+    DatasetManifest, ManifestEntry, ModelCompaction
 from backend.exceptions import DatasetNotAvailableException, ModelNotAvailableException, NoDataForCodebookException, \
-    ErroneousDatasetException, ModelMetadataNotAvailableException, DatasetMetadataNotAvailableException, StoringError
+    ModelMetadataNotAvailableException, DatasetMetadataNotAvailableException, \
+    StoringError, EmbeddingNotAvailableException, ErroneousArchiveException, UploadSessionNotAvailableException, \
+    ErroneousUploadException, DatasetStatisticsNotAvailableException, ProfileNotAvailableException
+from backend.metrics import CACHE_EVENTS
 from config import conf
 
 
@@ -17,6 +28,20 @@ class DataHandler(object):
     _DATA_ROOT: Path = None
     _relative_dataset_directory: Path = Path("dataset/")
     _relative_model_directory: Path = Path("model/")
+    _relative_best_checkpoint_directory: Path = Path("best_checkpoint/")
+    _relative_optimized_model_directory: Path = Path("optimized/")
+    _relative_profile_directory: Path = Path("profiles/")
+    _relative_embedding_directory: Path = Path("_tfhub_modules/")
+    _relative_embedding_module_directory: Path = Path("module/")
+    _relative_upload_directory: Path = Path("_uploads/")
+    _relative_dataset_cache_directory: Path = Path("_cache/")
+    _relative_cas_object_directory: Path = Path("_cas/objects/")
+    _relative_cas_cache_directory: Path = Path("_cas/caches/")
+    # files of Estimator training checkpoints, e.g. model.ckpt-500.index or model.ckpt-500.data-00000-of-00001
+    _checkpoint_file_pattern = re.compile(r"model\.ckpt-(\d+)\.(index|meta|data-\d+-of-\d+)")
+    _COPY_BUFFER_SIZE: int = 1024 * 1024
+    # small members (e.g. CSV headers or zero padded files) have high compression ratios without being a threat
+    _RATIO_CHECK_MIN_SIZE: int = 1024 * 1024
     _redis = None
 
     def __new__(cls, *args, **kwargs):
@@ -48,22 +73,43 @@ class DataHandler(object):
         return model_dir
 
     @staticmethod
-    def store_dataset(cb_name: str, dataset_archive: UploadFile, dataset_version: str) -> Path:
+    def store_dataset(cb_name: str, dataset_archive: UploadFile, dataset_version: str,
+                      validate: Optional[Callable[[Path], None]] = None) -> Path:
+        """
+        Extracts a dataset archive into a staging directory and swaps it in as the dataset directory once it is
+        complete and valid, so that a failed upload never replaces a stored version of the dataset
+        :param validate: called with the staging directory before it gets swapped in. Raises if the dataset is
+               invalid. Files written into the staging directory (e.g. the metadata) are swapped in as well.
+        :return: the dataset directory
+        """
+        ds_dir = DataHandler._get_data_directory(cb_name, create=True).joinpath(
+            DataHandler._relative_dataset_directory, dataset_version)
+        staging_dir = DataHandler._create_staging_directory(ds_dir)
         try:
-            ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version, create=True)
-            dst = ds_dir.joinpath(dataset_archive.filename)
-            log.info(f"Extracting dataset archive to {str(dst)}")
-            archive_path = DataHandler._store_uploaded_file(dataset_archive, dst)
-            return DataHandler._extract_archive(archive=archive_path, dst=ds_dir)
+            log.info(f"Extracting dataset archive to {str(staging_dir)}")
+            files = DataHandler._extract_archive(archive=dataset_archive.file, dst=staging_dir,
+                                                 required_files=['train.csv', 'test.csv'])
+            DataHandler._store_dataset_manifest(cb_name, dataset_version, staging_dir, files)
+            if validate is not None:
+                validate(staging_dir)
+            DataHandler._swap_directory(staging_dir, ds_dir)
+            return ds_dir
+        except ErroneousArchiveException:
+            raise
         except Exception as e:
             raise StoringError(msg=f"Error while storing Dataset '{dataset_version}' for Codebook '{cb_name}'",
                                caused_by=str(e))
         finally:
             dataset_archive.file.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
 
     @staticmethod
-    def store_dataset_metadata(cb_name: str, dataset_metadata: DatasetMetadata) -> Path:
-        ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_metadata.version, create=False)
+    def store_dataset_metadata(cb_name: str, dataset_metadata: DatasetMetadata, ds_dir: Optional[Path] = None) -> Path:
+        """
+        :param ds_dir: the (staging) directory of the dataset. Defaults to the directory of the stored dataset.
+        """
+        if ds_dir is None:
+            ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_metadata.version)
         dst = ds_dir.joinpath('metadata.json')
         with open(dst, 'w') as out:
             log.info(f"Storing dataset metadata at {str(dst)}")
@@ -81,19 +127,95 @@ class DataHandler(object):
             raise DatasetMetadataNotAvailableException(cb_name=cb_name, dataset_version=dataset_version)
         return DatasetMetadata.parse_file(path)
 
+    @staticmethod
+    def store_dataset_statistics(cb_name: str, dataset_statistics: DatasetStatistics,
+                                 ds_dir: Optional[Path] = None) -> Path:
+        """
+        :param ds_dir: the (staging) directory of the dataset. Defaults to the directory of the stored dataset.
+        """
+        if ds_dir is None:
+            ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_statistics.version)
+        dst = ds_dir.joinpath('stats.json')
+        with open(dst, 'w') as out:
+            log.info(f"Storing dataset statistics at {str(dst)}")
+            print(dataset_statistics.json(), file=out)
+        return dst
+
+    @staticmethod
+    def get_dataset_statistics(cb_name: str, dataset_version: str) -> DatasetStatistics:
+        ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
+        path = ds_dir.joinpath('stats.json')
+        if not path.exists():
+            raise DatasetStatisticsNotAvailableException(cb_name=cb_name, dataset_version=dataset_version)
+        return DatasetStatistics.parse_file(path)
+
+    @staticmethod
+    def get_dataset_manifest(cb_name: str, dataset_version: str,
+                             ds_dir: Optional[Path] = None) -> Optional[DatasetManifest]:
+        """
+        :param ds_dir: the (staging) directory of the dataset. Defaults to the directory of the stored dataset.
+        """
+        if ds_dir is None:
+            ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
+        path = ds_dir.joinpath('manifest.json')
+        if not path.exists():
+            # datasets stored before the content-addressed storage
+            return None
+        return DatasetManifest.parse_file(path)
+
+    @staticmethod
+    def get_dataset_cache_directory(cb_name: str, dataset_version: str) -> Path:
+        manifest = DataHandler.get_dataset_manifest(cb_name, dataset_version)
+        if manifest is None:
+            ds_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
+            return ds_dir.joinpath(DataHandler._relative_dataset_cache_directory)
+        # caches are shared by all datasets with the same content
+        return DataHandler._DATA_ROOT.joinpath(DataHandler._relative_cas_cache_directory, manifest.content_hash)
+
+    @staticmethod
+    def create_tmp_dataset_cache_directory(cb_name: str, dataset_version: str) -> Path:
+        # caches are built in a temporary directory and then renamed so that concurrent trainings never see
+        # partially built caches
+        cache_dir = DataHandler.get_dataset_cache_directory(cb_name, dataset_version)
+        tmp_dir = cache_dir.with_name(f".{cache_dir.name}.{uuid.uuid4().hex}")
+        tmp_dir.mkdir(parents=True)
+        return tmp_dir
+
+    @staticmethod
+    def publish_dataset_cache(cb_name: str, dataset_version: str, tmp_dir: Path) -> Path:
+        cache_dir = DataHandler.get_dataset_cache_directory(cb_name, dataset_version)
+        try:
+            tmp_dir.rename(cache_dir)
+            log.info(f"Published cache of Dataset '{dataset_version}' for Codebook '{cb_name}' at {str(cache_dir)}")
+        except OSError:
+            # another training built the cache concurrently
+            if not cache_dir.is_dir():
+                raise
+        return cache_dir
+
     @staticmethod
     def store_model(cb_name: str, model_archive: UploadFile, model_version: str) -> Path:
+        """
+        Extracts a model archive into a staging directory and swaps it in as the model directory once it is
+        completely extracted, so that a failed upload never replaces a stored version of the model
+        :return: the model directory
+        """
+        model_dir = DataHandler._get_data_directory(cb_name, create=True).joinpath(
+            DataHandler._relative_model_directory, model_version)
+        staging_dir = DataHandler._create_staging_directory(model_dir)
         try:
-            model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version, create=True)
-            dst = model_dir.joinpath(model_archive.filename)
-            log.info(f"Extracting model archive to {str(dst)}")
-            archive_path = DataHandler._store_uploaded_file(model_archive, dst)
-            return DataHandler._extract_archive(archive=archive_path, dst=model_dir)
+            log.info(f"Extracting model archive to {str(staging_dir)}")
+            DataHandler._extract_archive(archive=model_archive.file, dst=staging_dir)
+            DataHandler._swap_directory(staging_dir, model_dir)
+            return model_dir
+        except ErroneousArchiveException:
+            raise
         except Exception as e:
             raise StoringError(msg=f"Error while storing Model '{model_version}' for Codebook '{cb_name}'",
                                caused_by=str(e))
         finally:
             model_archive.file.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
 
     @staticmethod
     def store_model_metadata(cb_name: str, model_metadata: ModelMetadata) -> Path:
@@ -115,6 +237,142 @@ class DataHandler(object):
             raise ModelMetadataNotAvailableException(model_version=model_version, cb_name=cb_name)
         return ModelMetadata.parse_file(path)
 
+    @staticmethod
+    def snapshot_checkpoint(cb_name: str, model_version: str, checkpoint_prefix: str) -> str:
+        """
+        Copies the files of a checkpoint into the best checkpoint directory of the model so that it does not get
+        removed by the Estimator's checkpoint rotation.
+        :param cb_name: the codebook name
+        :param model_version: version tag of the model
+        :param checkpoint_prefix: path prefix of the checkpoint (e.g. <model_dir>/model.ckpt-500)
+        :return: the path prefix of the copied checkpoint
+        """
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
+        dst = model_dir.joinpath(DataHandler._relative_best_checkpoint_directory)
+        # only the best checkpoint is kept
+        if dst.exists():
+            shutil.rmtree(dst)
+        dst.mkdir(parents=True)
+
+        src = Path(checkpoint_prefix)
+        for f in src.parent.glob(src.name + ".*"):
+            shutil.copy2(str(f), str(dst.joinpath(f.name)))
+        log.info(f"Stored snapshot of checkpoint <{src.name}> at {str(dst)}")
+        return str(dst.joinpath(src.name))
+
+    @staticmethod
+    def prune_model_directory(cb_name: str, model_version: str, keep_checkpoints: int = 0,
+                              keep_best_checkpoint: bool = False, keep_event_files: bool = False) -> ModelCompaction:
+        """
+        Removes the training artifacts that the Estimator leaves in the directory of an exported model. The
+        SavedModel, its optimized variant, the metadata and the training log are never removed.
+        :param cb_name: the codebook name
+        :param model_version: version tag of the model
+        :param keep_checkpoints: number of the latest training checkpoints to keep
+        :param keep_best_checkpoint: if True the snapshot of the best checkpoint is kept
+        :param keep_event_files: if True the TensorBoard event files and graph.pbtxt are kept
+        :return: the removed checkpoints and freed bytes
+        """
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
+        removed: List[Path] = []
+
+        checkpoints: Dict[int, List[Path]] = dict()
+        for f in model_dir.iterdir():
+            match = DataHandler._checkpoint_file_pattern.fullmatch(f.name)
+            if match is not None and f.is_file():
+                checkpoints.setdefault(int(match.group(1)), []).append(f)
+        steps = sorted(checkpoints)
+        kept_steps = steps[len(steps) - keep_checkpoints:] if keep_checkpoints > 0 else []
+        for step in steps:
+            if step not in kept_steps:
+                removed.extend(checkpoints[step])
+
+        if not keep_best_checkpoint:
+            removed.append(model_dir.joinpath(DataHandler._relative_best_checkpoint_directory))
+
+        if not keep_event_files:
+            removed.append(model_dir.joinpath("graph.pbtxt"))
+            removed.extend(model_dir.glob("events.out.tfevents.*"))
+            # the Estimator writes the event files of evaluations into eval_<name> directories
+            removed.extend(d for d in model_dir.glob("eval*") if d.is_dir())
+
+        # the (empty) timestamp directories of SavedModel exports whose files got moved to the model directory
+        removed.extend(d for d in model_dir.iterdir() if d.is_dir() and d.name.isdigit() and not any(d.iterdir()))
+
+        bytes_freed = 0
+        for path in removed:
+            if path.is_dir():
+                bytes_freed += DataHandler.get_directory_size(path)
+                shutil.rmtree(path)
+            elif path.is_file():
+                bytes_freed += path.stat().st_size
+                path.unlink()
+
+        # the checkpoint state must only reference the kept checkpoints
+        state = model_dir.joinpath("checkpoint")
+        if state.exists() and len(kept_steps) != len(steps):
+            if len(kept_steps) == 0:
+                state.unlink()
+            else:
+                prefixes = [f"model.ckpt-{step}" for step in kept_steps]
+                state.write_text(f'model_checkpoint_path: "{prefixes[-1]}"\n' +
+                                 "".join(f'all_model_checkpoint_paths: "{p}"\n' for p in prefixes))
+
+        log.info(f"Pruned model '{model_version}' of Codebook '{cb_name}': removed {len(steps) - len(kept_steps)} "
+                 f"checkpoints and freed {bytes_freed} bytes")
+        return ModelCompaction(codebook_name=cb_name,
+                               version=model_version,
+                               removed_checkpoints=len(steps) - len(kept_steps),
+                               bytes_freed=bytes_freed)
+
+    @staticmethod
+    def share_model_files(cb_name: str, model_version: str, files: List[Path]) -> int:
+        """
+        Moves files of a model that are identical across models (e.g. the variable shard of the embedding or the
+        assets of the embedding module) into the content-addressed object store. The files are replaced by hardlinks
+        to the stored objects so that they are stored only once.
+        :param cb_name: the codebook name
+        :param model_version: version tag of the model
+        :param files: the files of the model
+        :return: the number of bytes that got deduplicated
+        """
+        deduplicated = 0
+        for f in files:
+            digest = hashlib.sha256()
+            with open(f, 'rb') as src:
+                for block in iter(lambda: src.read(DataHandler._COPY_BUFFER_SIZE), b''):
+                    digest.update(block)
+            try:
+                if DataHandler._link_cas_object(f, digest.hexdigest()):
+                    deduplicated += f.stat().st_size
+            except OSError as e:
+                log.warning(f"Cannot store {f.name} of model '{model_version}' for Codebook '{cb_name}' in the "
+                            f"object store: {e}")
+        log.info(f"Stored {len(files)} shared files of model '{model_version}' for Codebook '{cb_name}' in the "
+                 f"object store. Deduplicated {deduplicated} bytes.")
+        return deduplicated
+
+    @staticmethod
+    def list_published_model_versions(cb_name: str) -> List[str]:
+        """
+        Lists the versions of the models of a Codebook that are completely exported and published, i.e. whose
+        metadata is stored. Models that are still trained or exported are not listed.
+        """
+        try:
+            models = DataHandler._get_data_directory(cb_name).joinpath(DataHandler._relative_model_directory)
+        except NoDataForCodebookException:
+            return []
+        if not models.is_dir():
+            return []
+        # hidden directories are staging directories of uploaded models
+        return sorted(d.name for d in models.iterdir()
+                      if not d.name.startswith('.') and d.joinpath('metadata.json').is_file())
+
+    @staticmethod
+    def list_codebooks() -> List[str]:
+        # directories of the data root starting with '_' are no Codebooks (e.g. uploads, embeddings, CAS)
+        return sorted(d.name for d in DataHandler._DATA_ROOT.iterdir() if d.is_dir() and not d.name.startswith('_'))
+
     @staticmethod
     def get_dataset_directory(cb_name: str, dataset_version: str = "default", create: bool = False) -> Path:
         data_directory = DataHandler._get_data_directory(cb_name, create).joinpath(
@@ -126,6 +384,335 @@ class DataHandler(object):
             raise DatasetNotAvailableException(dataset_version=dataset_version, cb_name=cb_name)
         return data_directory
 
+    @staticmethod
+    def get_embedding_directory(handle: str) -> Path:
+        """
+        Returns the directory of an embedding module in the local module registry
+        :param handle: the TF Hub handle (URL) of the module
+        :return: the path of the module directory that can be used as TF Hub module path
+        """
+        module_dir = DataHandler._get_embedding_registry_entry(handle).joinpath(
+            DataHandler._relative_embedding_module_directory)
+        if not module_dir.is_dir():
+            raise EmbeddingNotAvailableException(embedding_type=handle)
+        return module_dir
+
+    @staticmethod
+    def get_embedding_metadata(handle: str) -> EmbeddingMetadata:
+        path = DataHandler._get_embedding_registry_entry(handle).joinpath('metadata.json')
+        if not path.exists():
+            raise EmbeddingNotAvailableException(embedding_type=handle)
+        return EmbeddingMetadata.parse_file(path)
+
+    @staticmethod
+    def list_embedding_metadata() -> List[EmbeddingMetadata]:
+        registry = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_embedding_directory)
+        if not registry.is_dir():
+            return []
+        return [EmbeddingMetadata.parse_file(p) for p in registry.glob("*/metadata.json")]
+
+    @staticmethod
+    def store_embedding_module(handle: str, module_dir: Path) -> EmbeddingMetadata:
+        """
+        Copies a (downloaded) TF Hub module into the local module registry
+        :param handle: the TF Hub handle (URL) of the module
+        :param module_dir: the directory of the module
+        :return: the metadata of the registered module
+        """
+        tmp_dir = DataHandler._create_tmp_embedding_registry_entry(handle)
+        try:
+            log.info(f"Copying embedding module <{handle}> from {str(module_dir)} into the local module registry")
+            shutil.copytree(str(module_dir), str(tmp_dir.joinpath(DataHandler._relative_embedding_module_directory)))
+            return DataHandler._publish_embedding_registry_entry(handle, tmp_dir)
+        except Exception as e:
+            raise StoringError(msg=f"Error while storing embedding module <{handle}>!", caused_by=str(e))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def store_embedding_archive(handle: str, module_archive: UploadFile) -> EmbeddingMetadata:
+        """
+        Extracts a zip or tar(.gz) archive of a TF Hub module into the local module registry
+        :param handle: the TF Hub handle (URL) of the module
+        :param module_archive: the archive of the module
+        :return: the metadata of the registered module
+        """
+        tmp_dir = DataHandler._create_tmp_embedding_registry_entry(handle)
+        try:
+            extracted = tmp_dir.joinpath("extracted")
+            log.info(f"Extracting archive of embedding module <{handle}> to {str(extracted)}")
+            if zipfile.is_zipfile(module_archive.file):
+                DataHandler._extract_archive(archive=module_archive.file, dst=extracted)
+            else:
+                module_archive.file.seek(0)
+                with tarfile.open(fileobj=module_archive.file, mode='r:*') as tar_archive:
+                    members = tar_archive.getmembers()
+                    DataHandler._check_archive_members([(m.name, m.size, None) for m in members if m.isfile()])
+                    tar_archive.extractall(extracted, members=[m for m in members if m.isfile() or m.isdir()])
+
+            # the module is either at the root of the archive or in a (single) sub directory
+            module_files = ["saved_model.pb", "tfhub_module.pb"]
+            module_roots = [p.parent for f in module_files for p in extracted.rglob(f)]
+            if len(module_roots) == 0:
+                raise StoringError(msg=f"Archive of embedding module <{handle}> contains no SavedModel!")
+            module_root = min(module_roots, key=lambda p: len(p.parts))
+            module_root.rename(tmp_dir.joinpath(DataHandler._relative_embedding_module_directory))
+            return DataHandler._publish_embedding_registry_entry(handle, tmp_dir)
+        except (StoringError, ErroneousArchiveException):
+            raise
+        except Exception as e:
+            raise StoringError(msg=f"Error while storing embedding module <{handle}>!", caused_by=str(e))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            module_archive.file.close()
+
+    @staticmethod
+    def purge_embedding_directory(handle: str):
+        entry = DataHandler._get_embedding_registry_entry(handle)
+        if not entry.is_dir():
+            raise EmbeddingNotAvailableException(embedding_type=handle)
+        log.warning(f"Permanently removing embedding module <{handle}> from the local module registry")
+        shutil.rmtree(entry)
+
+    @staticmethod
+    def _get_embedding_registry_entry(handle: str) -> Path:
+        # handles are URLs so the entries are named by their hash
+        key = hashlib.sha1(handle.strip().encode('utf-8')).hexdigest()
+        return DataHandler._DATA_ROOT.joinpath(DataHandler._relative_embedding_directory, key)
+
+    @staticmethod
+    def _create_tmp_embedding_registry_entry(handle: str) -> Path:
+        # modules are prepared in a temporary directory and then renamed so that concurrent trainings never see
+        # partially stored modules
+        entry = DataHandler._get_embedding_registry_entry(handle)
+        tmp_dir = entry.with_name(f".{entry.name}.{uuid.uuid4().hex}")
+        tmp_dir.mkdir(parents=True)
+        return tmp_dir
+
+    @staticmethod
+    def _publish_embedding_registry_entry(handle: str, tmp_dir: Path) -> EmbeddingMetadata:
+        metadata = EmbeddingMetadata(handle=handle,
+                                     size=DataHandler.get_directory_size(
+                                         tmp_dir.joinpath(DataHandler._relative_embedding_module_directory)))
+        with open(tmp_dir.joinpath('metadata.json'), 'w') as out:
+            print(metadata.json(), file=out)
+
+        entry = DataHandler._get_embedding_registry_entry(handle)
+        try:
+            tmp_dir.rename(entry)
+        except OSError:
+            # another process registered the same module in the meantime
+            if not entry.is_dir():
+                raise
+            log.info(f"Embedding module <{handle}> was registered concurrently. Using the existing module.")
+        log.info(f"Stored embedding module <{handle}> in the local module registry at {str(entry)}")
+        return DataHandler.get_embedding_metadata(handle)
+
+    @staticmethod
+    def get_optimized_model_directory(cb_name: str, model_version: str) -> Path:
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
+        return model_dir.joinpath(DataHandler._relative_optimized_model_directory)
+
+    @staticmethod
+    def get_saved_model_size(cb_name: str, model_version: str) -> int:
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
+        size = 0
+        for name in ["saved_model.pb", "saved_model.pbtxt", "variables", "assets", "assets.extra"]:
+            path = model_dir.joinpath(name)
+            if path.is_dir():
+                size += DataHandler.get_directory_size(path)
+            elif path.is_file():
+                size += path.stat().st_size
+        return size
+
+    @staticmethod
+    def get_profile_directory(cb_name: str, model_version: str, name: str, create: bool = False) -> Path:
+        """
+        Returns the directory of a profile of a model, which is stored next to the training.log of the model
+        :param name: the name of the profile
+        :param create: if True the directory gets created if it does not exist
+        """
+        profiles_dir = DataHandler.get_model_directory(cb_name, model_version=model_version, create=create).joinpath(
+            DataHandler._relative_profile_directory)
+        profile_dir = profiles_dir.joinpath(name)
+        # the name must not point outside of the profiles directory
+        if profile_dir.parent != profiles_dir or name.startswith('.'):
+            raise ProfileNotAvailableException(name, cb_name, model_version)
+        if create:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+        if not profile_dir.is_dir():
+            raise ProfileNotAvailableException(name, cb_name, model_version)
+        return profile_dir
+
+    @staticmethod
+    def list_profiles(cb_name: str, model_version: str) -> List[Path]:
+        profiles_dir = DataHandler.get_model_directory(cb_name, model_version=model_version).joinpath(
+            DataHandler._relative_profile_directory)
+        if not profiles_dir.is_dir():
+            return []
+        return sorted(d for d in profiles_dir.iterdir() if d.is_dir() and not d.name.startswith('.'))
+
+    @staticmethod
+    def list_profile_files(cb_name: str, model_version: str, name: str) -> List[Tuple[str, Path]]:
+        """
+        Lists the files of a profile as (path relative to the profile directory, absolute path) in a stable order
+        """
+        profile_dir = DataHandler.get_profile_directory(cb_name, model_version, name)
+        return [(path.relative_to(profile_dir).as_posix(), path) for path in sorted(profile_dir.rglob("*"))
+                if path.is_file()]
+
+    @staticmethod
+    def purge_profile_directory(cb_name: str, model_version: str, name: str):
+        shutil.rmtree(DataHandler.get_profile_directory(cb_name, model_version, name))
+
+    @staticmethod
+    def list_model_files(cb_name: str, model_version: str, serving_only: bool = True) -> List[Tuple[str, Path]]:
+        """
+        Lists the files of a model as (path relative to the model directory, absolute path) in a stable order.
+        Temporary directories of running exports are never listed.
+        :param serving_only: if True only the files required for serving the model are listed, i.e. the SavedModel,
+        its optimized variant and the metadata but no training checkpoints or event files.
+        """
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
+        if serving_only:
+            names = ["saved_model.pb", "saved_model.pbtxt", "variables", "assets", "assets.extra",
+                     str(DataHandler._relative_optimized_model_directory), "metadata.json"]
+            roots = [model_dir.joinpath(name) for name in names]
+        else:
+            roots = [model_dir]
+
+        files = []
+        for root in roots:
+            candidates = sorted(root.rglob("*")) if root.is_dir() else [root]
+            for path in candidates:
+                rel = path.relative_to(model_dir)
+                if path.is_file() and not any(part.startswith('.') for part in rel.parts):
+                    files.append((rel.as_posix(), path))
+        return files
+
+    @staticmethod
+    def store_upload_session(session: UploadSession) -> Path:
+        upload_dir = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_upload_directory, session.upload_id)
+        upload_dir.mkdir(parents=True)
+        dst = upload_dir.joinpath('session.json')
+        with open(dst, 'w') as out:
+            log.info(f"Storing upload session at {str(dst)}")
+            print(session.json(exclude={'received_chunks'}), file=out)
+        return dst
+
+    @staticmethod
+    def get_upload_session(upload_id: str) -> UploadSession:
+        upload_dir = DataHandler._get_upload_directory(upload_id)
+        session = UploadSession.parse_file(upload_dir.joinpath('session.json'))
+        # the received chunks are derived from the stored chunk files so that they are always up to date
+        session.received_chunks = sorted(int(p.name.split('.')[0]) for p in upload_dir.glob("*.part"))
+        return session
+
+    @staticmethod
+    def store_upload_chunk(upload_id: str, index: int, chunk: BinaryIO, expected_size: int, checksum: str) -> Path:
+        """
+        Stores a chunk of a chunked upload after verifying its size and SHA-256 checksum. A chunk that was already
+        received gets replaced.
+        :param upload_id: the id of the upload session
+        :param index: the index of the chunk
+        :param chunk: file object of the chunk
+        :param expected_size: the size of the chunk in bytes
+        :param checksum: the SHA-256 hex digest of the chunk
+        :return: path of the stored chunk
+        """
+        upload_dir = DataHandler._get_upload_directory(upload_id)
+        dst = upload_dir.joinpath(f"{index}.part")
+        tmp = upload_dir.joinpath(f"{index}.{uuid.uuid4().hex}.tmp")
+        try:
+            size, digest = DataHandler._copy_and_hash(chunk, tmp)
+            if size != expected_size:
+                raise ErroneousUploadException(upload_id, f"Chunk {index} of upload <{upload_id}> has {size} bytes "
+                                                          f"but {expected_size} bytes were expected!")
+            if digest != checksum.strip().lower():
+                raise ErroneousUploadException(upload_id, f"Checksum of chunk {index} of upload <{upload_id}> "
+                                                          f"does not match!")
+            # the rename is atomic so that a chunk is either completely received or not at all
+            tmp.replace(dst)
+            return dst
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    @staticmethod
+    def assemble_upload(session: UploadSession) -> Path:
+        """
+        Concatenates the chunks of a chunked upload into the archive. The chunks are kept until the upload is
+        purged, so that a failed completion can be retried (e.g. after replacing a corrupted chunk).
+        :param session: the upload session
+        :return: path of the assembled archive
+        """
+        upload_dir = DataHandler._get_upload_directory(session.upload_id)
+        missing = sorted(set(range(session.num_chunks)) - set(session.received_chunks))
+        if len(missing) > 0:
+            raise ErroneousUploadException(session.upload_id, f"Upload <{session.upload_id}> is incomplete! Missing "
+                                                              f"chunks: {missing}")
+
+        archive = upload_dir.joinpath("archive.zip")
+        log.info(f"Assembling {session.num_chunks} chunks of upload <{session.upload_id}> at {str(archive)}")
+        digest = hashlib.sha256()
+        with open(archive, 'wb') as out:
+            for index in range(session.num_chunks):
+                part = upload_dir.joinpath(f"{index}.part")
+                with open(part, 'rb') as src:
+                    for block in iter(lambda: src.read(DataHandler._COPY_BUFFER_SIZE), b''):
+                        digest.update(block)
+                        out.write(block)
+
+        if session.checksum is not None and digest.hexdigest() != session.checksum.strip().lower():
+            archive.unlink()
+            raise ErroneousUploadException(session.upload_id, f"Checksum of upload <{session.upload_id}> does not "
+                                                              f"match!")
+        return archive
+
+    @staticmethod
+    def purge_upload(upload_id: str):
+        upload_dir = DataHandler._get_upload_directory(upload_id)
+        log.info(f"Removing data of upload <{upload_id}>")
+        shutil.rmtree(upload_dir)
+
+    @staticmethod
+    def purge_expired_uploads(max_age_seconds: float):
+        uploads = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_upload_directory)
+        if not uploads.is_dir():
+            return
+        now = time.time()
+        for session_file in uploads.glob("*/session.json"):
+            session = UploadSession.parse_file(session_file)
+            if now - session.created > max_age_seconds:
+                log.warning(f"Removing expired upload <{session.upload_id}> of Dataset '{session.dataset_version}' "
+                            f"for Codebook '{session.cb_name}'")
+                shutil.rmtree(session_file.parent, ignore_errors=True)
+
+    @staticmethod
+    def _get_upload_directory(upload_id: str) -> Path:
+        # upload ids are generated hex strings, everything else could be used to escape the upload directory
+        if re.fullmatch(r"[0-9a-f]{32}", upload_id) is None:
+            raise UploadSessionNotAvailableException(upload_id=upload_id)
+        upload_dir = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_upload_directory, upload_id)
+        if not upload_dir.joinpath('session.json').exists():
+            raise UploadSessionNotAvailableException(upload_id=upload_id)
+        return upload_dir
+
+    @staticmethod
+    def _copy_and_hash(src: BinaryIO, dst: Path) -> Tuple[int, str]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(dst, 'wb') as out:
+            for block in iter(lambda: src.read(DataHandler._COPY_BUFFER_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+                out.write(block)
+        return size, digest.hexdigest()
+
+    @staticmethod
+    def get_directory_size(directory: Path) -> int:
+        return sum(f.stat().st_size for f in directory.rglob("*") if f.is_file())
+
     @staticmethod
     def _get_data_directory(cb_name: str, create: bool = False) -> Path:
         data_directory = Path(DataHandler._DATA_ROOT, cb_name)
@@ -136,38 +723,182 @@ class DataHandler(object):
         return data_directory
 
     @staticmethod
-    def _extract_archive(archive: Path, dst: Path):
-        assert zipfile.is_zipfile(archive)
+    def _extract_archive(archive: BinaryIO, dst: Path,
+                         required_files: List[str] = None) -> Dict[str, Tuple[int, str]]:
+        """
+        Extracts the members of a zip archive directly from the (uploaded) file object into the destination
+        directory. The archive is validated before anything gets written, so that zip bombs are rejected early.
+        :param archive: seekable file object of the zip archive
+        :param dst: the destination directory
+        :param required_files: files that have to be contained in the archive
+        :return: the size and SHA-256 hex digest of the extracted files
+        """
+        if not zipfile.is_zipfile(archive):
+            raise ErroneousArchiveException(msg="Uploaded file is not a zip archive!")
+        archive.seek(0)
         with ZipFile(archive, 'r') as zip_archive:
-            zip_archive.extractall(dst)
-        if not dst.is_dir():
-            raise ErroneousDatasetException(msg="Cannot extract dataset zip archive!")
-        if not dst.joinpath('train.csv').exists():
-            raise ErroneousDatasetException(msg="Dataset archive does not contain test.csv file!")
-        if not dst.joinpath('test.csv').exists():
-            raise ErroneousDatasetException(msg="Dataset archive does not contain test.csv file!")
-        return dst
+            members = [m for m in zip_archive.infolist() if not m.is_dir()]
+            DataHandler._check_archive_members([(m.filename, m.file_size, m.compress_size) for m in members])
+
+            names = {m.filename for m in members}
+            for required in required_files or []:
+                if required not in names:
+                    raise ErroneousArchiveException(msg=f"Archive does not contain {required} file!")
+
+            dst.mkdir(parents=True, exist_ok=True)
+            files = dict()
+            for member in members:
+                target = dst.joinpath(member.filename)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with zip_archive.open(member, 'r') as src:
+                    files[member.filename] = DataHandler._copy_and_hash(src, target)
+        return files
+
+    @staticmethod
+    def _create_staging_directory(target: Path) -> Path:
+        # hidden sibling of the target directory, i.e. on the same file system so that it can be renamed
+        staging_dir = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        staging_dir.mkdir(parents=True)
+        return staging_dir
 
     @staticmethod
-    def _store_uploaded_file(uploaded_file: UploadFile, dst: Path):
+    def _swap_directory(staging_dir: Path, target: Path):
+        """
+        Replaces the target directory by the staging directory. A directory cannot be renamed onto a non-empty
+        directory, so an existing target is renamed aside first and removed after the staging directory took its
+        place. The objects of the content-addressed storage that only the replaced directory linked get removed.
+        """
+        if not target.exists():
+            staging_dir.rename(target)
+            return
+        replaced = target.with_name(f".{target.name}.{uuid.uuid4().hex}.replaced")
+        target.rename(replaced)
         try:
-            with open(dst, "wb") as buffer:
-                shutil.copyfileobj(uploaded_file.file, buffer)
-                return Path(dst)
-        except Exception as e:
-            raise StoringError(msg=f"Cannot store uploaded file at {str(dst)}!", caused_by=str(e))
+            staging_dir.rename(target)
+        except OSError:
+            replaced.rename(target)
+            raise
+        # the files of the replaced directory can be hardlinks to shared objects and must not be written into
+        shutil.rmtree(replaced)
+        DataHandler.collect_garbage()
+
+    @staticmethod
+    def _store_dataset_manifest(cb_name: str, dataset_version: str, ds_dir: Path,
+                                files: Dict[str, Tuple[int, str]]) -> DatasetManifest:
+        """
+        Moves the files of a dataset into the content-addressed object store. The files in the dataset directory are
+        replaced by hardlinks to the stored objects so that identical files are stored only once across dataset
+        versions and codebooks.
+        :param cb_name: the codebook name
+        :param dataset_version: version of the dataset
+        :param ds_dir: the dataset directory
+        :param files: the size and SHA-256 hex digest of the files of the dataset
+        :return: the manifest of the dataset
+        """
+        for name, (_, digest) in files.items():
+            try:
+                if DataHandler._link_cas_object(ds_dir.joinpath(name), digest):
+                    log.info(f"Deduplicating {name} of Dataset '{dataset_version}' for Codebook '{cb_name}'")
+            except OSError as e:
+                log.warning(f"Cannot store {name} of Dataset '{dataset_version}' for Codebook '{cb_name}' in the "
+                            f"object store: {e}")
+
+        content = "\n".join(f"{name}:{digest}" for name, (_, digest) in sorted(files.items()))
+        manifest = DatasetManifest(codebook_name=cb_name,
+                                   version=dataset_version,
+                                   files={name: ManifestEntry(sha256=digest, size=size)
+                                          for name, (size, digest) in files.items()},
+                                   content_hash=hashlib.sha256(content.encode('utf-8')).hexdigest())
+        with open(ds_dir.joinpath('manifest.json'), 'w') as out:
+            print(manifest.json(), file=out)
+        return manifest
+
+    @staticmethod
+    def _link_cas_object(target: Path, digest: str) -> bool:
+        """
+        Replaces a file by a hardlink to the object with the same digest in the content-addressed object store. If
+        there is no such object yet, the file becomes the object.
+        :param target: the file
+        :param digest: the SHA-256 hex digest of the file
+        :return: True if the object already existed, i.e. the file got deduplicated
+        """
+        obj = DataHandler._get_cas_object(digest)
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(str(target), str(obj))
+            # objects are shared so they must never be written into
+            obj.chmod(0o444)
+            return False
+        except FileExistsError:
+            tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+            os.link(str(obj), str(tmp))
+            tmp.replace(target)
+            return True
+
+    @staticmethod
+    def _get_cas_object(digest: str) -> Path:
+        return DataHandler._DATA_ROOT.joinpath(DataHandler._relative_cas_object_directory, digest[:2], digest)
+
+    @staticmethod
+    def collect_garbage():
+        """
+        Removes the objects of the content-addressed storage that are not linked by any dataset or model anymore and
+        the caches whose content hash is not in the manifest of any dataset.
+        """
+        objects = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_cas_object_directory)
+        for obj in objects.glob("*/*"):
+            if obj.stat().st_nlink == 1:
+                log.info(f"Removing unreferenced object {obj.name}")
+                obj.unlink()
+
+        referenced = {DatasetManifest.parse_file(m).content_hash
+                      for m in DataHandler._DATA_ROOT.glob(f"*/{DataHandler._relative_dataset_directory}/*/"
+                                                           f"manifest.json")}
+        caches = DataHandler._DATA_ROOT.joinpath(DataHandler._relative_cas_cache_directory)
+        for cache in caches.glob("*"):
+            # temporary directories of caches that are built right now start with a dot
+            if not cache.name.startswith('.') and cache.name not in referenced:
+                log.info(f"Removing unreferenced cache {cache.name}")
+                shutil.rmtree(cache, ignore_errors=True)
+                CACHE_EVENTS.labels("dataset", "eviction").inc()
+
+    @staticmethod
+    def _check_archive_members(members: List[Tuple[str, int, Optional[int]]]):
+        """
+        Checks the names and (declared) sizes of archive members. Note that zipfile never extracts more bytes of a
+        member than declared in its header.
+        :param members: list of (name, uncompressed size, compressed size) tuples
+        """
+        limits = conf.backend.uploads
+        if len(members) > int(limits.max_archive_members):
+            raise ErroneousArchiveException(msg=f"Archive contains more than {limits.max_archive_members} files!")
+
+        total_size = 0
+        for name, size, compressed_size in members:
+            if Path(name).is_absolute() or ".." in Path(name).parts:
+                raise ErroneousArchiveException(msg=f"Archive contains an illegal member path <{name}>!")
+            if compressed_size is not None and size > DataHandler._RATIO_CHECK_MIN_SIZE and \
+                    size > int(limits.max_compression_ratio) * max(compressed_size, 1):
+                raise ErroneousArchiveException(msg=f"Compression ratio of archive member <{name}> exceeds "
+                                                    f"{limits.max_compression_ratio}!")
+            total_size += size
+            if total_size > int(limits.max_uncompressed_size):
+                raise ErroneousArchiveException(msg=f"Uncompressed size of the archive exceeds "
+                                                    f"{limits.max_uncompressed_size} bytes!")
 
     @staticmethod
     def purge_dataset_directory(cb_name: str, dataset_version: str):
         dataset_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
         log.warning(f"Permanently removing dataset '{dataset_version}' of Codebook '{cb_name}'")
         shutil.rmtree(dataset_dir)
+        DataHandler.collect_garbage()
 
     @staticmethod
     def purge_model_directory(cb_name: str, model_version: str):
         model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
         log.warning(f"Permanently removing data of model '{model_version}' of Codebook '{cb_name}'")
         shutil.rmtree(model_dir)
+        DataHandler.collect_garbage()
 
     @staticmethod
     def _purge_data(cb_name: str):
@@ -175,3 +906,4 @@ class DataHandler(object):
             f"Permanently removing all data (including models and datasets) of Codebook <{cb_name}>!")
         data_directory = Path(DataHandler._DATA_ROOT, cb_name)
         shutil.rmtree(data_directory)
+        DataHandler.collect_garbage()
@@ -0,0 +1,71 @@
+"""
+Columnar cache of a dataset split. The texts are stored as one UTF-8 byte buffer plus the offsets of the texts in that
+buffer and the labels as int32 ids. All three get memory-mapped, so concurrent trainings of the same dataset share the
+pages through the OS page cache instead of keeping private copies of the data.
+"""
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger as log
+
+
+class SplitCache(object):
+    def __init__(self, cache_dir: Path, split: str):
+        self.offsets = np.load(str(cache_dir.joinpath(f"{split}_offsets.npy")), mmap_mode='r')
+        self.labels = np.load(str(cache_dir.joinpath(f"{split}_labels.npy")), mmap_mode='r')
+        # empty files cannot be memory-mapped
+        if self.offsets[-1] > 0:
+            self.texts = np.memmap(str(cache_dir.joinpath(f"{split}_texts.bin")), dtype=np.uint8, mode='r')
+        else:
+            self.texts = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def text(self, idx: int) -> bytes:
+        return self.texts[self.offsets[idx]:self.offsets[idx + 1]].tobytes()
+
+
+def build_split_cache(csv: Path, cache_dir: Path, split: str, label_ids: Dict[str, int], chunk_size: int) -> \
+        Tuple[int, int]:
+    """
+    Converts a split of a dataset to the cache format in one chunked pass over the CSV
+    :param csv: path of the CSV file of the split
+    :param cache_dir: directory of the cache
+    :param split: name of the split
+    :param label_ids: ids of the labels
+    :param chunk_size: number of CSV rows that are read at once
+    :return: the number of cached and the number of dropped samples (with labels that have no id)
+    """
+    texts_file = cache_dir.joinpath(f"{split}_texts.bin")
+    offsets = [np.zeros(1, dtype=np.int64)]
+    labels = []
+    num_dropped = 0
+    with open(texts_file, 'wb') as out:
+        end = 0
+        reader = pd.read_csv(csv, header=None, skiprows=1, dtype=str, chunksize=chunk_size)
+        try:
+            for chunk in reader:
+                chunk = chunk.dropna()
+                chunk_labels = chunk[1].map(label_ids)
+                known = chunk_labels.notna()
+                num_dropped += int((~known).sum())
+
+                encoded = [t.encode('utf-8') for t in chunk[0][known]]
+                out.write(b''.join(encoded))
+                lengths = np.fromiter((len(t) for t in encoded), dtype=np.int64, count=len(encoded))
+                offsets.append(end + np.cumsum(lengths))
+                end += int(lengths.sum())
+                labels.append(chunk_labels[known].to_numpy(dtype=np.int32))
+        finally:
+            reader.close()
+
+    np.save(str(cache_dir.joinpath(f"{split}_offsets.npy")), np.concatenate(offsets))
+    labels = np.concatenate(labels) if len(labels) > 0 else np.zeros(0, dtype=np.int32)
+    np.save(str(cache_dir.joinpath(f"{split}_labels.npy")), labels)
+
+    if num_dropped > 0:
+        log.warning(f"Dropped {num_dropped} samples of '{csv.name}' with labels that are not in the training split!")
+    return len(labels), num_dropped
@@ -1,15 +1,29 @@
-from typing import Union, Tuple, List
+from __future__ import annotations
+
+import math
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Union, Tuple, List, Optional
 
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from fastapi import UploadFile
 from loguru import logger as log
 
-from api.model import DatasetMetadata
+from api.model import DatasetMetadata, ChunkedUploadRequest, UploadSession, DatasetStatistics
 from backend.data_handler import DataHandler
+from backend.dataset_cache import SplitCache, build_split_cache
+from backend.dataset_statistics import SplitStatisticsCollector, build_dataset_statistics
 from backend.db.redis_handler import RedisHandler
-from backend.exceptions import ErroneousDatasetException, DatasetNotAvailableException
+from backend.exceptions import ErroneousDatasetException, DatasetNotAvailableException, ErroneousUploadException, \
+    DatasetStatisticsNotAvailableException, ErroneousArchiveException
+from backend.lazy_import import LazyModule
+from backend.metrics import CACHE_EVENTS
+from config import conf
+
+tf = LazyModule("tensorflow")
 
 
 class DatasetManager(object):
@@ -25,108 +39,291 @@ class DatasetManager(object):
     def store_archive(cb_name: str, dataset_version: str, dataset_archive: UploadFile) -> DatasetMetadata:
         log.info(f"Successfully received dataset archive for Codebook {cb_name}")
 
+        scanned = {}
+
+        def validate(staging_dir: Path):
+            # the dataset only replaces a stored version if it is valid, so it is scanned before it gets swapped in
+            metadata, statistics = DatasetManager._scan_dataset(cb_name, dataset_version, dataset_dir=staging_dir)
+            DataHandler.store_dataset_metadata(cb_name=cb_name, dataset_metadata=metadata, ds_dir=staging_dir)
+            DataHandler.store_dataset_statistics(cb_name=cb_name, dataset_statistics=statistics, ds_dir=staging_dir)
+            scanned['metadata'] = metadata
+
         try:
             path = DataHandler.store_dataset(cb_name=cb_name, dataset_archive=dataset_archive,
-                                             dataset_version=dataset_version)
-            metadata = DatasetManager._generate_metadata(cb_name=cb_name, dataset_version=dataset_version)
-            metadata_path = DataHandler.store_dataset_metadata(cb_name=cb_name, dataset_metadata=metadata)
+                                             dataset_version=dataset_version, validate=validate)
+        except ErroneousArchiveException:
+            raise
         except Exception as e:
             raise ErroneousDatasetException(dataset_version, cb_name,
                                             f"Error while persisting dataset '{dataset_version}' for Codebook {cb_name}!",
                                             caused_by=str(e))
+        metadata = scanned['metadata']
 
         RedisHandler().register_dataset(cb_name, metadata)
-        log.info(
-            f"Successfully persisted dataset '{dataset_version}' for Codebook <{cb_name}> under {str(path)} and "
-            f"metadata under {metadata_path}")
+        try:
+            DatasetManager._get_cache_directory(cb_name, dataset_version, metadata)
+        except Exception as e:
+            # the cache is built again when the dataset is used for the first time
+            log.warning(f"Cannot build the cache of dataset '{dataset_version}' for Codebook <{cb_name}>: {e}")
+        log.info(f"Successfully persisted dataset '{dataset_version}' for Codebook <{cb_name}> under {str(path)}")
+        return metadata
+
+    @staticmethod
+    def init_chunked_upload(req: ChunkedUploadRequest) -> UploadSession:
+        upload_id = uuid.uuid4().hex
+        if req.total_size <= 0 or req.chunk_size <= 0:
+            raise ErroneousUploadException(upload_id, "Archive and chunk size have to be positive!")
+        if req.chunk_size > conf.backend.uploads.max_chunk_size:
+            raise ErroneousUploadException(upload_id, f"Chunk size must not exceed "
+                                                      f"{conf.backend.uploads.max_chunk_size} bytes!")
+        if req.total_size > conf.backend.uploads.max_archive_size:
+            raise ErroneousUploadException(upload_id, f"Archive size must not exceed "
+                                                      f"{conf.backend.uploads.max_archive_size} bytes!")
+
+        # abandoned uploads would otherwise occupy disk space forever
+        DataHandler.purge_expired_uploads(conf.backend.uploads.session_ttl_hours * 60 * 60)
+
+        session = UploadSession(upload_id=upload_id,
+                                cb_name=req.cb_name,
+                                dataset_version=req.dataset_version,
+                                total_size=req.total_size,
+                                chunk_size=req.chunk_size,
+                                num_chunks=math.ceil(req.total_size / req.chunk_size),
+                                checksum=req.checksum,
+                                created=time.time())
+        DataHandler.store_upload_session(session)
+        log.info(f"Initialized upload <{upload_id}> of Dataset '{req.dataset_version}' for Codebook <{req.cb_name}> "
+                 f"with {session.num_chunks} chunks")
+        return session
+
+    @staticmethod
+    def store_upload_chunk(upload_id: str, index: int, checksum: str, chunk: UploadFile) -> UploadSession:
+        session = DataHandler.get_upload_session(upload_id)
+        if not 0 <= index < session.num_chunks:
+            raise ErroneousUploadException(upload_id, f"Chunk index has to be in [0, {session.num_chunks})!")
+
+        last = session.num_chunks - 1
+        expected_size = session.chunk_size if index < last else session.total_size - last * session.chunk_size
+        try:
+            DataHandler.store_upload_chunk(upload_id, index, chunk.file, expected_size, checksum)
+        finally:
+            chunk.file.close()
+        return DataHandler.get_upload_session(upload_id)
+
+    @staticmethod
+    def get_upload_session(upload_id: str) -> UploadSession:
+        return DataHandler.get_upload_session(upload_id)
+
+    @staticmethod
+    def complete_chunked_upload(upload_id: str) -> DatasetMetadata:
+        session = DataHandler.get_upload_session(upload_id)
+        archive = DataHandler.assemble_upload(session)
+        try:
+            metadata = DatasetManager.store_archive(session.cb_name, session.dataset_version,
+                                                    UploadFile(filename=archive.name, file=open(archive, 'rb')))
+        except Exception:
+            # the chunks are kept so that the upload can be completed again, e.g. after replacing a corrupted chunk
+            archive.unlink()
+            raise
+        DataHandler.purge_upload(upload_id)
         return metadata
 
+    @staticmethod
+    def abort_chunked_upload(upload_id: str) -> bool:
+        DataHandler.purge_upload(upload_id)
+        return True
+
     @staticmethod
     def get_tensorflow_dataset(cb_name: str, dataset_version: str = "default", get_labels_only=False) -> \
             Union[List[str], Tuple[tf.data.Dataset, tf.data.Dataset, List[str]]]:
-
-        # load and prepare the dataframes
-        train_df, test_df = DatasetManager._load_dataframes(cb_name, dataset_version)
-        train_set, test_set, label_categories = DatasetManager._prepare_dataframes(train_df, test_df)
+        metadata = DatasetManager.get_metadata(cb_name, dataset_version)
+        label_categories = [metadata.labels[str(idx)] for idx in range(len(metadata.labels))]
         if get_labels_only:
             return label_categories
 
-        # extract label column
-        train_labels = train_set.pop('label')
-        test_labels = test_set.pop('label')
+        cache_dir = DatasetManager._get_cache_directory(cb_name, dataset_version)
+        train_ds = DatasetManager._to_tensorflow_dataset(cache_dir, "train")
+        test_ds = DatasetManager._to_tensorflow_dataset(cache_dir, "test")
 
-        # build tensorflow dataset
-        train_ds = tf.data.Dataset.from_tensor_slices((train_set.values, train_labels.values))
-        test_ds = tf.data.Dataset.from_tensor_slices((test_set.values, test_labels.values))
+        return train_ds, test_ds, label_categories
 
-        # create dicts
-        train_ds = train_ds.map(lambda features, labels: ({'text': features}, labels))
-        test_ds = test_ds.map(lambda features, labels: ({'text': features}, labels))
+    @staticmethod
+    def get_tensorflow_validation_split(cb_name: str, dataset_version: str = "default",
+                                        validation_split: float = 0.1, seed: int = 1312) -> \
+            Tuple[tf.data.Dataset, tf.data.Dataset]:
+        """
+        Carves a validation split out of the training data of the dataset
+        :param cb_name: the codebook name
+        :param dataset_version: version of the dataset
+        :param validation_split: fraction of the training data that gets held out as validation split
+        :param seed: random seed so that the split is the same for every call during a training
+        :return: the remaining training split and the validation split as tensorflow datasets
+        """
+        if not 0. < validation_split < 1.:
+            raise ErroneousDatasetException(dataset_version, cb_name,
+                                            f"Validation split has to be in (0, 1) but is {validation_split}!")
 
-        return train_ds, test_ds, label_categories
+        cache_dir = DatasetManager._get_cache_directory(cb_name, dataset_version)
+        num_samples = len(SplitCache(cache_dir, "train"))
+        num_val_samples = int(round(validation_split * num_samples))
+        if num_val_samples == 0 or num_val_samples == num_samples:
+            raise ErroneousDatasetException(dataset_version, cb_name,
+                                            f"Training split of Dataset '{dataset_version}' for Codebook "
+                                            f"'{cb_name}' is too small for a validation split of "
+                                            f"{validation_split}!")
+
+        permutation = np.random.RandomState(seed).permutation(num_samples)
+        val_indices = permutation[:num_val_samples]
+        train_indices = np.sort(permutation[num_val_samples:])
+
+        return DatasetManager._to_tensorflow_dataset(cache_dir, "train", train_indices), \
+            DatasetManager._to_tensorflow_dataset(cache_dir, "train", val_indices)
+
+    @staticmethod
+    def get_test_samples(cb_name: str, dataset_version: str = "default", max_samples: int = 100) -> \
+            Tuple[List[str], np.ndarray]:
+        """
+        Returns the first samples of the test split of the dataset
+        :param cb_name: the codebook name
+        :param dataset_version: version of the dataset
+        :param max_samples: maximum number of samples
+        :return: the texts and the label ids of the samples
+        """
+        cache = SplitCache(DatasetManager._get_cache_directory(cb_name, dataset_version), "test")
+        num_samples = min(len(cache), max_samples)
+        texts = [cache.text(idx).decode('utf-8') for idx in range(num_samples)]
+        return texts, np.array(cache.labels[:num_samples])
+
+    @staticmethod
+    def _to_tensorflow_dataset(cache_dir: Path, split: str, indices: np.ndarray = None) -> tf.data.Dataset:
+        def generator():
+            # the cache gets mapped by every iterator so that the dataset holds no reference to the data
+            cache = SplitCache(cache_dir, split)
+            for idx in (range(len(cache)) if indices is None else indices):
+                yield cache.text(idx), cache.labels[idx]
+
+        ds = tf.data.Dataset.from_generator(generator, output_types=(tf.string, tf.int32), output_shapes=((), ()))
+
+        # create dicts
+        return ds.map(lambda text, label: ({'text': tf.reshape(text, [1])}, label))
 
     @staticmethod
-    def _prepare_dataframes(train_set: pd.DataFrame, test_set: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, List]:
-        # convert to columns str
-        train_set['text'] = train_set['text'].astype(str)
-        test_set['text'] = train_set['text'].astype(str)
-        train_set['label'] = train_set['label'].astype(str)
-        test_set['label'] = train_set['label'].astype(str)
+    def _get_cache_directory(cb_name: str, dataset_version: str = "default", metadata: DatasetMetadata = None) -> Path:
+        cache_dir = DataHandler.get_dataset_cache_directory(cb_name, dataset_version)
+        if not cache_dir.exists():
+            # caches are built at ingestion unless there is already one for the same content but datasets stored
+            # before the caches were introduced are built lazily
+            CACHE_EVENTS.labels("dataset", "miss").inc()
+            DatasetManager._build_cache(cb_name, dataset_version, metadata)
+        else:
+            CACHE_EVENTS.labels("dataset", "hit").inc()
+        return cache_dir
 
-        # convert labels to categorical data
-        # TODO maybe outsource label dict to file in dataset archive
-        # FIXME in (hopefully) rare situations induced by the dataset designer,
-        #  train_set could not contain all labels from test_set or vice versa...)
-        train_cats = pd.Categorical(train_set['label'])
-        test_cats = pd.Categorical(test_set['label'])
-        # make sure labels are int32
-        train_set['label'] = np.asarray(train_cats.codes, dtype=np.int32)
-        test_set['label'] = np.asarray(test_cats.codes, dtype=np.int32)
+    @staticmethod
+    def _build_cache(cb_name: str, dataset_version: str, metadata: DatasetMetadata = None) -> Path:
+        log.info(f"Building cache of Dataset '{dataset_version}' for Codebook <{cb_name}>")
+        if metadata is None:
+            metadata = DatasetManager.get_metadata(cb_name, dataset_version)
+        label_ids = {label: int(idx) for idx, label in metadata.labels.items()}
+        train_csv, test_csv = DatasetManager._get_csv_files(cb_name, dataset_version)
 
-        return train_set, test_set, list(train_cats.categories)
+        tmp_dir = DataHandler.create_tmp_dataset_cache_directory(cb_name, dataset_version)
+        try:
+            build_split_cache(train_csv, tmp_dir, "train", label_ids, conf.backend.datasets.csv_chunk_size)
+            build_split_cache(test_csv, tmp_dir, "test", label_ids, conf.backend.datasets.csv_chunk_size)
+            return DataHandler.publish_dataset_cache(cb_name, dataset_version, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
     @staticmethod
-    def _load_dataframes(cb_name: str, dataset_version: str = "default") -> Tuple[pd.DataFrame, pd.DataFrame]:
-        dataset_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
+    def _get_csv_files(cb_name: str, dataset_version: str = "default",
+                       dataset_dir: Optional[Path] = None) -> Tuple[Path, Path]:
+        if dataset_dir is None:
+            dataset_dir = DataHandler.get_dataset_directory(cb_name, dataset_version=dataset_version)
 
-        # make sure train.csv & test.csv is available and has two columns 'text' and 'label'
+        # make sure train.csv & test.csv is available
         train_csv = dataset_dir.joinpath("train.csv")
         test_csv = dataset_dir.joinpath("test.csv")
 
         if not train_csv.exists() or not test_csv.exists():
             raise DatasetNotAvailableException(cb_name=cb_name, dataset_version=dataset_version)
-        else:
-            # load the dataframes with no header and set the column names to 'text' and 'label'
-            train_df = pd.read_csv(train_csv, header=None)[1:].dropna()
-            if len(train_df.columns) != 2:
-                raise ErroneousDatasetException(msg=f"Training split of Dataset '{dataset_version}' for Codebook "
-                                                    "'{cb_name}' is erroneous because it does not contain exactly two"
-                                                    " columns ('text' and 'label')!")
-            train_df.columns = ['text', 'label']
-
-            test_df = pd.read_csv(test_csv, header=None)[1:].dropna()
-            if len(train_df.columns) != 2:
-                raise ErroneousDatasetException(msg=f"Training split of Dataset '{dataset_version}' for Codebook "
-                                                    "'{cb_name}' is erroneous because it does not contain exactly two"
-                                                    " columns ('text' and 'label')!")
-            test_df.columns = ['text', 'label']
-
-            return train_df, test_df
-
-    @staticmethod
-    def _generate_metadata(cb_name: str, dataset_version: str = "default", ) -> DatasetMetadata:
-        log.info(f"Generating dataset '{dataset_version}' metadata file for Codebook <{cb_name}>")
-        # load and prepare the dataframes
-        train_df, test_df = DatasetManager._load_dataframes(cb_name, dataset_version)
-        train_set, test_set, label_categories = DatasetManager._prepare_dataframes(train_df, test_df)
+        return train_csv, test_csv
+
+    @staticmethod
+    def _scan_csv(csv: Path, cb_name: str, dataset_version: str = "default") -> SplitStatisticsCollector:
+        """
+        Validates that the CSV file has exactly two columns ('text' and 'label') and collects its statistics. The
+        file is read in chunks so that the required memory is bounded by the chunk size and not by the dataset size.
+        :param csv: path of the CSV file
+        :param cb_name: the codebook name
+        :param dataset_version: version of the dataset
+        :return: the collected statistics of the split
+        """
+        collector = SplitStatisticsCollector()
+        try:
+            # the header gets skipped because the columns are identified by their position
+            reader = pd.read_csv(csv, header=None, skiprows=1, dtype=str,
+                                 chunksize=conf.backend.datasets.csv_chunk_size)
+            try:
+                for chunk in reader:
+                    if len(chunk.columns) != 2:
+                        raise ErroneousDatasetException(dataset_version, cb_name,
+                                                        f"'{csv.name}' of Dataset '{dataset_version}' for Codebook "
+                                                        f"'{cb_name}' is erroneous because it does not contain "
+                                                        f"exactly two columns ('text' and 'label')!")
+                    chunk = chunk.dropna()
+                    collector.update(texts=chunk[0], labels=chunk[1])
+            finally:
+                reader.close()
+        except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            raise ErroneousDatasetException(dataset_version, cb_name,
+                                            f"'{csv.name}' of Dataset '{dataset_version}' for Codebook '{cb_name}' "
+                                            f"cannot be parsed!", caused_by=str(e))
+        return collector
+
+    @staticmethod
+    def _scan_dataset(cb_name: str, dataset_version: str = "default",
+                      dataset_dir: Optional[Path] = None) -> Tuple[DatasetMetadata, DatasetStatistics]:
+        """
+        :param dataset_dir: the (staging) directory of the dataset. Defaults to the directory of the stored dataset.
+        """
+        log.info(f"Generating dataset '{dataset_version}' metadata and statistics for Codebook <{cb_name}>")
+        train_csv, test_csv = DatasetManager._get_csv_files(cb_name, dataset_version, dataset_dir)
+        train = DatasetManager._scan_csv(train_csv, cb_name, dataset_version)
+        test = DatasetManager._scan_csv(test_csv, cb_name, dataset_version)
+
+        return DatasetManager._generate_metadata(cb_name, dataset_version, train, test, dataset_dir), \
+            build_dataset_statistics(cb_name, dataset_version, train, test)
+
+    @staticmethod
+    def _generate_metadata(cb_name: str, dataset_version: str, train: SplitStatisticsCollector,
+                           test: SplitStatisticsCollector, dataset_dir: Optional[Path] = None) -> DatasetMetadata:
+        # the ids of the labels are their indices in the sorted training labels
+        label_categories = sorted(train.label_counts.keys())
+        manifest = DataHandler.get_dataset_manifest(cb_name, dataset_version, dataset_dir)
 
         return DatasetMetadata(codebook_name=cb_name,
                                version=dataset_version,
                                labels=dict(enumerate(label_categories)),
-                               num_training_samples=len(train_df),
-                               num_test_samples=len(test_df)
+                               num_training_samples=train.num_samples,
+                               num_test_samples=test.num_samples,
+                               label_counts=dict(sorted(train.label_counts.items())),
+                               is_valid=True,
+                               content_hash=manifest.content_hash if manifest is not None else None
                                )
 
+    @staticmethod
+    def get_statistics(cb_name: str, dataset_version: str) -> DatasetStatistics:
+        if not DatasetManager.is_available(cb_name, dataset_version):
+            raise DatasetNotAvailableException(cb_name=cb_name, dataset_version=dataset_version)
+        try:
+            return DataHandler.get_dataset_statistics(cb_name, dataset_version)
+        except DatasetStatisticsNotAvailableException:
+            # datasets stored before the statistics were computed during the ingestion get scanned once
+            _, statistics = DatasetManager._scan_dataset(cb_name, dataset_version)
+            DataHandler.store_dataset_statistics(cb_name=cb_name, dataset_statistics=statistics)
+            return statistics
+
     @staticmethod
     def get_metadata(cb_name: str, dataset_version: str, from_cache: bool = True) -> DatasetMetadata:
         if from_cache:
@@ -149,8 +346,18 @@ class DatasetManager(object):
 
     @staticmethod
     def _is_valid(cb_name: str, dataset_version: str = "default") -> bool:
-        train_df, test_df = DatasetManager._load_dataframes(cb_name, dataset_version)
-        return ("text" and "label" in train_df) and ("text" and "label" in test_df)
+        metadata = RedisHandler().get_dataset_metadata(cb_name, dataset_version=dataset_version)
+        if metadata.is_valid is None:
+            # metadata of datasets stored before the validation result was cached
+            try:
+                metadata, statistics = DatasetManager._scan_dataset(cb_name, dataset_version)
+                DataHandler.store_dataset_statistics(cb_name=cb_name, dataset_statistics=statistics)
+            except ErroneousDatasetException:
+                metadata.is_valid = False
+            DataHandler.store_dataset_metadata(cb_name=cb_name, dataset_metadata=metadata)
+            RedisHandler().unregister_dataset(cb_name, dataset_version)
+            RedisHandler().register_dataset(cb_name, metadata)
+        return metadata.is_valid
 
     @staticmethod
     def remove(cb_name: str, dataset_version: str):
@@ -0,0 +1,85 @@
+from collections import Counter
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from api.model import SplitStatistics, LengthStatistics, DatasetStatistics
+
+
+class SplitStatisticsCollector(object):
+    """
+    Collects the statistics of a dataset split chunk by chunk while the CSV gets scanned. Besides the per label and
+    per length counters, only a 64-bit hash per sample is kept to find duplicates so that the required memory does
+    not depend on the length of the texts.
+    """
+
+    def __init__(self):
+        self.label_counts = Counter()
+        self.char_length_counts = Counter()
+        self.token_length_counts = Counter()
+        self._text_hashes: List[np.ndarray] = []
+
+    def update(self, texts: pd.Series, labels: pd.Series):
+        self.label_counts.update(labels.value_counts().to_dict())
+        self.char_length_counts.update(texts.str.len().value_counts().to_dict())
+        self.token_length_counts.update(texts.str.split().str.len().value_counts().to_dict())
+        self._text_hashes.append(pd.util.hash_pandas_object(texts, index=False).values)
+
+    @property
+    def num_samples(self) -> int:
+        return sum(self.label_counts.values())
+
+    @property
+    def text_hashes(self) -> np.ndarray:
+        if len(self._text_hashes) == 0:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate(self._text_hashes)
+
+    def build(self) -> SplitStatistics:
+        num_samples = self.num_samples
+        _, counts = np.unique(self.text_hashes, return_counts=True)
+        num_duplicates = int(counts[counts > 1].sum())
+        return SplitStatistics(num_samples=num_samples,
+                               label_counts=dict(sorted(self.label_counts.items())),
+                               label_distribution={label: count / num_samples
+                                                   for label, count in sorted(self.label_counts.items())},
+                               char_lengths=_length_statistics(self.char_length_counts),
+                               token_lengths=_length_statistics(self.token_length_counts),
+                               num_duplicates=num_duplicates,
+                               duplicate_rate=num_duplicates / num_samples if num_samples > 0 else 0.)
+
+
+def build_dataset_statistics(cb_name: str, dataset_version: str,
+                             train: SplitStatisticsCollector, test: SplitStatisticsCollector) -> DatasetStatistics:
+    train_labels = set(train.label_counts.keys())
+    test_labels = set(test.label_counts.keys())
+    return DatasetStatistics(codebook_name=cb_name,
+                             version=dataset_version,
+                             train=train.build(),
+                             test=test.build(),
+                             shared_labels=sorted(train_labels & test_labels),
+                             train_only_labels=sorted(train_labels - test_labels),
+                             test_only_labels=sorted(test_labels - train_labels),
+                             num_test_samples_in_train=int(np.isin(test.text_hashes, train.text_hashes).sum()))
+
+
+def _length_statistics(length_counts: Counter) -> LengthStatistics:
+    if len(length_counts) == 0:
+        return LengthStatistics(min=0, mean=0., p50=0, p90=0, p95=0, p99=0, max=0)
+
+    # exact percentiles from the histogram of the lengths
+    lengths = np.array(sorted(length_counts.keys()), dtype=np.int64)
+    counts = np.array([length_counts[length] for length in lengths], dtype=np.int64)
+    cumulative = np.cumsum(counts)
+
+    def percentile(p: float) -> int:
+        return int(lengths[np.searchsorted(cumulative, p / 100. * cumulative[-1])])
+
+    return LengthStatistics(min=int(lengths[0]),
+                            mean=float((lengths * counts).sum() / cumulative[-1]),
+                            p50=percentile(50),
+                            p90=percentile(90),
+                            p95=percentile(95),
+                            p99=percentile(99),
+                            max=int(lengths[-1]))
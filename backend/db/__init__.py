@@ -1 +1,2 @@
+from backend.db.job_broker import JobBroker
 from backend.db.redis_handler import RedisHandler
@@ -0,0 +1,222 @@
+import json
+import pickle
+import time
+import uuid
+from typing import Any, Optional, List, Dict, Union, Tuple
+
+import redis
+from loguru import logger as log
+
+from backend.metrics import register_callback_gauge
+from config import conf
+
+# the jobs and results are pickled, since they contain requests, results and spans of the backend. Only the API and
+# the worker service (which run the same code) read and write them.
+_KEY_PREFIX = "cba"
+
+PREDICTION_QUEUE = "prediction"
+TRAINING_QUEUE = "training"
+
+# states of the prediction workers
+WORKER_WARMING_UP = "warming_up"
+WORKER_READY = "ready"
+
+
+def _connect() -> redis.Redis:
+    return redis.Redis(host=conf.backend.redis.host, port=int(conf.backend.redis.port),
+                       db=int(conf.backend.workers.redis_db))
+
+
+class SharedDict(object):
+    """
+    Dict-like view of a Redis hash that is shared by all API workers and the worker service, e.g. the training status.
+    The values are pickled, the keys are stored as strings. Can be passed to (spawned) processes, which reconnect.
+    """
+
+    def __init__(self, name: str):
+        self._key = f"{_KEY_PREFIX}:{name}"
+        self._redis: Optional[redis.Redis] = None
+
+    @property
+    def _db(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = _connect()
+        return self._redis
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the connection pool of the client cannot be pickled
+        return {"_key": self._key, "_redis": None}
+
+    def __getitem__(self, key: Union[str, int]) -> Any:
+        value = self._db.hget(self._key, str(key))
+        if value is None:
+            raise KeyError(key)
+        return pickle.loads(value)
+
+    def __setitem__(self, key: Union[str, int], value: Any):
+        self._db.hset(self._key, str(key), pickle.dumps(value))
+
+    def __contains__(self, key: Union[str, int]) -> bool:
+        return self._db.hexists(self._key, str(key))
+
+    def get(self, key: Union[str, int], default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key: Union[str, int], default: Any = None) -> Any:
+        with self._db.pipeline() as pipe:
+            value, _ = pipe.hget(self._key, str(key)).hdel(self._key, str(key)).execute()
+        return pickle.loads(value) if value is not None else default
+
+    def values(self) -> List[Any]:
+        return [pickle.loads(v) for v in self._db.hvals(self._key)]
+
+    def clear(self):
+        self._db.delete(self._key)
+
+
+class JobBroker(object):
+    """
+    Queues of the prediction and training jobs of the 'redis' worker mode. The API workers push jobs and wait for the
+    results of prediction jobs, the worker service (backend/worker.py) pops and processes them.
+    """
+    _singleton = None
+    __jobs: redis.Redis = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._singleton is None:
+            log.info('Instantiating JobBroker!')
+            cls._singleton = super(JobBroker, cls).__new__(cls)
+
+            cls.__jobs = _connect()
+            assert cls.__jobs.ping(), f"Couldn't connect to Redis DB {conf.backend.workers.redis_db} at " \
+                                      f"{conf.backend.redis.host}:{conf.backend.redis.port}!"
+            register_callback_gauge("cba_job_queue_length", "Number of jobs waiting for the worker service by queue",
+                                    ["queue"], JobBroker._count_queued_jobs)
+
+        return cls._singleton
+
+    @staticmethod
+    def _queue_key(queue: str) -> str:
+        return f"{_KEY_PREFIX}:queue:{queue}"
+
+    @staticmethod
+    def _result_key(job_id: str) -> str:
+        return f"{_KEY_PREFIX}:result:{job_id}"
+
+    @staticmethod
+    def new_job_id() -> str:
+        return uuid.uuid4().hex
+
+    def push(self, queue: str, job: Any):
+        self.__jobs.lpush(self._queue_key(queue), pickle.dumps(job))
+
+    def pop(self, queue: str, timeout: int = 5) -> Optional[Any]:
+        """
+        Pops the oldest job of the queue
+        :param timeout: the seconds to wait for a job
+        :return: the job or None if there was none within the timeout
+        """
+        item = self.__jobs.brpop([self._queue_key(queue)], timeout=timeout)
+        return pickle.loads(item[1]) if item is not None else None
+
+    def queue_length(self, queue: str) -> int:
+        return self.__jobs.llen(self._queue_key(queue))
+
+    @staticmethod
+    def _count_queued_jobs() -> List[Tuple[List[str], float]]:
+        try:
+            return [([queue], JobBroker().queue_length(queue)) for queue in [PREDICTION_QUEUE, TRAINING_QUEUE]]
+        except redis.RedisError as e:
+            log.debug(f"Cannot count the queued jobs: {e}")
+            return []
+
+    def put_result(self, job_id: str, result: Any, ttl: int):
+        """
+        Stores the result of a job for the waiting API worker. Results that nobody waits for anymore (e.g. because
+        the API worker timed out) expire after the ttl in seconds.
+        """
+        key = self._result_key(job_id)
+        with self.__jobs.pipeline() as pipe:
+            pipe.lpush(key, pickle.dumps(result)).expire(key, ttl).execute()
+
+    def wait_for_result(self, job_id: str, timeout: int) -> Optional[Any]:
+        """
+        :return: the result of the job or None if it did not finish within the timeout in seconds
+        """
+        item = self.__jobs.brpop([self._result_key(job_id)], timeout=timeout)
+        return pickle.loads(item[1]) if item is not None else None
+
+    @staticmethod
+    def shared_dict(name: str) -> SharedDict:
+        return SharedDict(name)
+
+    def record_model_use(self, cb_name: str, model_version: str, keep: int = 100):
+        """
+        Records that the model was used for a prediction, so that the prediction workers can preload the most
+        recently used models at startup
+        """
+        key = f"{_KEY_PREFIX}:models:recently_used"
+        with self.__jobs.pipeline() as pipe:
+            pipe.zadd(key, {json.dumps([cb_name, model_version]): time.time()})
+            pipe.zremrangebyrank(key, 0, -(keep + 1)).execute()
+
+    def list_recently_used_models(self, num_models: int) -> List[Tuple[str, str]]:
+        """
+        :return: the (cb_name, model_version) of the most recently used models, the most recently used one first
+        """
+        members = self.__jobs.zrevrange(f"{_KEY_PREFIX}:models:recently_used", 0, num_models - 1)
+        return [tuple(json.loads(m)) for m in members]
+
+    def report_worker_state(self, worker_id: str, state: str, ttl: int):
+        """
+        Stores the state of a prediction worker. The state has to be reported again within the ttl in seconds,
+        otherwise the worker is considered gone.
+        """
+        self.__jobs.set(f"{_KEY_PREFIX}:workers:{worker_id}", state, ex=ttl)
+
+    def remove_worker_state(self, worker_id: str):
+        self.__jobs.delete(f"{_KEY_PREFIX}:workers:{worker_id}")
+
+    def list_worker_states(self) -> Dict[str, str]:
+        prefix = f"{_KEY_PREFIX}:workers:"
+        states = dict()
+        for key in self.__jobs.scan_iter(match=f"{prefix}*"):
+            state = self.__jobs.get(key)
+            # the key can expire in between
+            if state is not None:
+                states[key.decode()[len(prefix):]] = state.decode()
+        return states
+
+    def report_worker_service(self, service_id: str, num_prediction_workers: int, ttl: int):
+        """
+        Stores the number of prediction workers that a worker service runs, i.e. how many of them have to be ready.
+        The number has to be reported again within the ttl in seconds, otherwise the service is considered gone.
+        """
+        self.__jobs.set(f"{_KEY_PREFIX}:services:{service_id}", num_prediction_workers, ex=ttl)
+
+    def remove_worker_service(self, service_id: str):
+        self.__jobs.delete(f"{_KEY_PREFIX}:services:{service_id}")
+
+    def count_expected_prediction_workers(self) -> int:
+        """
+        :return: the number of prediction workers of all running worker services
+        """
+        expected = 0
+        for key in self.__jobs.scan_iter(match=f"{_KEY_PREFIX}:services:*"):
+            num_workers = self.__jobs.get(key)
+            # the key can expire in between
+            if num_workers is not None:
+                expected += int(num_workers)
+        return expected
+
+    def are_prediction_workers_ready(self) -> bool:
+        """
+        :return: True if a worker service is running and as many prediction workers as it runs finished preloading
+                 their models
+        """
+        expected = self.count_expected_prediction_workers()
+        num_ready = sum(state == WORKER_READY for state in self.list_worker_states().values())
+        return expected > 0 and num_ready >= expected
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import List, Union, Optional, Type
 
 import redis
 from loguru import logger as log
@@ -6,6 +6,7 @@ from loguru import logger as log
 from api.model import ModelMetadata, DatasetMetadata, TagLabelMapping
 from backend.exceptions import ModelNotAvailableException, DatasetNotAvailableException, \
     TagLabelMappingNotAvailableException, RedisError
+from backend.metrics import observe_redis_call
 from config import conf
 
 
@@ -55,16 +56,29 @@ class RedisHandler(object):
                 raise TagLabelMappingNotAvailableException(cb_name=cb_name, model_version=version)
         return filtered[0]
 
+    @staticmethod
+    def __find_member(db: redis.Redis, cb_name: str, version: str,
+                      metadata_type: Type[Union[ModelMetadata, DatasetMetadata]]) -> Optional[bytes]:
+        # the stored JSON gets looked up instead of serializing the parsed metadata again because metadata that was
+        # stored before fields were added to the model would not match its own serialization anymore
+        for m in db.smembers(cb_name):
+            if metadata_type.parse_raw(m).version == version:
+                return m
+        return None
+
+    @observe_redis_call
     def register_model(self, cb_name: str, metadata: ModelMetadata):
         if not self.__models.sadd(cb_name, metadata.json()) == 1:
             raise RedisError(f"Error while registering model '{metadata.version}' of Codebook '{cb_name}'!")
         log.info(f"Successfully registered model '{metadata.version}' of Codebook '{cb_name}'!")
 
+    @observe_redis_call
     def register_dataset(self, cb_name: str, metadata: DatasetMetadata):
         if not self.__datasets.sadd(cb_name, metadata.json()) == 1:
             raise RedisError(f"Error while registering dataset '{metadata.version}' of Codebook '{cb_name}'!")
         log.info(f"Successfully registered dataset '{metadata.version}' of Codebook '{cb_name}'!")
 
+    @observe_redis_call
     def register_mapping(self, cb_name: str, mapping: TagLabelMapping):
         if not self.__mappings.sadd(cb_name, mapping.json()) == 1:
             raise RedisError(
@@ -72,49 +86,60 @@ class RedisHandler(object):
         log.info(
             f"Successfully registered TagLabelMapping for Codebook '{cb_name}' and model version '{mapping.version}'!")
 
+    @observe_redis_call
     def unregister_model(self, cb_name: str, model_version: str):
-        metadata = self.get_model_metadata(cb_name, model_version)
-        if not self.__models.srem(cb_name, metadata.json()) == 1:
+        self.get_model_metadata(cb_name, model_version)
+        member = self.__find_member(self.__models, cb_name, model_version, ModelMetadata)
+        if not self.__models.srem(cb_name, member) == 1:
             raise RedisError(f"Error while unregistering model '{model_version}' of Codebook '{cb_name}'!")
         log.info(f"Successfully unregistered model '{model_version}' of Codebook '{cb_name}'!")
 
+    @observe_redis_call
     def unregister_dataset(self, cb_name: str, dataset_version: str):
-        metadata = self.get_dataset_metadata(cb_name, dataset_version)
-        if not self.__datasets.srem(cb_name, metadata.json()) == 1:
+        self.get_dataset_metadata(cb_name, dataset_version)
+        member = self.__find_member(self.__datasets, cb_name, dataset_version, DatasetMetadata)
+        if not self.__datasets.srem(cb_name, member) == 1:
             raise RedisError(f"Error while unregistering dataset '{dataset_version}' of Codebook '{cb_name}'")
         log.info(f"Successfully unregistered dataset '{dataset_version}' of Codebook '{cb_name}'")
 
+    @observe_redis_call
     def unregister_mapping(self, cb_name: str, model_version: str):
         mapping = self.get_mapping(cb_name, model_version)
         assert self.__mappings.srem(cb_name, mapping.json()) == 1
         log.info(f"Successfully unregistered TagLabelMapping '{model_version}' of Codebook '{cb_name}'!")
 
+    @observe_redis_call
     def get_model_metadata(self, cb_name: str, model_version: str) -> ModelMetadata:
         m = self.list_models(cb_name)
         if len(m) == 0:
             raise ModelNotAvailableException(model_version=model_version, cb_name=cb_name)
         return self.__filter_by_version(cb_name, m, model_version)
 
+    @observe_redis_call
     def get_dataset_metadata(self, cb_name: str, dataset_version: str) -> DatasetMetadata:
         m = self.list_datasets(cb_name)
         if len(m) == 0:
             raise DatasetNotAvailableException(dataset_version=dataset_version, cb_name=cb_name)
         return self.__filter_by_version(cb_name, m, dataset_version)
 
+    @observe_redis_call
     def get_mapping(self, cb_name: str, model_version: str):
         m = self.list_mappings(cb_name)
         if len(m) == 0:
             raise TagLabelMappingNotAvailableException(model_version=model_version, cb_name=cb_name)
         return self.__filter_by_version(cb_name, m, model_version)
 
+    @observe_redis_call
     def list_mappings(self, cb_name: str) -> List[TagLabelMapping]:
         mappings = self.__mappings.smembers(cb_name)
         return [TagLabelMapping.parse_raw(m) for m in mappings]
 
+    @observe_redis_call
     def list_models(self, cb_name: str) -> List[ModelMetadata]:
         models = self.__models.smembers(cb_name)
         return [ModelMetadata.parse_raw(m) for m in models]
 
+    @observe_redis_call
     def list_datasets(self, cb_name: str) -> List[DatasetMetadata]:
         datasets = self.__datasets.smembers(cb_name)
         return [DatasetMetadata.parse_raw(m) for m in datasets]
@@ -0,0 +1,117 @@
+from pathlib import Path
+from typing import List
+
+from fastapi import UploadFile
+from loguru import logger as log
+
+from api.model import EmbeddingMetadata
+from backend.data_handler import DataHandler
+from backend.exceptions import EmbeddingNotAvailableException, TFHubEmbeddingException
+from backend.lazy_import import LazyModule
+from backend.metrics import CACHE_EVENTS
+from config import conf
+
+hub = LazyModule("tensorflow_hub")
+
+
+class EmbeddingManager(object):
+    _singleton = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._singleton is None:
+            log.info('Instantiating EmbeddingManager!')
+            cls._singleton = super(EmbeddingManager, cls).__new__(cls)
+        return cls._singleton
+
+    @staticmethod
+    def resolve(handle: str) -> str:
+        """
+        Resolves the TF Hub handle of an embedding module to the path of the module in the local module registry. If
+        the module is not yet registered, it gets downloaded from TF Hub (unless the registry is in offline mode).
+        :param handle: the TF Hub handle (URL) of the module or the path of a local module
+        :return: the local path of the module
+        """
+        # local modules are used as they are
+        if Path(handle).is_dir():
+            return handle
+
+        try:
+            module_dir = str(DataHandler.get_embedding_directory(handle))
+            CACHE_EVENTS.labels("embedding", "hit").inc()
+            return module_dir
+        except EmbeddingNotAvailableException as e:
+            CACHE_EVENTS.labels("embedding", "miss").inc()
+            if bool(conf.backend.tfhub.offline):
+                raise e
+        log.warning(f"Embedding module <{handle}> is not in the local module registry!")
+        EmbeddingManager.register(handle)
+        return str(DataHandler.get_embedding_directory(handle))
+
+    @staticmethod
+    def register(handle: str) -> EmbeddingMetadata:
+        """
+        Downloads a module from TF Hub and stores it in the local module registry
+        :param handle: the TF Hub handle (URL) of the module
+        :return: the metadata of the registered module
+        """
+        if EmbeddingManager.is_available(handle):
+            log.info(f"Embedding module <{handle}> is already registered")
+            return DataHandler.get_embedding_metadata(handle)
+
+        log.info(f"Downloading embedding module <{handle}> from TF Hub")
+        try:
+            download_dir = hub.resolve(handle)
+        except Exception as e:
+            log.error(f"Cannot download embedding module <{handle}>: {str(e)}")
+            raise TFHubEmbeddingException(embedding_type=handle)
+        return DataHandler.store_embedding_module(handle, Path(download_dir))
+
+    @staticmethod
+    def store_archive(handle: str, module_archive: UploadFile) -> EmbeddingMetadata:
+        log.info(f"Successfully received archive of embedding module <{handle}>")
+        if EmbeddingManager.is_available(handle):
+            log.warning(f"Embedding module <{handle}> already exists and gets replaced!")
+            DataHandler.purge_embedding_directory(handle)
+        return DataHandler.store_embedding_archive(handle, module_archive)
+
+    @staticmethod
+    def preload():
+        """
+        Makes sure that all modules configured to be preloaded are in the local module registry
+        """
+        for handle in conf.backend.tfhub.preload:
+            if EmbeddingManager.is_available(handle):
+                log.info(f"Embedding module <{handle}> is available in the local module registry")
+            elif bool(conf.backend.tfhub.offline):
+                log.warning(f"Embedding module <{handle}> is not available in the local module registry and cannot "
+                            f"be downloaded in offline mode!")
+            else:
+                try:
+                    EmbeddingManager.register(handle)
+                except TFHubEmbeddingException as e:
+                    log.warning(f"Cannot preload embedding module <{handle}>: {e.message}")
+
+    @staticmethod
+    def is_available(handle: str) -> bool:
+        try:
+            DataHandler.get_embedding_directory(handle)
+            return True
+        except EmbeddingNotAvailableException:
+            return False
+
+    @staticmethod
+    def get_metadata(handle: str) -> EmbeddingMetadata:
+        return DataHandler.get_embedding_metadata(handle)
+
+    @staticmethod
+    def list_embeddings() -> List[EmbeddingMetadata]:
+        return DataHandler.list_embedding_metadata()
+
+    @staticmethod
+    def remove(handle: str) -> bool:
+        try:
+            log.info(f"Removing embedding module <{handle}> from the local module registry")
+            DataHandler.purge_embedding_directory(handle)
+            return True
+        except EmbeddingNotAvailableException:
+            return False
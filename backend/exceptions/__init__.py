@@ -2,7 +2,9 @@ from backend.exceptions.excepts import ErroneousMappingException, ModelNotAvaila
     ErroneousModelException, PredictionError, ModelInitializationException, ErroneousDatasetException, \
     InvalidModelIdException, DatasetNotAvailableException, NoDataForCodebookException, TFHubEmbeddingException, \
     TagLabelMappingNotAvailableException, ModelMetadataNotAvailableException, DatasetMetadataNotAvailableException, \
-    StoringError, RedisError
+    StoringError, RedisError, WarmStartException, EmbeddingNotAvailableException, TrainingError, \
+    ErroneousArchiveException, UploadSessionNotAvailableException, ErroneousUploadException, \
+    DatasetStatisticsNotAvailableException, ProfilingException, ProfileNotAvailableException
 
 __all__ = [ErroneousModelException,
            ModelNotAvailableException,
@@ -18,4 +20,13 @@ __all__ = [ErroneousModelException,
            ModelMetadataNotAvailableException,
            DatasetMetadataNotAvailableException,
            StoringError,
-           RedisError]
+           RedisError,
+           WarmStartException,
+           EmbeddingNotAvailableException,
+           TrainingError,
+           ErroneousArchiveException,
+           UploadSessionNotAvailableException,
+           ErroneousUploadException,
+           DatasetStatisticsNotAvailableException,
+           ProfilingException,
+           ProfileNotAvailableException]
@@ -28,6 +28,32 @@ class ErroneousDatasetException(CBAException):
             self.message = self.message + f"\n\tDue to: {caused_by}"
 
 
+class ErroneousArchiveException(CBAException):
+    def __init__(self, msg: str = None):
+        super(ErroneousArchiveException, self).__init__(msg)
+        if msg is None:
+            self.message = "Uploaded archive is erroneous!"
+        else:
+            self.message = msg
+
+
+class UploadSessionNotAvailableException(CBAException):
+    def __init__(self, upload_id: str = None):
+        super(UploadSessionNotAvailableException, self).__init__(upload_id)
+        self.upload_id = upload_id
+        self.message = f"Upload session <{upload_id}> not available!"
+
+
+class ErroneousUploadException(CBAException):
+    def __init__(self, upload_id: str = None, msg: str = None):
+        super(ErroneousUploadException, self).__init__(upload_id, msg)
+        self.upload_id = upload_id
+        if msg is None:
+            self.message = f"Upload <{upload_id}> is erroneous!"
+        else:
+            self.message = msg
+
+
 class DatasetNotAvailableException(CBAException):
     def __init__(self, dataset_version: str = None, cb_name: str = None):
         super(DatasetNotAvailableException, self).__init__(dataset_version, cb_name)
@@ -46,6 +72,15 @@ class DatasetMetadataNotAvailableException(CBAException):
         self.message = f"Metadata for Dataset <{dataset_version}> for Codebook <{cb_name}> not available!"
 
 
+class DatasetStatisticsNotAvailableException(CBAException):
+    def __init__(self, dataset_version: str = None, cb_name: str = None):
+        super(DatasetStatisticsNotAvailableException, self).__init__(dataset_version, cb_name)
+        self.dataset_version = dataset_version
+        self.codebook = cb_name
+
+        self.message = f"Statistics for Dataset <{dataset_version}> for Codebook <{cb_name}> not available!"
+
+
 class TagLabelMappingNotAvailableException(CBAException):
     def __init__(self, model_version: str = None, cb_name: str = None):
         super(TagLabelMappingNotAvailableException, self).__init__(model_version, cb_name)
@@ -105,6 +140,18 @@ class ModelMetadataNotAvailableException(CBAException):
             self.message = f"Metadata for Model <{model_version}> for Codebook <{cb_name}> not available!"
 
 
+class WarmStartException(CBAException):
+    def __init__(self, base_model_version: str = None, cb_name: str = None, caused_by: str = None):
+        super(WarmStartException, self).__init__(base_model_version, cb_name, caused_by)
+        self.base_model_version = base_model_version
+        self.codebook = cb_name
+        self.caused_by = caused_by
+        self.message = f"Cannot warm-start from Model <{base_model_version}> for Codebook <{cb_name}>!"
+
+        if caused_by is not None:
+            self.message = self.message + f"\n\tDue to: {caused_by}"
+
+
 class ModelInitializationException(CBAException):
     def __init__(self, cb_name: str, path: str, caused_by: str = None):
         super(ModelInitializationException, self).__init__(cb_name, path, caused_by)
@@ -126,12 +173,28 @@ class PredictionError(CBAException):
             self.message = msg
 
 
+class TrainingError(CBAException):
+    def __init__(self, msg: str = None, ):
+        super(TrainingError, self).__init__(msg)
+        if msg is None:
+            self.message = "Critical internal error occurred during training!"
+        else:
+            self.message = msg
+
+
 class TFHubEmbeddingException(CBAException):
     def __init__(self, embedding_type: str):
         super(TFHubEmbeddingException, self).__init__(embedding_type)
         self.message = f"Cannot load embedding layer of type <{embedding_type}> from TF Hub!"
 
 
+class EmbeddingNotAvailableException(CBAException):
+    def __init__(self, embedding_type: str):
+        super(EmbeddingNotAvailableException, self).__init__(embedding_type)
+        self.embedding_type = embedding_type
+        self.message = f"Embedding module <{embedding_type}> is not available in the local module registry!"
+
+
 class StoringError(CBAException):
     def __init__(self, msg: str = None, caused_by: str = None):
         super(StoringError, self).__init__(msg, caused_by)
@@ -148,3 +211,15 @@ class RedisError(CBAException):
     def __init__(self, msg: str = None):
         super(RedisError, self).__init__(msg)
         self.message = msg
+
+
+class ProfilingException(CBAException):
+    def __init__(self, msg: str):
+        super(ProfilingException, self).__init__(msg)
+        self.message = msg
+
+
+class ProfileNotAvailableException(CBAException):
+    def __init__(self, name: str, cb_name: str, model_version: str):
+        super(ProfileNotAvailableException, self).__init__(name, cb_name, model_version)
+        self.message = f"Profile '{name}' of model '{model_version}' for Codebook <{cb_name}> is not available!"
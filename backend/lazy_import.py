@@ -0,0 +1,46 @@
+"""
+Lazy imports of heavy dependencies. TensorFlow and TF Hub take seconds to import and add hundreds of MB to the
+resident memory of a process, but only the prediction and training paths need them. Modules of the backend therefore
+refer to them via LazyModule, so that the API starts (and serves metadata requests) without importing them.
+"""
+import importlib
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule(ModuleType):
+    """
+    Stands in for a module that gets imported on first access of one of its attributes, e.g.
+
+        tf = LazyModule("tensorflow")
+
+    The import is done with importlib and hence thread-safe. Note that annotations are evaluated when a function is
+    defined, so modules that refer to a LazyModule in annotations need 'from __future__ import annotations'.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__module: Optional[ModuleType] = None
+
+    def __getattr__(self, attr: str):
+        # only called for attributes that are not set on the LazyModule itself
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name__)
+        return getattr(self.__module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__name__}' ({'imported' if is_imported(self) else 'not imported'})>"
+
+
+def is_imported(module: ModuleType) -> bool:
+    return module.__name__ in sys.modules
+
+
+def ensure_imported(*modules: ModuleType):
+    """
+    Imports the modules now, e.g. in the API process before spawning prediction or training processes, so that the
+    (forked) processes inherit the imported modules instead of importing them again each
+    """
+    for module in modules:
+        importlib.import_module(module.__name__)
@@ -0,0 +1,81 @@
+"""
+Prometheus metrics of the API, the predictions and the trainings. The metrics are collected in the process of the
+API and exposed at /metrics. Metrics are only recorded in the API process, so anything that happens in the
+prediction and training processes has to be reported back to it (e.g. the model load time of a prediction).
+Every API worker process has its own metrics, so with several workers /metrics has to be scraped per worker. Only
+the gauges that are computed from Redis (e.g. the lengths of the job queues) are the same for all workers.
+"""
+import time
+from functools import wraps
+from typing import Callable, Iterable, List, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from backend.tracing import span
+
+REQUEST_DURATION = Histogram("cba_http_request_duration_seconds",
+                             "Latency of HTTP requests by route template",
+                             ["method", "route", "status"],
+                             buckets=(.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60., 120.))
+REQUESTS_IN_FLIGHT = Gauge("cba_http_requests_in_flight",
+                           "Number of HTTP requests that are currently processed",
+                           ["method", "route"])
+
+PREDICTION_BATCH_SIZE = Histogram("cba_prediction_batch_size",
+                                  "Number of documents per prediction request",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+PREDICTION_DURATION = Histogram("cba_prediction_duration_seconds",
+                                "Duration of prediction requests including loading the model",
+                                ["outcome"],
+                                buckets=(.05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.))
+MODEL_LOAD_DURATION = Histogram("cba_model_load_duration_seconds",
+                                "Duration of loading a model for predictions",
+                                buckets=(.05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.))
+
+CACHE_EVENTS = Counter("cba_cache_events_total",
+                       "Hits, misses and evictions of the caches (e.g. dataset caches or embedding modules)",
+                       ["cache", "event"])
+
+REDIS_CALL_DURATION = Histogram("cba_redis_call_duration_seconds",
+                                "Latency of RedisHandler calls",
+                                ["operation"],
+                                buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.))
+
+
+class _CallbackGauge(object):
+    """
+    Gauge whose labeled values are computed by a callback when the metrics are scraped
+    """
+
+    def __init__(self, name: str, documentation: str, labels: List[str],
+                 callback: Callable[[], Iterable[Tuple[List[str], float]]]):
+        self._name = name
+        self._documentation = documentation
+        self._labels = labels
+        self._callback = callback
+
+    def collect(self):
+        gauge = GaugeMetricFamily(self._name, self._documentation, labels=self._labels)
+        for label_values, value in self._callback():
+            gauge.add_metric(label_values, value)
+        yield gauge
+
+
+def register_callback_gauge(name: str, documentation: str, labels: List[str],
+                            callback: Callable[[], Iterable[Tuple[List[str], float]]]):
+    REGISTRY.register(_CallbackGauge(name, documentation, labels, callback))
+
+
+def observe_redis_call(fn: Callable) -> Callable:
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            # Redis lookups are also phases of the traced requests
+            with span(f"redis.{fn.__name__}"):
+                return fn(*args, **kwargs)
+        finally:
+            REDIS_CALL_DURATION.labels(fn.__name__).observe(time.perf_counter() - start)
+
+    return wrapper
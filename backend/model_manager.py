@@ -1,16 +1,22 @@
 import re
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 
-import tensorflow as tf
 from fastapi import UploadFile
 from loguru import logger as log
 
-from api.model import ModelMetadata, TrainingRequest
+from api.model import ModelMetadata, TrainingRequest, TrainingPerformance, ModelVariant, ModelCompaction, \
+    CompactionResult
+from backend import tracing
 from backend.data_handler import DataHandler
 from backend.dataset_manager import DatasetManager
 from backend.db.redis_handler import RedisHandler
 from backend.exceptions import ErroneousModelException, ModelNotAvailableException, NoDataForCodebookException, \
-    InvalidModelIdException
+    InvalidModelIdException, WarmStartException
+from backend.lazy_import import LazyModule
+from backend.zip_stream import ZipStream
+from config import conf
+
+tf = LazyModule("tensorflow")
 
 
 class ModelManager(object):
@@ -47,15 +53,25 @@ class ModelManager(object):
         return True
 
     @staticmethod
-    def load(cb_name: str, model_version: str = "default"):
+    def load(cb_name: str, model_version: str = "default", optimized: bool = True):
         """
         Loads the Tensorflow Estimator model for the given Codebook
         :param cb_name: the codebook name
         :param model_version: version tag of the model (e.g. "default")
+        :param optimized: if True, the CPU-optimized variant of the model gets loaded if it exists. Its signature
+               'predict_text' takes raw texts instead of serialized tf.Examples.
         :return: the Tensorflow Estimator model for the given Codebook
         """
+        if optimized:
+            optimized_dir = DataHandler.get_optimized_model_directory(cb_name, model_version=model_version)
+            if tf.saved_model.contains_saved_model(str(optimized_dir)):
+                log.info(f"Loading optimized variant of model '{model_version}' for Codebook {cb_name}")
+                with tracing.span("model.load", variant="optimized"):
+                    return tf.saved_model.load(str(optimized_dir))
+
         model_dir = DataHandler.get_model_directory(cb_name, model_version=model_version)
-        estimator = tf.saved_model.load(str(model_dir))
+        with tracing.span("model.load", variant="saved_model"):
+            estimator = tf.saved_model.load(str(model_dir))
         if estimator.signatures["predict"] is None:
             raise ErroneousModelException(
                 msg=f"Estimator / Model of version '{model_version}' for Codebook %s is erroneous!" % cb_name)
@@ -80,7 +96,12 @@ class ModelManager(object):
             raise ModelNotAvailableException(cb_name=cb_name, model_version="default")
 
     @staticmethod
-    def publish_model(r: TrainingRequest, eval_results: Dict[str, float]) -> ModelMetadata:
+    def publish_model(r: TrainingRequest,
+                      eval_results: Dict[str, float],
+                      stopped_at_step: Optional[int] = None,
+                      best_step: Optional[int] = None,
+                      performance: Optional[TrainingPerformance] = None,
+                      optimized_variant: Optional[ModelVariant] = None) -> ModelMetadata:
 
         log.info(f"Generating model metadata for model '{r.model_version}' of Codebook '{r.cb_name}'")
 
@@ -93,7 +114,12 @@ class ModelManager(object):
             labels=dataset_metadata.labels,
             model_type='DNNClassifier',  # TODO
             evaluation=eval_results,
-            model_config=r.model_config.dict()
+            model_config=r.model_config.dict(),
+            stopped_at_step=stopped_at_step,
+            best_step=best_step,
+            base_model_version=r.base_model_version,
+            performance=performance,
+            optimized_variant=optimized_variant
         )
 
         DataHandler.store_model_metadata(r.cb_name, metadata)
@@ -101,6 +127,46 @@ class ModelManager(object):
 
         return metadata
 
+    @staticmethod
+    def get_warm_start_checkpoint(r: TrainingRequest) -> str:
+        """
+        Checks if the base model of the TrainingRequest can be used to warm-start the new model and returns the path
+        of the checkpoint to warm-start from.
+        :param r: the TrainingRequest with the base model version
+        :return: the path prefix of the variables of the SavedModel of the base model or of its latest checkpoint
+        """
+        cb_name, base_version = r.cb_name, r.base_model_version
+        if base_version == r.model_version:
+            raise WarmStartException(base_version, cb_name,
+                                     caused_by="The base model would be overwritten by the new model!")
+        if not ModelManager.is_available(cb_name, base_version, complete_check=True):
+            raise WarmStartException(base_version, cb_name, caused_by="The base model is not available!")
+
+        # the label set defines the shape of the logits layer and the meaning of the class ids
+        base_metadata = ModelManager.get_metadata(cb_name, base_version)
+        dataset_metadata = DatasetManager.get_metadata(cb_name, r.dataset_version)
+        if base_metadata.labels != dataset_metadata.labels:
+            raise WarmStartException(base_version, cb_name,
+                                     caused_by=f"The labels of the base model ({list(base_metadata.labels.values())})"
+                                               f" do not match the labels of Dataset '{r.dataset_version}' "
+                                               f"({list(dataset_metadata.labels.values())})!")
+        for param in ["embedding_type", "hidden_units"]:
+            if base_metadata.model_config.get(param) != getattr(r.model_config, param):
+                raise WarmStartException(base_version, cb_name,
+                                         caused_by=f"The {param} of the base model "
+                                                   f"({base_metadata.model_config.get(param)}) does not match the "
+                                                   f"{param} of the new model ({getattr(r.model_config, param)})!")
+
+        # the variables of an exported Estimator SavedModel are stored as a (name based) checkpoint and are exactly
+        # the weights of the published model (e.g. the best checkpoint if early stopping was used)
+        model_dir = DataHandler.get_model_directory(cb_name, model_version=base_version)
+        checkpoint = model_dir.joinpath("variables", "variables")
+        if not model_dir.joinpath("variables", "variables.index").exists():
+            checkpoint = tf.train.latest_checkpoint(str(model_dir))
+        if checkpoint is None:
+            raise WarmStartException(base_version, cb_name, caused_by="The base model contains no checkpoint!")
+        return str(checkpoint)
+
     @staticmethod
     def store_uploaded_model(cb_name: str, model_version: str, model_archive: UploadFile) -> str:
         # TODO register in redis
@@ -118,6 +184,48 @@ class ModelManager(object):
             f"Successfully persisted model '{model_version}' for Codebook <{cb_name}> under {path}!")
         return str(path)
 
+    @staticmethod
+    def get_archive(cb_name: str, model_version: str = "default", serving_only: bool = True) -> ZipStream:
+        """
+        Builds a zip archive of the model that gets generated on the fly while it is read
+        :param cb_name: the codebook name
+        :param model_version: version tag of the model (e.g. "default")
+        :param serving_only: if True only the files required for serving the model are part of the archive
+        :return: the archive of the model
+        """
+        if not ModelManager.is_available(cb_name, model_version):
+            raise ModelNotAvailableException(cb_name=cb_name, model_version=model_version)
+        files = DataHandler.list_model_files(cb_name, model_version, serving_only=serving_only)
+        log.info(f"Streaming archive of model '{model_version}' for Codebook {cb_name} with {len(files)} files")
+        return ZipStream(files)
+
+    @staticmethod
+    def prune(cb_name: str, model_version: str = "default") -> ModelCompaction:
+        """
+        Applies the configured retention policy of training artifacts (checkpoints, event files) to a model
+        :param cb_name: the codebook name
+        :param model_version: version tag of the model (e.g. "default")
+        :return: the removed checkpoints and freed bytes
+        """
+        return DataHandler.prune_model_directory(cb_name, model_version,
+                                                 keep_checkpoints=int(conf.backend.export.keep_checkpoints),
+                                                 keep_best_checkpoint=bool(conf.backend.export.keep_best_checkpoint),
+                                                 keep_event_files=bool(conf.backend.export.keep_event_files))
+
+    @staticmethod
+    def compact(cb_name: Optional[str] = None) -> CompactionResult:
+        """
+        Prunes all published models, e.g. models that were trained before the retention policy was applied
+        :param cb_name: the codebook name. If None, the models of all Codebooks get pruned.
+        :return: the removed checkpoints and freed bytes per model
+        """
+        codebooks = DataHandler.list_codebooks() if cb_name is None else [cb_name]
+        models = [ModelManager.prune(cb, mv)
+                  for cb in codebooks for mv in DataHandler.list_published_model_versions(cb)]
+        bytes_freed = sum(m.bytes_freed for m in models)
+        log.info(f"Compacted {len(models)} models and freed {bytes_freed} bytes")
+        return CompactionResult(models=models, bytes_freed=bytes_freed)
+
     @staticmethod
     def remove(cb_name: str, model_version: str):
         try:
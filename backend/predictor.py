@@ -1,18 +1,26 @@
 import os
+import time
+from functools import lru_cache
 from multiprocessing import Process, Queue
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Tuple, Union, Optional, NamedTuple
 
-import tensorflow as tf
+import numpy as np
 from loguru import logger as log
 
 from api.model import DocumentDTO, PredictionResult, MultiDocumentPredictionResult, PredictionRequest, \
-    MultiDocumentPredictionRequest, TagLabelMapping
-from backend import DatasetManager
+    MultiDocumentPredictionRequest, ProfilingRequest, ProfilingTarget, ProbabilityOutputOptions
+from backend import DatasetManager, tracing
+from backend.db.job_broker import JobBroker, PREDICTION_QUEUE
 from backend.exceptions import ErroneousModelException, ErroneousMappingException, PredictionError, \
     ModelNotAvailableException
+from backend.lazy_import import LazyModule, ensure_imported
+from backend.metrics import PREDICTION_BATCH_SIZE, PREDICTION_DURATION, MODEL_LOAD_DURATION, CACHE_EVENTS
 from backend.model_manager import ModelManager
+from backend.profiler import Profiler
 from config import conf
 
+tf = LazyModule("tensorflow")
+
 
 # TODO
 #  - split up document text into chunks of MAX_SEQ_LEN (200?!)
@@ -21,6 +29,28 @@ from config import conf
 #  - testing
 
 
+class PredictionJob(NamedTuple):
+    """
+    Prediction that is processed by a prediction worker of the worker service ('redis' worker mode)
+    """
+    job_id: str
+    request: Union[PredictionRequest, MultiDocumentPredictionRequest]
+    profiling: Optional[ProfilingRequest]
+    # in ns since the epoch
+    submitted_at: int
+    # id of the span of the trace of the request in the API worker (None if the request is not traced)
+    parent_span_id: Optional[str]
+
+
+class PredictionJobResult(NamedTuple):
+    result: Optional[Union[PredictionResult, MultiDocumentPredictionResult]]
+    error: Optional[str]
+    # None if the model was already loaded by the prediction worker
+    load_seconds: Optional[float]
+    evicted_models: int
+    spans: List[tracing.Span]
+
+
 class Predictor(object):
     _singleton = None
 
@@ -45,20 +75,24 @@ class Predictor(object):
         if not ModelManager.is_available(req.cb_name, req.model_version):
             raise ModelNotAvailableException(cb_name=req.cb_name, model_version=req.model_version)
 
-        def p_single(r: PredictionRequest, q: Queue):
+        def p_single(r: PredictionRequest, q: Queue, spawned_at: int, profiling: Optional[ProfilingRequest]):
             try:
                 cb_name = r.cb_name
                 doc = r.doc
                 model_version = r.model_version
 
-                # load the model
-                model = ModelManager.load(cb_name, model_version=model_version)
-                # build the sample(s) for the doc
-                samples = self._build_tf_sample(doc)
-                # get predictions
-                prediction = model.signatures["predict"](examples=samples)
-                # build result and add to queue
-                q.put(self._build_prediction_result(r, prediction))
+                with tracing.collect_spans() as spans, Profiler.profile(profiling):
+                    tracing.add_span("predictor.spawn_process", spawned_at, time.time_ns())
+                    # load the model
+                    start = time.perf_counter()
+                    model = ModelManager.load(cb_name, model_version=model_version)
+                    load_seconds = time.perf_counter() - start
+                    # get predictions
+                    prediction = self._predict(model, [doc])
+                    # build result
+                    result = self._build_prediction_result(r, prediction)
+                # add the result to the queue
+                q.put((result, load_seconds, spans))
             except Exception as e:
                 # if any error occurs, return
                 log.error("Error occurred within prediction process with PID " + str(os.getpid()) + "!")
@@ -67,20 +101,25 @@ class Predictor(object):
                     log.error(e.message)
                 return
 
-        def p_multi(r: MultiDocumentPredictionRequest, q: Queue):
+        def p_multi(r: MultiDocumentPredictionRequest, q: Queue, spawned_at: int,
+                    profiling: Optional[ProfilingRequest]):
             try:
                 cb_name = r.cb_name
                 docs = r.docs
                 model_version = r.model_version
 
-                # load the model
-                model = ModelManager.load(cb_name, model_version=model_version)
-                # build the sample(s) for the doc
-                samples = [self._build_tf_sample(doc) for doc in docs]
-                # get predictions
-                predictions = [model.signatures["predict"](examples=sample) for sample in samples]
-                # build result and add to queue
-                q.put(self._build_multi_prediction_result(r, predictions))
+                with tracing.collect_spans() as spans, Profiler.profile(profiling):
+                    tracing.add_span("predictor.spawn_process", spawned_at, time.time_ns())
+                    # load the model
+                    start = time.perf_counter()
+                    model = ModelManager.load(cb_name, model_version=model_version)
+                    load_seconds = time.perf_counter() - start
+                    # get predictions
+                    predictions = self._predict(model, docs)
+                    # build result
+                    result = self._build_multi_prediction_result(r, predictions)
+                # add the result to the queue
+                q.put((result, load_seconds, spans))
             except Exception as e:
                 # if any error occurs, return
                 log.error("Error occurred within prediction process with PID " + str(os.getpid()) + "!")
@@ -89,142 +128,245 @@ class Predictor(object):
                     log.error(e.message)
                 return
 
+        # profiling is turned on for the next predictions of a model via the profiling endpoints
+        profiling = Profiler.take(ProfilingTarget.prediction, req.cb_name, req.model_version)
+        if conf.backend.workers.mode == "redis":
+            return Predictor._predict_with_workers(req, profiling)
+
+        # TensorFlow is imported by the first prediction (or training) only, so that the API starts without it. The
+        # import is done here and not in the prediction processes, which inherit the imported modules.
+        ensure_imported(tf)
         queue = Queue()
+        start = time.perf_counter()
 
         if isinstance(req, PredictionRequest):
             log.info("Spawning new single document prediction process.")
-            proc = Process(target=p_single, args=(req, queue,))
+            proc = Process(target=p_single, args=(req, queue, time.time_ns(), profiling))
+            PREDICTION_BATCH_SIZE.observe(1)
         elif isinstance(req, MultiDocumentPredictionRequest):
             log.info("Spawning new multi document prediction process.")
-            proc = Process(target=p_multi, args=(req, queue,))
+            proc = Process(target=p_multi, args=(req, queue, time.time_ns(), profiling))
+            PREDICTION_BATCH_SIZE.observe(len(req.docs))
 
-        proc.start()
-        log.info("Started prediction process with PID " + str(proc.pid) + ".")
+        # the spans of the prediction process are nested in this span
+        with tracing.span("predictor.process"):
+            proc.start()
+            log.info("Started prediction process with PID " + str(proc.pid) + ".")
 
-        log.info("Waiting for prediction process with PID " + str(proc.pid) + " ...")
-        proc.join()
+            log.info("Waiting for prediction process with PID " + str(proc.pid) + " ...")
+            proc.join()
 
         if not queue.empty():
             log.info("Prediction process with PID " + str(proc.pid) + " finished successfully!")
-            res = queue.get()
+            res, load_seconds, spans = queue.get()
             queue.close()
+            tracing.add_spans(spans)
+            MODEL_LOAD_DURATION.observe(load_seconds)
+            PREDICTION_DURATION.labels("success").observe(time.perf_counter() - start)
             return res
         else:
             if proc.is_alive():
                 proc.kill()
             queue.close()
+            PREDICTION_DURATION.labels("error").observe(time.perf_counter() - start)
             log.error(
                 "Prediction process with PID " + str(proc.pid) + " finished erroneously! Process terminated!")
             raise PredictionError()
 
     @staticmethod
-    def _build_tf_sample(doc: DocumentDTO):
-        ex = tf.train.Example()
-        ex.features.feature['text'].bytes_list.value.extend([bytes(doc.text, encoding='utf-8')])
-        return tf.constant(ex.SerializeToString())
+    def _predict_with_workers(req: Union[PredictionRequest, MultiDocumentPredictionRequest],
+                              profiling: Optional[ProfilingRequest]) -> \
+            Union[PredictionResult, MultiDocumentPredictionResult]:
+        """
+        Sends the prediction as job to the prediction workers of the worker service (see backend/worker.py), which
+        keep the recently used models loaded, and waits for the result
+        """
+        broker = JobBroker()
+        timeout = int(conf.backend.workers.prediction_timeout)
+        PREDICTION_BATCH_SIZE.observe(1 if isinstance(req, PredictionRequest) else len(req.docs))
+        start = time.perf_counter()
+
+        # the spans of the prediction worker are nested in this span
+        with tracing.span("predictor.job"):
+            job = PredictionJob(job_id=broker.new_job_id(), request=req, profiling=profiling,
+                                submitted_at=time.time_ns(), parent_span_id=tracing.current_span_id())
+            broker.push(PREDICTION_QUEUE, job)
+            log.info(f"Waiting for prediction job <{job.job_id}> ...")
+            res: Optional[PredictionJobResult] = broker.wait_for_result(job.job_id, timeout)
+
+        if res is None or res.error is not None:
+            PREDICTION_DURATION.labels("error").observe(time.perf_counter() - start)
+            if res is None:
+                log.error(f"Prediction job <{job.job_id}> did not finish within {timeout} seconds! Is the worker "
+                          f"service running?")
+            else:
+                tracing.add_spans(res.spans)
+                log.error(f"Prediction job <{job.job_id}> finished erroneously! {res.error}")
+            raise PredictionError()
+
+        log.info(f"Prediction job <{job.job_id}> finished successfully!")
+        tracing.add_spans(res.spans)
+        if res.load_seconds is not None:
+            CACHE_EVENTS.labels("model", "miss").inc()
+            MODEL_LOAD_DURATION.observe(res.load_seconds)
+        else:
+            CACHE_EVENTS.labels("model", "hit").inc()
+        if res.evicted_models > 0:
+            CACHE_EVENTS.labels("model", "eviction").inc(res.evicted_models)
+        PREDICTION_DURATION.labels("success").observe(time.perf_counter() - start)
+        return res.result
 
     @staticmethod
-    def _build_prediction_result(req: PredictionRequest, pred) -> PredictionResult:
+    def predict_with_model(req: Union[PredictionRequest, MultiDocumentPredictionRequest], model) -> \
+            Union[PredictionResult, MultiDocumentPredictionResult]:
+        """
+        Predicts the Tags of the document(s) of the request with the loaded model (see ModelManager.load)
+        """
+        if isinstance(req, PredictionRequest):
+            return Predictor._build_prediction_result(req, Predictor._predict(model, [req.doc]))
+        return Predictor._build_multi_prediction_result(req, Predictor._predict(model, req.docs))
 
-        # get the actual labels from the predicted class ids via the dataset id to label map
-        mm = ModelManager().get_metadata(req.cb_name, req.model_version)
-        dm = DatasetManager().get_metadata(req.cb_name, mm.dataset_version)
-        pred_label = dm.labels[str(pred['class_ids'].numpy()[0, 0])]
+    @staticmethod
+    def warm_up(model, batch_sizes: List[int]):
+        """
+        Predicts dummy batches of the given sizes with the loaded model (see ModelManager.load), so that the first
+        predictions do not pay for tracing and initializing the graph of the model
+        """
+        text = "This is a dummy document to warm up the model."
+        for batch_size in batch_sizes:
+            if "predict_text" in model.signatures:
+                model.signatures["predict_text"](text=tf.constant([text] * batch_size))
+            else:
+                sample = Predictor._build_tf_sample(DocumentDTO(text=text))
+                model.signatures["predict"](examples=tf.stack([sample] * batch_size))
 
-        classes = list(dm.labels.values())
+    @staticmethod
+    def _predict(model, docs: List[DocumentDTO]):
+        """
+        Predicts all docs with a single call of the model
+        :return: the outputs of the model, e.g. the probabilities of shape [len(docs), number of classes]
+        """
+        # the optimized variant of a model takes raw texts
+        if "predict_text" in model.signatures:
+            with tracing.span("predictor.signature_call", signature="predict_text", batch_size=len(docs)):
+                return model.signatures["predict_text"](text=tf.constant([doc.text for doc in docs]))
+        # build the samples for the docs
+        samples = tf.stack([Predictor._build_tf_sample(doc) for doc in docs])
+        with tracing.span("predictor.signature_call", signature="predict", batch_size=len(docs)):
+            return model.signatures["predict"](examples=samples)
 
-        probs = pred['probabilities'].numpy()[0].tolist()
+    @staticmethod
+    def _build_tf_sample(doc: DocumentDTO):
+        with tracing.span("predictor.build_sample"):
+            ex = tf.train.Example()
+            ex.features.feature['text'].bytes_list.value.extend([bytes(doc.text, encoding='utf-8')])
+            return tf.constant(ex.SerializeToString())
 
-        cb_name = req.cb_name
-        if not len(probs) == len(classes):
-            raise ErroneousModelException(cb_name=cb_name)
+    @staticmethod
+    def _build_prediction_result(req: PredictionRequest, pred) -> PredictionResult:
+        pred_tags, probabilities = Predictor._map_predictions(req, pred)
 
-        # apply mapping
         doc = req.doc
-        mapping = req.mapping
-        probabilities, pred_tag = Predictor._apply_mapping(pred_label, classes, probs, mapping, cb_name)
-
         return PredictionResult(
             doc_id=doc.doc_id,
             proj_id=doc.proj_id,
-            codebook_name=cb_name,
-            predicted_tag=pred_tag,
-            probabilities=probabilities
+            codebook_name=req.cb_name,
+            predicted_tag=pred_tags[0],
+            probabilities=probabilities[0]
         )
 
     @staticmethod
     def _build_multi_prediction_result(req: MultiDocumentPredictionRequest,
-                                       preds: List) -> MultiDocumentPredictionResult:
-
-        # get the actual labels from the predicted class ids via the dataset id to label map
-        mm = ModelManager().get_metadata(req.cb_name, req.model_version)
-        dm = DatasetManager().get_metadata(req.cb_name, mm.dataset_version)
-        pred_labels = [dm.labels[str(p['class_ids'].numpy()[0, 0])] for p in preds]
-
-        classes = list(dm.labels.values())
-
-        probs_list = [p['probabilities'].numpy()[0].tolist() for p in preds]
-
-        cb_name = req.cb_name
-        if not len(probs_list[0]) == len(classes):
-            raise ErroneousModelException(cb_name=cb_name)
-
-        # apply CodeAnno tag to class label mapping
-        mapping = req.mapping
-        probabilities, pred_tags = dict(), dict()
-        for pred_label, probs, doc in zip(pred_labels, probs_list, req.docs):
-            mapped_probs, pred_tag = Predictor._apply_mapping(pred_label, classes, probs, mapping, cb_name)
-            probabilities[doc.doc_id] = mapped_probs
-            pred_tags[doc.doc_id] = pred_tag
+                                       preds) -> MultiDocumentPredictionResult:
+        pred_tags, probabilities = Predictor._map_predictions(req, preds)
 
+        doc_ids = [doc.doc_id for doc in req.docs]
         return MultiDocumentPredictionResult(
             proj_id=req.docs[0].proj_id,
-            codebook_name=cb_name,
-            predicted_tags=pred_tags,
-            probabilities=probabilities
+            codebook_name=req.cb_name,
+            predicted_tags=dict(zip(doc_ids, pred_tags)),
+            probabilities=dict(zip(doc_ids, probabilities))
         )
 
     @staticmethod
-    def _verify_mapping(classes: List[str], tag_label_map: TagLabelMapping, cb_name: str):
-
-        correct = True
-
-        tag_label_map = tag_label_map.map
-        if tag_label_map is None:
-            correct = False
-
-        tags = tag_label_map.keys()
-        if len(tags) != len(classes):
-            correct = False
+    def _map_predictions(req: Union[PredictionRequest, MultiDocumentPredictionRequest], preds) -> \
+            Tuple[List[str], List[Dict[str, float]]]:
+        """
+        Maps the predicted classes and the selected probabilities of all docs of the request to the CodeAnno tags of
+        the mapping of the request or, if there is none, to the class labels
+        :return: the predicted tag and the tag to probability dict of each doc
+        """
+        # get the actual labels from the predicted class ids via the dataset id to label map
+        mm = ModelManager().get_metadata(req.cb_name, req.model_version)
+        dm = DatasetManager().get_metadata(req.cb_name, mm.dataset_version)
+        classes = tuple(dm.labels.values())
+
+        class_ids = preds['class_ids'].numpy()[:, 0]
+        probs = preds['probabilities'].numpy()
+        if not probs.shape[1] == len(classes):
+            raise ErroneousModelException(cb_name=req.cb_name)
+
+        # select the returned probabilities of all docs at once before building the dicts
+        selected = Predictor._select_probabilities(probs, req)
+
+        with tracing.span("predictor.apply_mapping"):
+            if req.mapping is not None:
+                # apply CodeAnno tag to class label mapping to all docs at once
+                tags, class_of_tag, tag_of_class = Predictor._compile_mapping(req.cb_name, req.model_version, classes,
+                                                                              tuple(req.mapping.map.items()))
+                probs, selected, pred_ids = probs[:, class_of_tag], selected[:, class_of_tag], tag_of_class[class_ids]
+            else:
+                tags, pred_ids = classes, class_ids
 
-        if not correct:
-            raise ErroneousMappingException(cb_name)
+            pred_tags = [tags[idx] for idx in pred_ids.tolist()]
+            probabilities = [dict(zip([tags[idx] for idx in np.flatnonzero(sel).tolist()], doc_probs[sel].tolist()))
+                             for doc_probs, sel in zip(probs, selected)]
+        return pred_tags, probabilities
 
     @staticmethod
-    def _apply_mapping(pred_label: str,
-                       classes: List[str],
-                       probs: List[float],
-                       tag_label_map: TagLabelMapping,
-                       cb_name: str) \
-            -> Tuple[Dict[str, float], str]:
-
-        not_mapped = dict(zip(classes, probs))
-
-        if tag_label_map is not None:
-            Predictor._verify_mapping(classes, tag_label_map, cb_name)
-
-            tag_label_map = tag_label_map.map
-
-            label_tag_map = {v: k for k, v in tag_label_map.items()}
+    def _select_probabilities(probs: np.ndarray, options: ProbabilityOutputOptions) -> np.ndarray:
+        """
+        Selects the probabilities that are returned according to the top-k, minimum probability and argmax options
+        :param probs: the probabilities of shape [number of docs, number of classes]
+        :return: boolean mask of the selected probabilities of the same shape
+        """
+        if options.argmax_only:
+            # the probability of the predicted class, which is the first of the highest probabilities like in TF
+            top = np.argmax(probs, axis=1)[:, np.newaxis]
+        elif options.top_k is not None and options.top_k < probs.shape[1]:
+            # the k highest probabilities of each row in linear time (in arbitrary order)
+            top = np.argpartition(probs, -options.top_k, axis=1)[:, -options.top_k:]
+        else:
+            top = None
 
-            # map the predicted label to tag
-            pred_tag = label_tag_map[pred_label]
+        if top is not None:
+            selected = np.zeros(probs.shape, dtype=bool)
+            np.put_along_axis(selected, top, True, axis=1)
+        else:
+            selected = np.ones(probs.shape, dtype=bool)
+        if options.min_probability is not None and not options.argmax_only:
+            selected &= probs >= options.min_probability
+        return selected
 
-            # map the other tags
-            mapped = dict()
-            for m in tag_label_map:
-                mapped[m] = not_mapped[tag_label_map[m]]
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _compile_mapping(cb_name: str, model_version: str, classes: Tuple[str, ...],
+                         tag_labels: Tuple[Tuple[str, str], ...]) -> Tuple[Tuple[str, ...], np.ndarray, np.ndarray]:
+        """
+        Compiles a CodeAnno tag to class label mapping into index arrays, which map the predictions of all docs at
+        once. The compiled mappings are cached by the model, its classes and the mapping.
+        :param tag_labels: the (tag, label) pairs of the mapping
+        :return: the tags, the index of the class of each tag and the index of the tag of each class
+        """
+        class_index = {label: idx for idx, label in enumerate(classes)}
+        labels = [label for _, label in tag_labels]
+        # the mapping has to map each class label to exactly one tag
+        if len(tag_labels) != len(classes) or set(labels) != set(classes):
+            raise ErroneousMappingException(cb_name)
 
-            return mapped, pred_tag
-        else:
-            return not_mapped, pred_label
+        class_of_tag = np.array([class_index[label] for label in labels])
+        tag_of_class = np.argsort(class_of_tag)
+        # the arrays are shared by all predictions with the mapping
+        class_of_tag.setflags(write=False)
+        tag_of_class.setflags(write=False)
+        return tuple(tag for tag, _ in tag_labels), class_of_tag, tag_of_class
@@ -0,0 +1,162 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Tuple, Optional, List, Iterator
+
+from loguru import logger as log
+
+from api.model import ProfilingRequest, ProfilingSession, ProfilingTarget, PythonProfiler, ProfilingArtifact
+from backend.data_handler import DataHandler
+from backend.exceptions import ProfilingException, ModelNotAvailableException
+from backend.lazy_import import LazyModule
+from backend.model_manager import ModelManager
+from backend.zip_stream import ZipStream
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+tf = LazyModule("tensorflow")
+
+
+class Profiler(object):
+    """
+    Profiles the next predictions with a model or the next training of a model on demand. The sessions are kept in
+    the API process, which spawns the prediction and training processes, so a profiling request applies to the
+    processes that are spawned after it. The profiles are stored next to the training.log of the model.
+    """
+    _singleton = None
+    _sessions: Dict[Tuple[ProfilingTarget, str, str], ProfilingSession] = dict()
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._singleton is None:
+            log.info('Instantiating Profiler!')
+            cls._singleton = super(Profiler, cls).__new__(cls)
+        return cls._singleton
+
+    @staticmethod
+    def start_session(req: ProfilingRequest) -> ProfilingSession:
+        """
+        Turns on profiling for the next predictions with the model or for the next training of the model. An existing
+        session for the same target and model gets replaced.
+        :param req: the ProfilingRequest
+        :return: the profiling session
+        """
+        if req.python_profiler == PythonProfiler.pyinstrument and pyinstrument is None:
+            raise ProfilingException("Cannot profile with pyinstrument because it is not installed!")
+        if req.target == ProfilingTarget.prediction and not ModelManager.is_available(req.cb_name, req.model_version):
+            raise ModelNotAvailableException(cb_name=req.cb_name, model_version=req.model_version)
+
+        session = ProfilingSession(request=req,
+                                   remaining=req.num_predictions if req.target == ProfilingTarget.prediction else 1)
+        with Profiler._lock:
+            Profiler._sessions[(req.target, req.cb_name, req.model_version)] = session
+        log.info(f"Profiling the next {session.remaining} {req.target.value}(s) of model '{req.model_version}' for "
+                 f"Codebook {req.cb_name}")
+        return session
+
+    @staticmethod
+    def cancel_session(target: ProfilingTarget, cb_name: str, model_version: str) -> bool:
+        with Profiler._lock:
+            return Profiler._sessions.pop((target, cb_name, model_version), None) is not None
+
+    @staticmethod
+    def list_sessions() -> List[ProfilingSession]:
+        with Profiler._lock:
+            return list(Profiler._sessions.values())
+
+    @staticmethod
+    def take(target: ProfilingTarget, cb_name: str, model_version: str) -> Optional[ProfilingRequest]:
+        """
+        Counts a prediction or training against the profiling session of the model
+        :return: the ProfilingRequest if the prediction or training has to be profiled and None otherwise
+        """
+        key = (target, cb_name, model_version)
+        with Profiler._lock:
+            session = Profiler._sessions.get(key)
+            if session is None:
+                return None
+            session.remaining -= 1
+            if session.remaining <= 0:
+                del Profiler._sessions[key]
+            return session.request
+
+    @staticmethod
+    @contextmanager
+    def profile(req: Optional[ProfilingRequest]) -> Iterator[None]:
+        """
+        Profiles the block if a ProfilingRequest is given. The Python stacks are stored as python.prof (cProfile
+        stats, e.g. for snakeviz) and python.txt or as python.html and python.txt (pyinstrument). The TensorFlow
+        profiler trace is stored in the tensorflow directory, which can be opened with TensorBoard.
+        :param req: the ProfilingRequest returned by take() or None
+        """
+        if req is None:
+            yield
+            return
+
+        name = f"{req.target.value}_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{os.getpid()}"
+        profile_dir = DataHandler.get_profile_directory(req.cb_name, req.model_version, name, create=True)
+        log.info(f"Profiling {req.target.value} of model '{req.model_version}' for Codebook {req.cb_name} to "
+                 f"{profile_dir}")
+
+        tf_profiler_started = False
+        if req.tensorflow_profiler:
+            try:
+                tf.profiler.experimental.start(str(profile_dir.joinpath("tensorflow")))
+                tf_profiler_started = True
+            except Exception as e:
+                # e.g. if another profiler is running in this process
+                log.warning(f"Cannot start the TensorFlow profiler: {e}")
+
+        if req.python_profiler == PythonProfiler.pyinstrument:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                profiler.dump_stats(str(profile_dir.joinpath("python.prof")))
+                stats = io.StringIO()
+                pstats.Stats(profiler, stream=stats).sort_stats("cumulative").print_stats(100)
+                profile_dir.joinpath("python.txt").write_text(stats.getvalue())
+            else:
+                profiler.stop()
+                profile_dir.joinpath("python.html").write_text(profiler.output_html())
+                profile_dir.joinpath("python.txt").write_text(profiler.output_text())
+            if tf_profiler_started:
+                try:
+                    tf.profiler.experimental.stop()
+                except Exception as e:
+                    log.warning(f"Cannot store the TensorFlow profiler trace: {e}")
+
+    @staticmethod
+    def list_profiles(cb_name: str, model_version: str) -> List[ProfilingArtifact]:
+        profiles = []
+        for profile_dir in DataHandler.list_profiles(cb_name, model_version):
+            files = DataHandler.list_profile_files(cb_name, model_version, profile_dir.name)
+            profiles.append(ProfilingArtifact(name=profile_dir.name,
+                                              target=ProfilingTarget(profile_dir.name.split("_")[0]),
+                                              files=[name for name, _ in files],
+                                              size=sum(path.stat().st_size for _, path in files),
+                                              created=datetime.fromtimestamp(profile_dir.stat().st_mtime)))
+        return profiles
+
+    @staticmethod
+    def get_archive(cb_name: str, model_version: str, name: str) -> ZipStream:
+        return ZipStream(DataHandler.list_profile_files(cb_name, model_version, name))
+
+    @staticmethod
+    def remove(cb_name: str, model_version: str, name: str) -> bool:
+        log.info(f"Removing profile '{name}' of model '{model_version}' for Codebook {cb_name}")
+        DataHandler.purge_profile_directory(cb_name, model_version, name)
+        return True
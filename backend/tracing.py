@@ -0,0 +1,252 @@
+"""
+Lightweight span tracing of requests. A trace is started per request by the TracingMiddleware and the phases of the
+request (e.g. loading a model or Redis lookups) are recorded as nested spans. Finished traces are exported in the
+OTLP JSON format (https://opentelemetry.io/docs/specs/otlp/#json-protobuf-encoding) to a file (one trace per line)
+and/or to the OTLP/HTTP endpoint of a collector.
+
+Outside of a trace, span() does nothing, so the instrumented code paths cost (almost) nothing if tracing is disabled.
+Spans recorded in prediction processes are sent back to the API process with the result (see collect_spans()).
+Prediction workers of the worker service, which do not share the trace context, use collect_remote_spans() instead.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+import requests
+from loguru import logger as log
+
+from config import conf
+
+
+class Span(object):
+    __slots__ = ["name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error"]
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, start_ns: Optional[int] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes if attributes is not None else dict()
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace(object):
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, attributes=attributes)
+        self.spans: List[Span] = [self.root]
+
+    def phases(self) -> List[Tuple[str, float]]:
+        """
+        :return: the summed up durations in ms of the spans per name (except the root span) in order of their start
+        """
+        durations: Dict[str, float] = dict()
+        for s in sorted(self.spans[1:], key=lambda s: s.start_ns):
+            durations[s.name] = durations.get(s.name, 0.) + s.duration_ms
+        return list(durations.items())
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _to_otlp_attributes({"service.name": conf.backend.tracing.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_to_otlp_span(self.trace_id, s, s is self.root) for s in self.spans]
+                }]
+            }]
+        }
+
+
+_current_trace: "ContextVar[Optional[Trace]]" = ContextVar("current_trace", default=None)
+_current_span: "ContextVar[Optional[Span]]" = ContextVar("current_span", default=None)
+
+
+def _to_otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def value(v: Any) -> Dict[str, Any]:
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        elif isinstance(v, int):
+            return {"intValue": str(v)}
+        elif isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    return [{"key": k, "value": value(v)} for k, v in attributes.items()]
+
+
+def _to_otlp_span(trace_id: str, s: Span, is_root: bool) -> Dict[str, Any]:
+    otlp = {
+        "traceId": trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        # SPAN_KIND_SERVER for the request, SPAN_KIND_INTERNAL for its phases
+        "kind": 2 if is_root else 1,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns or s.start_ns),
+        "attributes": _to_otlp_attributes(s.attributes),
+        # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+        "status": {"code": 2, "message": s.error} if s.error is not None else {"code": 0}
+    }
+    if s.parent_id is not None:
+        otlp["parentSpanId"] = s.parent_id
+    return otlp
+
+
+@contextmanager
+def trace(name: str, **attributes) -> Iterator[Trace]:
+    """
+    Starts a trace with a root span of the given name. The trace gets exported when the block is left.
+    """
+    t = Trace(name, attributes)
+    trace_token, span_token = _current_trace.set(t), _current_span.set(t.root)
+    try:
+        yield t
+    except Exception as e:
+        t.root.error = type(e).__name__
+        raise
+    finally:
+        t.root.end_ns = time.time_ns()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _export(t)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Records the block as span of the current trace, nested in the current span. Does nothing outside of a trace.
+    """
+    t = _current_trace.get()
+    if t is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    s = Span(name, parent.span_id if parent is not None else None, attributes=attributes)
+    t.spans.append(s)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except Exception as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def add_span(name: str, start_ns: int, end_ns: int, **attributes):
+    """
+    Records a phase that was measured without span() as span of the current trace, e.g. the start of a process
+    """
+    t, parent = _current_trace.get(), _current_span.get()
+    if t is not None:
+        s = Span(name, parent.span_id if parent is not None else None, start_ns=start_ns, attributes=attributes)
+        s.end_ns = end_ns
+        t.spans.append(s)
+
+
+@contextmanager
+def collect_spans() -> Iterator[List[Span]]:
+    """
+    Collects the spans that are recorded in the block, e.g. to send the spans of a prediction process back to the
+    API process, where they get added to the trace of the request with add_spans().
+    """
+    t = _current_trace.get()
+    collected: List[Span] = []
+    num_spans = len(t.spans) if t is not None else 0
+    try:
+        yield collected
+    finally:
+        if t is not None:
+            collected.extend(t.spans[num_spans:])
+
+
+@contextmanager
+def collect_remote_spans(parent_id: Optional[str]) -> Iterator[List[Span]]:
+    """
+    Collects the spans that are recorded in the block in a process without the trace, e.g. a prediction worker, nested
+    in the span of the given id of the trace. The spans get added to the trace in its process with add_spans().
+    :param parent_id: the id of the current span of the trace (see current_span_id()) or None if there is no trace
+    """
+    if parent_id is None:
+        yield []
+        return
+
+    t = Trace("remote")
+    # the spans of the block reference the span of the trace in the other process
+    t.root.span_id = parent_id
+    trace_token, span_token = _current_trace.set(t), _current_span.set(t.root)
+    collected: List[Span] = []
+    try:
+        yield collected
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        collected.extend(t.spans[1:])
+
+
+def current_span_id() -> Optional[str]:
+    s = _current_span.get() if _current_trace.get() is not None else None
+    return s.span_id if s is not None else None
+
+
+def add_spans(spans: List[Span]):
+    t = _current_trace.get()
+    if t is not None:
+        t.spans.extend(spans)
+
+
+class _CollectorExporter(object):
+    """
+    Posts finished traces to the OTLP/HTTP endpoint of a collector in a background thread so that requests are not
+    delayed by the export
+    """
+    _queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=1000)
+    _thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def submit(cls, otlp: Dict[str, Any]):
+        if cls._thread is None or not cls._thread.is_alive():
+            cls._thread = threading.Thread(target=cls._run, name="trace-exporter", daemon=True)
+            cls._thread.start()
+        try:
+            cls._queue.put_nowait(otlp)
+        except queue.Full:
+            log.warning("Dropping trace because the trace exporter queue is full!")
+
+    @classmethod
+    def _run(cls):
+        while True:
+            otlp = cls._queue.get()
+            try:
+                requests.post(conf.backend.tracing.collector_endpoint, json=otlp, timeout=5).raise_for_status()
+            except requests.RequestException as e:
+                log.warning(f"Cannot export trace to collector at {conf.backend.tracing.collector_endpoint}: {e}")
+
+
+_file_lock = threading.Lock()
+
+
+def _export(t: Trace):
+    export_file, collector_endpoint = conf.backend.tracing.export_file, conf.backend.tracing.collector_endpoint
+    if not export_file and not collector_endpoint:
+        return
+    otlp = t.to_otlp()
+    if export_file:
+        with _file_lock, Path(export_file).open("a") as f:
+            f.write(json.dumps(otlp) + "\n")
+    if collector_endpoint:
+        _CollectorExporter.submit(otlp)
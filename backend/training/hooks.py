@@ -0,0 +1,34 @@
+import time
+from typing import Optional
+
+import tensorflow as tf
+
+
+# hooks of the Estimators have to extend tf.estimator.SessionRunHook, so this module imports TensorFlow eagerly and
+# is only imported by the training processes
+
+
+class ThroughputHook(tf.estimator.SessionRunHook):
+    """
+    Measures the training steps per second after some warm-up steps so that graph building, session creation and
+    the first (slow) steps are excluded
+    """
+
+    def __init__(self, warmup_steps: int = 10):
+        self._warmup_steps = warmup_steps
+        self._steps = 0
+        self._start: Optional[float] = None
+        self._end: Optional[float] = None
+
+    def after_run(self, run_context, run_values):
+        self._steps += 1
+        if self._steps == self._warmup_steps:
+            self._start = time.perf_counter()
+        elif self._steps > self._warmup_steps:
+            self._end = time.perf_counter()
+
+    @property
+    def steps_per_sec(self) -> Optional[float]:
+        if self._start is None or self._end is None:
+            return None
+        return (self._steps - self._warmup_steps) / (self._end - self._start)
@@ -1,13 +1,29 @@
-from typing import Tuple
+from __future__ import annotations
 
-import tensorflow as tf
-import tensorflow_hub as hub
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple, Optional, Callable, List, TYPE_CHECKING
+
+import numpy as np
 from loguru import logger as log
-from tensorflow_hub.feature_column import DenseFeatureColumn
 
-from api.model import ModelConfig, TrainingRequest
-from backend import ModelManager, DataHandler
+from api.model import ModelConfig, TrainingRequest, ModelVariant
+from backend import ModelManager, DataHandler, EmbeddingManager, DatasetManager
 from backend.exceptions import TFHubEmbeddingException
+from backend.lazy_import import LazyModule
+from config import conf
+
+if TYPE_CHECKING:
+    from tensorflow_hub.feature_column import DenseFeatureColumn
+
+tf = LazyModule("tensorflow")
+hub = LazyModule("tensorflow_hub")
+
+# scope of the variables of the embedding feature column in the Estimator's checkpoints
+_EMBEDDING_SCOPE = "dnn/input_from_feature_columns/"
 
 
 class ModelFactory(object):
@@ -21,16 +37,34 @@ class ModelFactory(object):
         return cls._singleton
 
     @staticmethod
-    def build_model(req: TrainingRequest, n_classes: int) -> \
+    def build_model(req: TrainingRequest, n_classes: int, distribute: bool = False, model_dir: Path = None) -> \
             Tuple[tf.estimator.DNNClassifier, DenseFeatureColumn, str]:
-
+        """
+        Builds the Estimator for the TrainingRequest
+        :param req: the TrainingRequest
+        :param n_classes: number of classes of the dataset
+        :param distribute: if True and more than one worker is requested, the Estimator trains data-parallel with a
+               MultiWorkerMirroredStrategy. The cluster gets read from the TF_CONFIG environment variable, which
+               has to be set before calling this method.
+        :param model_dir: optional directory of the model. Defaults to the directory of the model version.
+        :return: the Estimator, the embedding feature column and the model id
+        """
         # TODO remove if available or other strategy
-        model_dir = DataHandler.get_model_directory(req.cb_name, req.model_version, create=True)
+        if model_dir is None:
+            model_dir = DataHandler.get_model_directory(req.cb_name, req.model_version, create=True)
+
+        train_distribute = None
+        if distribute and req.num_workers > 1:
+            log.info(f"Setting up data-parallel training across {req.num_workers} workers with TF_CONFIG "
+                     f"{os.environ.get('TF_CONFIG')}")
+            # all-reduces the gradients of the workers after each step (on CPU via ring all-reduce)
+            train_distribute = tf.distribute.experimental.MultiWorkerMirroredStrategy()
 
         # TODO config in file
         run_config = tf.estimator.RunConfig(model_dir=model_dir,
                                             save_summary_steps=100,
-                                            save_checkpoints_steps=500)
+                                            save_checkpoints_steps=500,
+                                            train_distribute=train_distribute)
 
         conf = req.model_config
         feature_columns = ModelFactory._create_embedding_feature_column(conf)
@@ -39,17 +73,256 @@ class ModelFactory(object):
                                                n_classes=n_classes,
                                                dropout=conf.dropout,
                                                optimizer=conf.optimizer,
-                                               config=run_config)
+                                               config=run_config,
+                                               warm_start_from=ModelFactory._create_warm_start_settings(req))
         model_id = ModelManager.build_model_id(req.cb_name, req.model_version, req.dataset_version)
 
         return estimator, feature_columns[0], model_id
 
+    @staticmethod
+    def export_model(model: tf.estimator.DNNClassifier, embedding_layer: DenseFeatureColumn, req: TrainingRequest,
+                     checkpoint_path: Optional[str] = None) -> str:
+        """
+        Exports the Estimator as SavedModel into the directory of the model version
+        :param model: the trained Estimator
+        :param embedding_layer: the embedding feature column of the Estimator
+        :param req: the TrainingRequest
+        :param checkpoint_path: optional checkpoint to export. Defaults to the latest checkpoint.
+        :return: the path of the exported SavedModel
+        """
+        # create serving function
+        serving_input_fn = tf.estimator.export.build_parsing_serving_input_receiver_fn(
+            tf.feature_column.make_parse_example_spec([embedding_layer]))
+        # finally, persist model # TODO this should be moved to DataHandler
+        dst = DataHandler.get_model_directory(req.cb_name, req.model_version, create=True)
+        estimator_path = model.export_saved_model(str(dst),
+                                                  serving_input_fn,
+                                                  checkpoint_path=checkpoint_path)
+        estimator_path = estimator_path.decode('utf-8')
+        log.info(f"Tensorflow exported model successfully at {estimator_path}")
+        # move the exported model files to the mode dir (see export_saved_model docs)
+        log.info(f"Moving <{estimator_path}> to <{str(dst)}>")
+        files = [f for f in Path(estimator_path).iterdir()]
+        for f in files:
+            shutil.move(str(f), str(f.parent.parent))
+        if conf.backend.export.share_embeddings:
+            _share_embedding(req, dst, is_shared=lambda name, _: name.startswith(_EMBEDDING_SCOPE))
+        return estimator_path
+
+    @staticmethod
+    def export_optimized_model(model: tf.estimator.DNNClassifier, req: TrainingRequest,
+                               checkpoint_path: Optional[str] = None) -> Optional[ModelVariant]:
+        """
+        Exports a CPU-optimized variant of the Estimator. The variant takes raw texts instead of serialized
+        tf.Examples, so that no Examples have to be built and parsed per prediction, and its variables are folded
+        into constants if possible. The variant gets compared with the exported SavedModel on samples of the test
+        split and is only kept if it predicts the same classes and is faster.
+        :param model: the trained Estimator
+        :param req: the TrainingRequest
+        :param checkpoint_path: optional checkpoint to export. Defaults to the latest checkpoint.
+        :return: the comparison of the variant with the SavedModel or None if the variant could not be exported
+        """
+        model_dir = DataHandler.get_model_directory(req.cb_name, req.model_version)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".optimized.", dir=str(model_dir)))
+        try:
+            embeddings = _load_embedding_tensors(model_dir)
+            freeze = sum(e.nbytes for e in embeddings) <= int(conf.backend.export.max_frozen_embedding_size)
+            export_path = model.export_saved_model(str(tmp_dir),
+                                                   _raw_text_serving_input_receiver_fn,
+                                                   checkpoint_path=checkpoint_path).decode('utf-8')
+            module, frozen = _build_optimized_module(export_path, freeze)
+            optimized_dir = tmp_dir.joinpath(DataHandler.get_optimized_model_directory(req.cb_name,
+                                                                                       req.model_version).name)
+            tf.saved_model.save(module, str(optimized_dir), signatures={'predict_text': module.predict_text})
+
+            variant = _compare_with_saved_model(req, model_dir, optimized_dir, frozen)
+            log.info(f"Comparison of the optimized variant of model <{req.model_version}> with the SavedModel: "
+                     f"{variant}")
+            if variant.preferred:
+                dst = DataHandler.get_optimized_model_directory(req.cb_name, req.model_version)
+                shutil.rmtree(dst, ignore_errors=True)
+                optimized_dir.rename(dst)
+                log.info(f"Exported optimized variant of model <{req.model_version}> at {str(dst)}")
+                if conf.backend.export.share_embeddings:
+                    # the variables of the variant are named by their object path and not by the Estimator scope
+                    _share_embedding(req, dst, is_shared=lambda _, value: isinstance(value, np.ndarray) and any(
+                        value.dtype == e.dtype and value.shape == e.shape and np.array_equal(value, e)
+                        for e in embeddings))
+            return variant
+        except Exception as e:
+            log.warning(f"Cannot export optimized variant of model <{req.model_version}>: {e}")
+            return None
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _create_warm_start_settings(req: TrainingRequest) -> Optional[tf.estimator.WarmStartSettings]:
+        if req.base_model_version is None:
+            return None
+        checkpoint = ModelManager.get_warm_start_checkpoint(req)
+        log.info(f"Warm-starting model <{req.model_version}> from checkpoint <{checkpoint}> of base model "
+                 f"<{req.base_model_version}>")
+        # warm-starts all trainable variables, i.e. the hidden and the logits layers
+        return tf.estimator.WarmStartSettings(ckpt_to_initialize_from=checkpoint, vars_to_warm_start=".*")
+
     @staticmethod
     def _create_embedding_feature_column(conf: ModelConfig):
+        # resolve the module from the local module registry so that no download is needed
+        module_path = EmbeddingManager.resolve(conf.embedding_type)
         try:
             embedding_column = hub.text_embedding_column_v2(key="text",
-                                                            module_path=hub.resolve(conf.embedding_type),
+                                                            module_path=module_path,
                                                             trainable=False)
             return [embedding_column]
         except Exception as e:
             raise TFHubEmbeddingException(embedding_type=conf.embedding_type)
+
+
+def _raw_text_serving_input_receiver_fn() -> tf.estimator.export.ServingInputReceiver:
+    text = tf.compat.v1.placeholder(dtype=tf.string, shape=[None], name='text')
+    # the embedding column expects texts of shape [batch_size, 1] like the parsed tf.Examples
+    return tf.estimator.export.ServingInputReceiver(features={'text': tf.reshape(text, [-1, 1])},
+                                                    receiver_tensors={'text': text})
+
+
+def _build_optimized_module(export_path: str, freeze: bool = True) -> Tuple[tf.Module, bool]:
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    loaded = tf.saved_model.load(export_path)
+    predict = loaded.signatures['predict']
+    module = tf.Module()
+    frozen_predict, frozen = None, False
+    if not freeze:
+        log.info("Not folding the variables of the model into constants because the embedding is too large")
+    else:
+        try:
+            # inlining the nested function calls of the loaded graph is required to find all variables
+            frozen_predict = convert_variables_to_constants_v2(predict, lower_control_flow=False,
+                                                               aggressive_inlining=True)
+            frozen = True
+        except Exception as e:
+            log.info(f"Cannot fold the variables of the model into constants: {e}")
+
+    if not frozen or len(frozen_predict.captured_inputs) > 0:
+        # tracks the variables or resources (e.g. lookup tables of the embedding) that are captured by the graph
+        module.model = loaded
+
+    @tf.function(input_signature=[tf.TensorSpec(shape=[None], dtype=tf.string, name='text')])
+    def predict_text(text):
+        if not frozen:
+            return predict(text=text)
+        # frozen functions return their outputs flattened
+        return tf.nest.pack_sequence_as(predict.structured_outputs, frozen_predict(text))
+
+    module.predict_text = predict_text
+    return module, frozen
+
+
+def _load_embedding_tensors(saved_model_dir: Path) -> List[np.ndarray]:
+    reader = tf.train.load_checkpoint(str(saved_model_dir.joinpath("variables", "variables")))
+    return [reader.get_tensor(name) for name in sorted(reader.get_variable_to_shape_map())
+            if name.startswith(_EMBEDDING_SCOPE)]
+
+
+def _share_embedding(req: TrainingRequest, saved_model_dir: Path, is_shared: Callable[[str, np.ndarray], bool]):
+    """
+    Stores the variable shard of the embedding and the assets of a SavedModel in the content-addressed storage, so
+    that models with the same embedding share them on disk (and in the page cache when they are loaded)
+    """
+    try:
+        shared = [f for f in saved_model_dir.joinpath("assets").rglob("*") if f.is_file()]
+        shard = _reshard_variables(str(saved_model_dir.joinpath("variables", "variables")), is_shared)
+        if shard is not None:
+            shared.append(shard)
+        DataHandler.share_model_files(req.cb_name, req.model_version, shared)
+    except Exception as e:
+        log.warning(f"Cannot share the embedding of model <{req.model_version}> at {str(saved_model_dir)}: {e}")
+
+
+def _reshard_variables(variables_prefix: str, is_shared: Callable[[str, np.ndarray], bool]) -> Optional[Path]:
+    """
+    Rewrites a (V2) checkpoint so that the shared tensors are in the first shard and all other tensors in the second
+    shard. The data file of a shard is the plain concatenation of its tensors in the order of their names, so the
+    first shard is byte-identical for all checkpoints with the same shared tensors.
+    :param variables_prefix: path prefix of the checkpoint
+    :param is_shared: decides by name and value of a tensor if it is shared
+    :return: the data file of the shared shard or None if no tensor is shared
+    """
+    reader = tf.train.load_checkpoint(variables_prefix)
+    dtypes = reader.get_variable_to_dtype_map()
+    tensors = {name: reader.get_tensor(name) for name in sorted(dtypes)}
+    shared = [name for name, value in tensors.items() if is_shared(name, value)]
+    if len(shared) == 0:
+        return None
+    others = [name for name in tensors if name not in shared]
+
+    dst = Path(variables_prefix)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".reshard.", dir=str(dst.parent)))
+    try:
+        parts = []
+        for i, names in enumerate([shared, others]):
+            if len(names) == 0:
+                continue
+            part = str(tmp_dir.joinpath(f"part-{i}"))
+            tf.raw_ops.SaveV2(prefix=part, tensor_names=names, shape_and_slices=[""] * len(names),
+                              tensors=[tf.constant(tensors[name], dtype=dtypes[name]) for name in names])
+            parts.append(part)
+        merged = tmp_dir.joinpath(dst.name)
+        tf.raw_ops.MergeV2Checkpoints(checkpoint_prefixes=parts, destination_prefix=str(merged), delete_old_dirs=False)
+
+        # the new data files are moved in before the index that references them
+        old_files = [f for f in dst.parent.glob(f"{dst.name}.data-*")]
+        new_files = sorted(tmp_dir.glob(f"{dst.name}.data-*"))
+        for f in new_files:
+            f.replace(dst.parent.joinpath(f.name))
+        tmp_dir.joinpath(f"{dst.name}.index").replace(dst.parent.joinpath(f"{dst.name}.index"))
+        for f in old_files:
+            if f.name not in [n.name for n in new_files]:
+                f.unlink()
+        return dst.parent.joinpath(new_files[0].name)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _compare_with_saved_model(req: TrainingRequest, model_dir: Path, optimized_dir: Path,
+                              frozen: bool) -> ModelVariant:
+    texts, labels = DatasetManager.get_test_samples(req.cb_name, req.dataset_version,
+                                                    conf.backend.export.comparison_samples)
+    baseline = tf.saved_model.load(str(model_dir)).signatures['predict']
+    optimized = tf.saved_model.load(str(optimized_dir)).signatures['predict_text']
+
+    baseline_probs, baseline_latency = _measure_predictions(
+        lambda text: baseline(examples=tf.constant(_serialize_example(text))), texts)
+    optimized_probs, optimized_latency = _measure_predictions(
+        lambda text: optimized(text=tf.constant([text])), texts)
+
+    baseline_preds = baseline_probs.argmax(axis=1)
+    optimized_preds = optimized_probs.argmax(axis=1)
+    agreement = float((baseline_preds == optimized_preds).mean())
+    return ModelVariant(frozen=frozen,
+                        preferred=agreement == 1. and optimized_latency < baseline_latency,
+                        num_samples=len(texts),
+                        latency_ms=optimized_latency,
+                        baseline_latency_ms=baseline_latency,
+                        accuracy=float((optimized_preds == labels).mean()),
+                        baseline_accuracy=float((baseline_preds == labels).mean()),
+                        prediction_agreement=agreement,
+                        max_probability_deviation=float(np.abs(baseline_probs - optimized_probs).max()))
+
+
+def _measure_predictions(predict: Callable, texts: List[str]) -> Tuple[np.ndarray, float]:
+    # the first call traces the function
+    predict(texts[0])
+    probabilities, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        prediction = predict(text)
+        latencies.append(time.perf_counter() - start)
+        probabilities.append(prediction['probabilities'].numpy()[0])
+    return np.stack(probabilities), float(np.median(latencies) * 1000)
+
+
+def _serialize_example(text: str) -> bytes:
+    ex = tf.train.Example()
+    ex.features.feature['text'].bytes_list.value.extend([bytes(text, encoding='utf-8')])
+    return ex.SerializeToString()
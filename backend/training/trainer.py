@@ -1,26 +1,47 @@
+from __future__ import annotations
+
+import json
 import logging
 import multiprocessing
 import os
 import pprint as pp
-import shutil
-from multiprocessing import Manager, Process
+import resource
+import socket
+import tempfile
+import time
+from contextlib import contextmanager
+from multiprocessing import Manager, Process, Queue
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple, List, NamedTuple
 
 import psutil
-import tensorflow as tf
 from loguru import logger as log
 
-from api.model import TrainingResponse, TrainingRequest, TrainingState, TrainingStatus
-from backend import DataHandler, DatasetManager, ModelManager
-from backend.exceptions import ModelNotAvailableException, StoringError
+from api.model import TrainingResponse, TrainingRequest, TrainingState, TrainingStatus, EarlyStoppingMetric, \
+    TrainingPerformance, ProfilingRequest, ProfilingTarget
+from backend import DataHandler, DatasetManager, ModelManager, Profiler
+from backend.db.job_broker import JobBroker, TRAINING_QUEUE
+from backend.exceptions import ModelNotAvailableException, StoringError, TrainingError
+from backend.lazy_import import LazyModule, ensure_imported
+from backend.metrics import register_callback_gauge
 from backend.training.model_factory import ModelFactory
 from config import conf
 
+tf = LazyModule("tensorflow")
+hub = LazyModule("tensorflow_hub")
+
+
+class TrainingJob(NamedTuple):
+    """
+    Training that is queued for the worker service ('redis' worker mode)
+    """
+    request: TrainingRequest
+    profiling: Optional[ProfilingRequest]
+
 
 class Trainer(object):
     _singleton = None
-    # TODO persist in redis or similar
+    # in the 'redis' worker mode, the dicts are shared by all API workers and the worker service via Redis
     _status_dict: Dict[str, TrainingStatus] = None
     _active_pids: Dict[int, str] = None
     _manager: Manager = None
@@ -37,16 +58,39 @@ class Trainer(object):
                 log.info("GPU support for training enabled!")
 
             cls._singleton = super(Trainer, cls).__new__(cls)
-            cls._manager = Manager()
-            # TODO persist those dicts in redis or similar
-            cls._status_dict = cls._manager.dict()
-            cls._active_pids = cls._manager.dict()
+            if conf.backend.workers.mode == "redis":
+                cls._status_dict = JobBroker.shared_dict("training:status")
+                cls._active_pids = JobBroker.shared_dict("training:active_pids")
+            else:
+                cls._manager = Manager()
+                cls._status_dict = cls._manager.dict()
+                cls._active_pids = cls._manager.dict()
+            # jobs in the 'preparing' state are spawned but did not start training yet
+            register_callback_gauge("cba_training_jobs", "Number of active train-eval-export jobs by state",
+                                    ["state"], Trainer._count_active_jobs)
 
         return cls._singleton
 
+    @staticmethod
+    def _count_active_jobs() -> List[Tuple[List[str], float]]:
+        counts = {state.value: 0 for state in TrainingState}
+        try:
+            for mid in Trainer._active_pids.values():
+                status = Trainer._status_dict.get(mid)
+                if status is not None:
+                    counts[TrainingState(status.state).value] += 1
+            if conf.backend.workers.mode == "redis":
+                # queued trainings have no process yet
+                counts[TrainingState.queued.value] = JobBroker().queue_length(TRAINING_QUEUE)
+        except Exception as e:
+            # the manager of the shared dicts is not reachable anymore during shutdown
+            log.debug(f"Cannot count the active training jobs: {e}")
+        return [([state], count) for state, count in counts.items()]
+
     @staticmethod
     def shutdown():
-        Trainer._manager.shutdown()
+        if Trainer._manager is not None:
+            Trainer._manager.shutdown()
 
     @staticmethod
     def train(request: TrainingRequest) -> TrainingResponse:
@@ -54,17 +98,35 @@ class Trainer(object):
         #  - how to assign GPU(s)
         #  - set max number of active processes implement a job queue
 
+        # make sure the base model is compatible before the training gets started
+        if request.base_model_version is not None:
+            ModelManager.get_warm_start_checkpoint(request)
+
         # remove model if another with same version exists!
         if ModelManager.is_available(request.cb_name, request.model_version):
             log.warning(f"Model {request.model_version} for Codebook '{request.cb_name}' already exists!")
             ModelManager.remove(cb_name=request.cb_name, model_version=request.model_version)
 
+        # profiling is turned on for the next training of a model via the profiling endpoints
+        profiling = Profiler.take(ProfilingTarget.training, request.cb_name, request.model_version)
+        model_id = ModelManager.build_model_id(request.cb_name, request.model_version, request.dataset_version)
+
+        if conf.backend.workers.mode == "redis":
+            # the training gets started by the worker service (see backend/worker.py)
+            Trainer._status_dict[model_id] = TrainingStatus(state=TrainingState.queued, process_status="queued")
+            JobBroker().push(TRAINING_QUEUE, TrainingJob(request=request, profiling=profiling))
+            log.info(f"Queued train-eval-export cycle for Codebook <{request.cb_name}>")
+            return TrainingResponse(model_id=model_id)
+
+        # the training process inherits TensorFlow and TF Hub from the API process (see Predictor.predict)
+        ensure_imported(tf, hub)
+
         with Manager() as manager:
             log.info(f"Spawning new process for train-eval-export cycle for Codebook <{request.cb_name}>")
-            p = Process(target=train_eval_export, args=(request, Trainer._status_dict, Trainer._active_pids))
+            p = Process(target=train_eval_export,
+                        args=(request, Trainer._status_dict, Trainer._active_pids, profiling))
             p.start()
 
-        model_id = ModelManager.build_model_id(request.cb_name, request.model_version, request.dataset_version)
         return TrainingResponse(model_id=model_id)
 
     @staticmethod
@@ -85,7 +147,7 @@ class Trainer(object):
             status = Trainer._status_dict[resp.model_id]
 
             # TODO just a quick fix.
-            if resp.model_id not in Trainer._active_pids.values():
+            if status.state != TrainingState.queued and resp.model_id not in Trainer._active_pids.values():
                 status.process_status = 'finished'
 
             return status
@@ -101,20 +163,243 @@ functions have to be implemented.)
 """
 
 
-def input_fn(r: TrainingRequest, train: bool = False):
+def input_fn(r: TrainingRequest, train: bool = False, validation: bool = False,
+             input_context: Optional[tf.distribute.InputContext] = None):
     # note that TF is not in EagerExecution mode when this method gets called
     # https://www.tensorflow.org/api_docs/python/tf/estimator/Estimator#eager_compatibility
 
+    # with early stopping, the validation split is held out of the training data
+    if r.model_config.early_stopping and (train or validation):
+        train_ds, val_ds = DatasetManager.get_tensorflow_validation_split(r.cb_name, r.dataset_version,
+                                                                          r.model_config.validation_split)
+        if train:
+            return _shard(train_ds, input_context).shuffle(256).batch(r.batch_size_train).repeat()
+        else:
+            return val_ds.batch(r.batch_size_test)
+
     # create tf datasets (we have to load them in the input fn otherwise we get an EagerExecution problem)
     train_ds, test_ds, label_categories = DatasetManager.get_tensorflow_dataset(r.cb_name, r.dataset_version)
     if train:
-        train_ds = train_ds.shuffle(256).batch(r.batch_size_train).repeat()
+        train_ds = _shard(train_ds, input_context).shuffle(256).batch(r.batch_size_train).repeat()
         return train_ds
     else:
         test_ds = test_ds.shuffle(256).batch(r.batch_size_test)
         return test_ds
 
 
+class PerformanceRecorder(object):
+    """
+    Records the wall time of the phases of a train-eval-export cycle and the time spent in Estimator.train() calls
+    """
+
+    def __init__(self):
+        self.phase_durations: Dict[str, float] = dict()
+        self.train_seconds = 0.
+        self.worker_peak_rss = 0
+        self._phase: Optional[TrainingState] = None
+        self._phase_start: Optional[float] = None
+
+    def start_phase(self, state: TrainingState):
+        self.stop_phase()
+        self._phase, self._phase_start = state, time.perf_counter()
+
+    def stop_phase(self):
+        if self._phase is not None:
+            duration = time.perf_counter() - self._phase_start
+            self.phase_durations[self._phase.value] = self.phase_durations.get(self._phase.value, 0.) + duration
+            self._phase = None
+
+    @contextmanager
+    def measure_training(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.train_seconds += time.perf_counter() - start
+
+    def record_worker_peak_rss(self):
+        """
+        Records the peak resident set size of the worker processes of a data-parallel training. Has to be called
+        after the workers were joined, since only the usage of terminated and waited for children is reported.
+        """
+        # ru_maxrss is reported in kilobytes on Linux and is the maximum of the (largest) single child
+        self.worker_peak_rss = max(self.worker_peak_rss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024)
+
+    def build_performance(self, train_steps: int, examples_per_step: int, model_size: int, num_workers: int = 1,
+                          scaling_efficiency: Optional[float] = None) -> TrainingPerformance:
+        self.stop_phase()
+        train_seconds = max(self.train_seconds, 1e-9)
+        # ru_maxrss is reported in kilobytes on Linux. Data-parallel trainings happen in the worker processes.
+        peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, self.worker_peak_rss)
+        return TrainingPerformance(phase_durations=self.phase_durations,
+                                   train_steps=train_steps,
+                                   steps_per_sec=train_steps / train_seconds,
+                                   examples_per_sec=train_steps * examples_per_step / train_seconds,
+                                   peak_rss=peak_rss,
+                                   model_size=model_size,
+                                   num_workers=num_workers,
+                                   scaling_efficiency=scaling_efficiency)
+
+
+def _shard(ds: tf.data.Dataset, input_context: Optional[tf.distribute.InputContext]) -> tf.data.Dataset:
+    # in data-parallel trainings every worker gets a distinct shard of the training data
+    if input_context is None or input_context.num_input_pipelines == 1:
+        return ds
+    return ds.shard(input_context.num_input_pipelines, input_context.input_pipeline_id)
+
+
+def _find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def _build_tf_configs(num_workers: int) -> List[str]:
+    """
+    :return: the TF_CONFIG of each worker of a local cluster. The first worker is the chief.
+    """
+    cluster = {"worker": [f"localhost:{_find_free_port()}" for _ in range(num_workers)]}
+    return [json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}})
+            for index in range(num_workers)]
+
+
+def train_worker(req: TrainingRequest, n_classes: int, tf_config: str, index: int, results: Queue):
+    # the cluster has to be configured before TF initializes its runtime in this process
+    os.environ["TF_CONFIG"] = tf_config
+    from backend.training.hooks import ThroughputHook
+
+    model, _, _ = ModelFactory.build_model(req, n_classes=n_classes, distribute=True)
+    hook = ThroughputHook()
+    # multi worker trainings of Estimators are only supported via train_and_evaluate. Since there is no evaluator
+    # task in the cluster, the workers only train and the model gets evaluated after the training.
+    train_spec = tf.estimator.TrainSpec(
+        input_fn=lambda input_context=None: input_fn(req, train=True, input_context=input_context),
+        max_steps=req.max_steps_train,
+        hooks=[hook])
+    eval_spec = tf.estimator.EvalSpec(input_fn=lambda: input_fn(req, train=False), steps=req.max_steps_test)
+    tf.estimator.train_and_evaluate(model, train_spec, eval_spec)
+    results.put((index, hook.steps_per_sec))
+
+
+def train_data_parallel(req: TrainingRequest, n_classes: int, mid: str, recorder: PerformanceRecorder) -> \
+        Optional[float]:
+    """
+    Trains the model data-parallel in req.num_workers local worker processes. The first worker is the chief, which
+    writes the checkpoints to the model directory.
+    :return: the training steps per second of the chief
+    """
+    tf_configs = _build_tf_configs(req.num_workers)
+    results = Queue()
+    workers = [Process(target=train_worker, args=(req, n_classes, tf_config, index, results))
+               for index, tf_config in enumerate(tf_configs)]
+
+    log.info(f"Starting data-parallel training of model <{mid}> with {req.num_workers} workers at "
+             f"{json.loads(tf_configs[0])['cluster']['worker']}")
+    with recorder.measure_training():
+        for worker in workers:
+            worker.start()
+        # if a worker fails, the others would wait for it forever
+        while any(worker.is_alive() for worker in workers):
+            if any(worker.exitcode not in [None, 0] for worker in workers):
+                for worker in workers:
+                    if worker.is_alive():
+                        worker.kill()
+            time.sleep(1)
+    for worker in workers:
+        worker.join()
+    recorder.record_worker_peak_rss()
+    if any(worker.exitcode != 0 for worker in workers):
+        raise TrainingError(f"Data-parallel training of model <{mid}> failed! Worker exit codes: "
+                            f"{[worker.exitcode for worker in workers]}")
+
+    steps_per_sec = dict(results.get() for _ in workers)
+    log.info(f"Training steps per second of the workers of model <{mid}>: {steps_per_sec}")
+    return steps_per_sec[0]
+
+
+def measure_scaling_efficiency(req: TrainingRequest, n_classes: int, mid: str,
+                               steps_per_sec: Optional[float]) -> Optional[float]:
+    """
+    Compares the throughput of a data-parallel training with the throughput of a short single worker training of the
+    same model. Since every worker processes a batch per step, perfect scaling means that a step of the data-parallel
+    training takes as long as a step of the single worker training.
+    :return: the scaling efficiency
+    """
+    from backend.training.hooks import ThroughputHook
+
+    calibration_steps = int(conf.backend.training.scaling_calibration_steps)
+    log.info(f"Measuring single worker throughput of model <{mid}> with {calibration_steps} steps")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model, _, _ = ModelFactory.build_model(req, n_classes=n_classes, model_dir=Path(tmp_dir))
+        hook = ThroughputHook()
+        model.train(input_fn=lambda: input_fn(req, train=True), max_steps=calibration_steps, hooks=[hook])
+
+    efficiency = _scaling_efficiency(steps_per_sec, hook.steps_per_sec)
+    if efficiency is None:
+        log.warning(f"Cannot compute the scaling efficiency of model <{mid}> because too few steps were measured!")
+        return None
+    log.info(f"Scaling efficiency of model <{mid}> with {req.num_workers} workers: {efficiency:.2%} "
+             f"({steps_per_sec * req.batch_size_train * req.num_workers:.1f} examples/sec vs. "
+             f"{hook.steps_per_sec * req.batch_size_train:.1f} examples/sec of a single worker)")
+    return efficiency
+
+
+def _scaling_efficiency(steps_per_sec: Optional[float], single_worker_steps_per_sec: Optional[float]) -> \
+        Optional[float]:
+    if steps_per_sec is None or not single_worker_steps_per_sec:
+        return None
+    return steps_per_sec / single_worker_steps_per_sec
+
+
+def _is_improvement(value: float, best_value: Optional[float], metric: EarlyStoppingMetric, min_delta: float) -> bool:
+    if best_value is None:
+        return True
+    if metric == EarlyStoppingMetric.accuracy:
+        return value > best_value + min_delta
+    return value < best_value - min_delta
+
+
+def train_with_early_stopping(model: tf.estimator.Estimator, req: TrainingRequest, mid: str,
+                              recorder: PerformanceRecorder) -> Tuple[str, int, int]:
+    """
+    Trains the model in intervals and evaluates it on the validation split after each interval. The training stops
+    if the monitored metric did not improve for the configured number of evaluations or if max_steps_train is
+    reached.
+    :return: the path prefix of the best checkpoint, the step at which the training stopped and the best step
+    """
+    conf = req.model_config
+    metric = conf.early_stopping_metric
+    log.info(f"Early stopping of model <{mid}> enabled. Monitoring <{metric.value}> on a validation split of "
+             f"{conf.validation_split} every {conf.early_stopping_eval_interval} steps with a patience of "
+             f"{conf.early_stopping_patience} and min delta of {conf.early_stopping_min_delta}")
+
+    best_value, best_step, best_checkpoint = None, None, None
+    evals_without_improvement = 0
+    step = 0
+    while step < req.max_steps_train:
+        with recorder.measure_training():
+            model.train(input_fn=lambda: input_fn(req, train=True),
+                        max_steps=min(step + conf.early_stopping_eval_interval, req.max_steps_train))
+        val_results = model.evaluate(input_fn=lambda: input_fn(req, validation=True), name="validation")
+        step = int(val_results['global_step'])
+        value = float(val_results[metric.value])
+        log.info(f"Validation <{metric.value}> of model <{mid}> at step {step}: {value}")
+
+        if _is_improvement(value, best_value, metric, conf.early_stopping_min_delta):
+            best_value, best_step = value, step
+            best_checkpoint = DataHandler.snapshot_checkpoint(req.cb_name, req.model_version,
+                                                              model.latest_checkpoint())
+            evals_without_improvement = 0
+        else:
+            evals_without_improvement += 1
+            if evals_without_improvement >= conf.early_stopping_patience:
+                log.info(f"Early stopping training of model <{mid}> at step {step}. Best validation "
+                         f"<{metric.value}> of {best_value} at step {best_step}")
+                break
+
+    return best_checkpoint, step, best_step
+
+
 def update_training_status(status_dict: Dict[str, TrainingStatus], mid: str, state: TrainingState, pid: int):
     status = TrainingStatus()
     status.state = state
@@ -123,7 +408,8 @@ def update_training_status(status_dict: Dict[str, TrainingStatus], mid: str, sta
 
 
 @log.catch
-def train_eval_export(req: TrainingRequest, status_dict: Dict[str, TrainingStatus], active_pids: Dict[int, str]):
+def train_eval_export(req: TrainingRequest, status_dict: Dict[str, TrainingStatus], active_pids: Dict[int, str],
+                      profiling: Optional[ProfilingRequest] = None):
     # TODO use redis or similar to persist status and logs etc
     mid = ModelManager.build_model_id(req.cb_name, req.model_version, req.dataset_version)
     proc = multiprocessing.current_process()
@@ -137,8 +423,10 @@ def train_eval_export(req: TrainingRequest, status_dict: Dict[str, TrainingStatu
 
     # intercept logs to loguru sink
     intercept_handler = LoggingInterceptHandler()
+    recorder = PerformanceRecorder()
     try:
         update_training_status(status_dict, mid, TrainingState.preparing, proc.pid)
+        recorder.start_phase(TrainingState.preparing)
 
         # create log file
         log_file = Trainer.get_training_log(TrainingResponse(model_id=mid), create=True)
@@ -148,56 +436,94 @@ def train_eval_export(req: TrainingRequest, status_dict: Dict[str, TrainingStatu
         tf.get_logger().addHandler(intercept_handler)
         logging.basicConfig(handlers=[intercept_handler], level=0)
 
-        # create model
-        log.info(f"Building model <{req.model_version}> for Codebook <{req.cb_name}> with model config"
-                 f"<{req.model_config}>. ModelID: <{mid}>")
-        dataset_metadata = DatasetManager.get_metadata(req.cb_name, req.dataset_version)
-        model, embedding_layer, mid = ModelFactory.build_model(req, n_classes=len(dataset_metadata.labels))
-
-        # train model
-        log.info(f"Starting training of model <{mid}>")
-        # updating training status
-        update_training_status(status_dict, mid, TrainingState.training, proc.pid)
-        model.train(input_fn=lambda: input_fn(req, train=True), max_steps=req.max_steps_train)
-
-        # evaluate model
-        log.info(f"Starting evaluation of model <{mid}>")
-        # updating training status
-        update_training_status(status_dict, mid, TrainingState.evaluating, proc.pid)
-        eval_results = model.evaluate(input_fn=lambda: input_fn(req, train=False), steps=req.max_steps_test)
-        res_pp = pp.pformat(eval_results)
-        log.info(f"Evaluation results of model <{mid}>:\n {res_pp}")
-
-        # export # TODO this should be moved to ModelFactory
-        log.info(f"Starting export of model <{mid}>")
-        # updating training status
-        update_training_status(status_dict, mid, TrainingState.training, proc.pid)
-        # create serving function
-        serving_input_fn = tf.estimator.export.build_parsing_serving_input_receiver_fn(
-            tf.feature_column.make_parse_example_spec([embedding_layer]))
-        # finally, persist model # TODO this should be moved to DataHandler
-        dst = DataHandler.get_model_directory(req.cb_name, req.model_version, create=True)
-        estimator_path = model.export_saved_model(str(dst),
-                                                  serving_input_fn)
-        estimator_path = estimator_path.decode('utf-8')
-        log.info(f"Tensorflow exported model successfully at {estimator_path}")
-        # move the exported model files to the mode dir (see export_saved_model docs)
-        log.info(f"Moving <{mid}> to <{str(dst)}>")
-        files = [f for f in Path(estimator_path).iterdir()]
-        for f in files:
-            shutil.move(str(f), str(f.parent.parent))
-
-        # publish the model
-        ModelManager.publish_model(req, eval_results)
-
-        if not ModelManager.is_available(req.cb_name, req.model_version, complete_check=True):
-            raise StoringError()
-
-        log.info(f"Successfully exported model <{mid}> at {estimator_path}")
-        log.info(f"Completed train-eval-export cycle for model <{mid}>")
-        log.info(f"Model <{mid}> stored at {str(dst)}")
-        # updating training status
-        update_training_status(status_dict, mid, TrainingState.finished, proc.pid)
+        # profile the training if it was requested via the profiling endpoints
+        if profiling is not None and profiling.tensorflow_profiler and req.num_workers > 1:
+            # the profiler would initialize the TF runtime before the workers are forked
+            log.warning(f"The TensorFlow profiler is not supported for data-parallel trainings! Only the Python "
+                        f"stacks of the training of model <{mid}> get profiled.")
+            profiling = profiling.copy(update={"tensorflow_profiler": False})
+        with Profiler.profile(profiling):
+            # create model
+            log.info(f"Building model <{req.model_version}> for Codebook <{req.cb_name}> with model config"
+                     f"<{req.model_config}>. ModelID: <{mid}>")
+            dataset_metadata = DatasetManager.get_metadata(req.cb_name, req.dataset_version)
+            n_classes = len(dataset_metadata.labels)
+            if req.num_workers > 1:
+                # the model gets built after the data-parallel training because the workers have to be forked before
+                # TF initializes its runtime in this process
+                model, embedding_layer = None, None
+            else:
+                model, embedding_layer, mid = ModelFactory.build_model(req, n_classes=n_classes)
+
+            # train model
+            log.info(f"Starting training of model <{mid}>")
+            # updating training status
+            update_training_status(status_dict, mid, TrainingState.training, proc.pid)
+            recorder.start_phase(TrainingState.training)
+            best_checkpoint, stopped_at_step, best_step = None, None, None
+            scaling_efficiency = None
+            if req.num_workers > 1:
+                if req.model_config.early_stopping:
+                    log.warning(f"Early stopping is not supported for data-parallel trainings! Model <{mid}> gets "
+                                f"trained for {req.max_steps_train} steps.")
+                steps_per_sec = train_data_parallel(req, n_classes, mid, recorder)
+
+                model, embedding_layer, mid = ModelFactory.build_model(req, n_classes=n_classes)
+                stopped_at_step = int(model.get_variable_value(tf.compat.v1.GraphKeys.GLOBAL_STEP))
+                scaling_efficiency = measure_scaling_efficiency(req, n_classes, mid, steps_per_sec)
+            elif req.model_config.early_stopping:
+                best_checkpoint, stopped_at_step, best_step = train_with_early_stopping(model, req, mid, recorder)
+            else:
+                with recorder.measure_training():
+                    model.train(input_fn=lambda: input_fn(req, train=True), max_steps=req.max_steps_train)
+                stopped_at_step = int(model.get_variable_value(tf.compat.v1.GraphKeys.GLOBAL_STEP))
+
+            # evaluate model (with early stopping, the best checkpoint gets evaluated and exported)
+            log.info(f"Starting evaluation of model <{mid}>")
+            # updating training status
+            update_training_status(status_dict, mid, TrainingState.evaluating, proc.pid)
+            recorder.start_phase(TrainingState.evaluating)
+            eval_results = model.evaluate(input_fn=lambda: input_fn(req, train=False), steps=req.max_steps_test,
+                                          checkpoint_path=best_checkpoint)
+            res_pp = pp.pformat(eval_results)
+            log.info(f"Evaluation results of model <{mid}>:\n {res_pp}")
+
+            # export
+            log.info(f"Starting export of model <{mid}>")
+            # updating training status
+            update_training_status(status_dict, mid, TrainingState.exporting, proc.pid)
+            recorder.start_phase(TrainingState.exporting)
+            estimator_path = ModelFactory.export_model(model, embedding_layer, req, checkpoint_path=best_checkpoint)
+            optimized_variant = None
+            if conf.backend.export.optimize:
+                optimized_variant = ModelFactory.export_optimized_model(model, req, checkpoint_path=best_checkpoint)
+            dst = DataHandler.get_model_directory(req.cb_name, req.model_version)
+
+            # publish the model
+            performance = recorder.build_performance(
+                train_steps=stopped_at_step,
+                examples_per_step=req.batch_size_train * req.num_workers,
+                model_size=DataHandler.get_saved_model_size(req.cb_name, req.model_version),
+                num_workers=req.num_workers,
+                scaling_efficiency=scaling_efficiency)
+            log.info(f"Training performance of model <{mid}>:\n {pp.pformat(performance.dict())}")
+            ModelManager.publish_model(req, eval_results, stopped_at_step=stopped_at_step, best_step=best_step,
+                                       performance=performance, optimized_variant=optimized_variant)
+
+            if not ModelManager.is_available(req.cb_name, req.model_version, complete_check=True):
+                raise StoringError()
+
+            # remove the training artifacts that are not needed for serving the published model
+            try:
+                ModelManager.prune(req.cb_name, req.model_version)
+            except Exception as e:
+                log.warning(f"Cannot prune the training artifacts of model <{mid}>: {e}")
+
+            log.info(f"Successfully exported model <{mid}> at {estimator_path}")
+            log.info(f"Completed train-eval-export cycle for model <{mid}>")
+            log.info(f"Model <{mid}> stored at {str(dst)}")
+            # updating training status
+            update_training_status(status_dict, mid, TrainingState.finished, proc.pid)
     except Exception as e:
         update_training_status(status_dict, mid, TrainingState.error, proc.pid)
         raise e
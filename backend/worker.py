@@ -0,0 +1,264 @@
+"""
+Worker service of the 'redis' worker mode (backend.workers.mode). It processes the prediction and training jobs that
+the API workers queue in Redis (see JobBroker), so that any number of API workers share the prediction worker pool,
+the trainings and their status:
+
+    python -m backend.worker
+
+The prediction workers are long-running processes that keep the recently used models loaded (see ModelCache). At
+startup, they load and warm up the configured and the most recently used models (backend.workers.preload) before they
+report being ready. Each training runs in its own process like in the 'local' worker mode.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import Process
+from typing import Tuple, Any, Dict, List, Optional, Callable
+
+from loguru import logger as log
+
+from api.model import TrainingState, TrainingStatus
+from backend import DataHandler, RedisHandler, DatasetManager, EmbeddingManager, ModelManager, Predictor, Profiler, \
+    JobBroker, ModelFactory, Trainer, tracing
+from backend.db.job_broker import PREDICTION_QUEUE, TRAINING_QUEUE, WORKER_WARMING_UP, WORKER_READY
+from backend.lazy_import import LazyModule, ensure_imported
+from backend.predictor import PredictionJob, PredictionJobResult
+from backend.training.trainer import TrainingJob, train_eval_export
+from config import conf
+
+tf = LazyModule("tensorflow")
+hub = LazyModule("tensorflow_hub")
+
+
+class ModelCache(object):
+    """
+    The loaded models of a prediction worker. If more than capacity models are loaded, the least recently used model
+    gets evicted. Models whose SavedModel changed since they were loaded (e.g. because they were trained again) get
+    loaded again.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = max(capacity, 1)
+        # (cb_name, model_version) -> (modification time of the SavedModel, model)
+        self._models: "OrderedDict[Tuple[str, str], Tuple[int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._models
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @staticmethod
+    def _get_modification_time(cb_name: str, model_version: str) -> int:
+        saved_model = DataHandler.get_model_directory(cb_name, model_version).joinpath("saved_model.pb")
+        return saved_model.stat().st_mtime_ns if saved_model.exists() else 0
+
+    def get(self, cb_name: str, model_version: str) -> Tuple[Any, bool, int]:
+        """
+        :return: the model, whether it had to be loaded and the number of models that got evicted
+        """
+        key = (cb_name, model_version)
+        modified = self._get_modification_time(cb_name, model_version)
+        cached = self._models.get(key)
+        if cached is not None and cached[0] == modified:
+            self._models.move_to_end(key)
+            return cached[1], False, 0
+
+        model = ModelManager.load(cb_name, model_version=model_version)
+        self._models[key] = (modified, model)
+        self._models.move_to_end(key)
+        evicted = 0
+        while len(self._models) > self._capacity:
+            (evicted_cb_name, evicted_version), _ = self._models.popitem(last=False)
+            log.info(f"Evicted model '{evicted_version}' of Codebook {evicted_cb_name} from the model cache")
+            evicted += 1
+        return model, True, evicted
+
+
+def process_prediction(job: PredictionJob, cache: ModelCache) -> PredictionJobResult:
+    result, error, load_seconds, evicted = None, None, None, 0
+    with tracing.collect_remote_spans(job.parent_span_id) as spans:
+        tracing.add_span("predictor.queue", job.submitted_at, time.time_ns())
+        try:
+            with Profiler.profile(job.profiling):
+                start = time.perf_counter()
+                model, loaded, evicted = cache.get(job.request.cb_name, job.request.model_version)
+                if loaded:
+                    load_seconds = time.perf_counter() - start
+                result = Predictor.predict_with_model(job.request, model)
+        except Exception as e:
+            log.error(f"Error occurred within prediction job <{job.job_id}>: {type(e).__name__}: {e}")
+            error = f"{type(e).__name__}: {e}"
+    if error is None:
+        JobBroker().record_model_use(job.request.cb_name, job.request.model_version)
+    return PredictionJobResult(result=result, error=error, load_seconds=load_seconds, evicted_models=evicted,
+                               spans=spans)
+
+
+def _prediction_worker_id(pid: int) -> str:
+    return f"prediction:{socket.gethostname()}:{pid}"
+
+
+def _worker_service_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def preload_models(cache: ModelCache, broker: JobBroker, report_progress: Optional[Callable[[], None]] = None):
+    """
+    Loads the configured and the most recently used models into the cache and warms them up with dummy batches
+    :param report_progress: called before each model gets loaded, e.g. to report the state of the worker again
+    """
+    preload = conf.backend.workers.preload
+    models = [(m.cb_name, m.get("model_version", "default")) for m in preload.models]
+    if int(preload.recently_used) > 0:
+        models += broker.list_recently_used_models(int(preload.recently_used))
+    # without duplicates and without evicting preloaded models again
+    models = list(OrderedDict.fromkeys(models))[:cache.capacity]
+
+    batch_sizes = [int(size) for size in preload.warmup_batch_sizes]
+    # load the most important model last, so that it is the last one to get evicted
+    for cb_name, model_version in reversed(models):
+        if not ModelManager.is_available(cb_name, model_version):
+            log.warning(f"Cannot preload model '{model_version}' of Codebook {cb_name} because it is not available!")
+            continue
+        if report_progress is not None:
+            report_progress()
+        try:
+            start = time.perf_counter()
+            model, _, _ = cache.get(cb_name, model_version)
+            loaded = time.perf_counter()
+            Predictor.warm_up(model, batch_sizes)
+            log.info(f"Preloaded model '{model_version}' of Codebook {cb_name} in {loaded - start:.3f}s and warmed it "
+                     f"up in {time.perf_counter() - loaded:.3f}s")
+        except Exception as e:
+            log.error(f"Error occurred while preloading model '{model_version}' of Codebook {cb_name}: "
+                      f"{type(e).__name__}: {e}")
+
+
+def run_prediction_worker(index: int):
+    # the signal handlers of the worker service are inherited by the forked process
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    log.info(f"Started prediction worker {index} with PID <{os.getpid()}>")
+
+    broker = JobBroker()
+    cache = ModelCache(int(conf.backend.workers.model_cache_size))
+    timeout = int(conf.backend.workers.prediction_timeout)
+    # the state is reported again after every job or 5 seconds without a job, so it expires if the worker is gone
+    worker_id = _prediction_worker_id(os.getpid())
+    state_ttl = timeout + 30
+    preload_models(cache, broker, lambda: broker.report_worker_state(worker_id, WORKER_WARMING_UP, ttl=state_ttl))
+    while True:
+        broker.report_worker_state(worker_id, WORKER_READY, ttl=state_ttl)
+        job: PredictionJob = broker.pop(PREDICTION_QUEUE)
+        if job is None:
+            continue
+        if time.time_ns() - job.submitted_at > timeout * 10 ** 9:
+            log.warning(f"Dropping prediction job <{job.job_id}> because the API worker stopped waiting for it!")
+            continue
+        broker.put_result(job.job_id, process_prediction(job, cache), ttl=timeout)
+
+
+def run_training_slot(stop: threading.Event):
+    broker = JobBroker()
+    while not stop.is_set():
+        job: TrainingJob = broker.pop(TRAINING_QUEUE)
+        if job is None:
+            continue
+
+        mid = ModelManager.build_model_id(job.request.cb_name, job.request.model_version,
+                                          job.request.dataset_version)
+        log.info(f"Spawning new process for train-eval-export cycle of model <{mid}>")
+        p = Process(target=train_eval_export,
+                    args=(job.request, Trainer._status_dict, Trainer._active_pids, job.profiling))
+        p.start()
+        p.join()
+
+        # e.g. if the process got killed
+        status: TrainingStatus = Trainer._status_dict.get(mid)
+        if p.exitcode != 0 and status is not None and status.state != TrainingState.error:
+            log.error(f"Process of the train-eval-export cycle of model <{mid}> exited with code {p.exitcode}!")
+            Trainer._status_dict[mid] = TrainingStatus(state=TrainingState.error, process_status="dead")
+        Trainer._active_pids.pop(p.pid, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prediction-workers", type=int, default=int(conf.backend.workers.prediction_workers),
+                        help="Number of prediction worker processes")
+    parser.add_argument("--concurrent-trainings", type=int, default=int(conf.backend.workers.concurrent_trainings),
+                        help="Number of trainings that run at the same time")
+    args = parser.parse_args()
+
+    if conf.backend.workers.mode != "redis":
+        raise SystemExit("The worker service requires the 'redis' worker mode! Set backend.workers.mode or "
+                         "CBA_API_WORKER_MODE to 'redis'.")
+
+    log.add('logs/worker_{time}.log', rotation=f"{conf.logging.rotation} MB", level=conf.logging.level)
+    # instantiate singletons
+    DataHandler()
+    RedisHandler()
+    JobBroker()
+    DatasetManager()
+    EmbeddingManager()
+    ModelFactory()
+    ModelManager()
+    Predictor()
+    Trainer()
+    Profiler()
+    # the prediction workers and training processes get forked and inherit the imported modules
+    ensure_imported(tf, hub)
+    # exclude the objects of the imported modules from garbage collection. Otherwise, the first full collections of
+    # the prediction workers (e.g. while a model gets loaded) traverse all of them and touch their memory pages,
+    # which are then no longer shared with the worker service (copy-on-write).
+    gc.freeze()
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: stop.set())
+
+    slots: List[threading.Thread] = []
+    for idx in range(args.concurrent_trainings):
+        slot = threading.Thread(target=run_training_slot, args=(stop,), name=f"training-slot-{idx}", daemon=True)
+        slot.start()
+        slots.append(slot)
+
+    workers: Dict[int, Process] = dict()
+    log.info(f"Started worker service with {args.prediction_workers} prediction workers and "
+             f"{args.concurrent_trainings} training slots")
+    while not stop.is_set():
+        # the API is only ready if this many prediction workers are ready (see the /ready endpoint)
+        JobBroker().report_worker_service(_worker_service_id(), args.prediction_workers, ttl=30)
+        for idx in range(args.prediction_workers):
+            if idx in workers and not workers[idx].is_alive():
+                log.warning(f"Prediction worker {idx} exited with code {workers[idx].exitcode}! Restarting it.")
+                JobBroker().remove_worker_state(_prediction_worker_id(workers[idx].pid))
+            if idx not in workers or not workers[idx].is_alive():
+                workers[idx] = Process(target=run_prediction_worker, args=(idx,), name=f"prediction-worker-{idx}",
+                                       daemon=True)
+                workers[idx].start()
+        stop.wait(5)
+
+    log.info("Stopping worker service ...")
+    JobBroker().remove_worker_service(_worker_service_id())
+    for worker in workers.values():
+        worker.terminate()
+    for worker in workers.values():
+        worker.join()
+        JobBroker().remove_worker_state(_prediction_worker_id(worker.pid))
+    # running trainings are not interrupted
+    for slot in slots:
+        slot.join()
+
+
+if __name__ == "__main__":
+    main()
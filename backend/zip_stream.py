@@ -0,0 +1,200 @@
+"""
+Zip archives that are generated on the fly while they are sent. The members are stored without compression and their
+CRC-32 checksums are written in data descriptors after the member data, so the archive never has to exist on disk and
+the size and byte layout of the archive are known before the first byte is sent. This allows to serve arbitrary byte
+ranges of the archive.
+"""
+import hashlib
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import List, Tuple, Iterator, Optional
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+# bit 3: sizes and CRC-32 are in the data descriptor, bit 11: names are UTF-8 encoded
+_FLAGS = 0x0808
+_LOCAL_HEADER_SIZE = 30
+_CENTRAL_HEADER_SIZE = 46
+_ZIP64_EXTRA_SIZE = 4 + 3 * 8
+_EOCD_SIZE = 22
+_ZIP64_EOCD_SIZE = 56
+_ZIP64_LOCATOR_SIZE = 20
+
+
+class _Member(object):
+    def __init__(self, name: str, path: Path, offset: int):
+        stat = path.stat()
+        self.name = name.encode('utf-8')
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.offset = offset
+        self.zip64 = self.size >= _ZIP64_LIMIT or offset >= _ZIP64_LIMIT
+        self.crc: Optional[int] = None
+
+    @property
+    def version(self) -> int:
+        return 45 if self.zip64 else 20
+
+    @property
+    def dos_time(self) -> Tuple[int, int]:
+        t = time.localtime(self.mtime)
+        # the earliest date that can be represented in zip archives is 1980-01-01
+        if t.tm_year < 1980:
+            return 0, (1 << 5) | 1
+        return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+               ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    @property
+    def local_header_size(self) -> int:
+        return _LOCAL_HEADER_SIZE + len(self.name) + (4 + 2 * 8 if self.zip64 else 0)
+
+    @property
+    def descriptor_size(self) -> int:
+        return 4 + 4 + (2 * 8 if self.zip64 else 2 * 4)
+
+    @property
+    def central_header_size(self) -> int:
+        return _CENTRAL_HEADER_SIZE + len(self.name) + (_ZIP64_EXTRA_SIZE if self.zip64 else 0)
+
+    def local_header(self) -> bytes:
+        dos_time, dos_date = self.dos_time
+        sizes, extra = 0, b''
+        if self.zip64:
+            sizes, extra = _ZIP64_LIMIT, struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, self.version, _FLAGS, 0, dos_time, dos_date, 0, sizes, sizes,
+                           len(self.name), len(extra)) + self.name + extra
+
+    def descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack('<IIQQ', 0x08074b50, self.crc, self.size, self.size)
+        return struct.pack('<IIII', 0x08074b50, self.crc, self.size, self.size)
+
+    def central_header(self) -> bytes:
+        dos_time, dos_date = self.dos_time
+        size, offset, extra = self.size, self.offset, b''
+        if self.zip64:
+            size, offset = _ZIP64_LIMIT, _ZIP64_LIMIT
+            extra = struct.pack('<HHQQQ', 0x0001, 24, self.size, self.size, self.offset)
+        # made by UNIX so that the permissions in the external attributes are used
+        return struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | self.version, self.version, _FLAGS, 0,
+                           dos_time, dos_date, self.crc, size, size, len(self.name), len(extra), 0, 0, 0,
+                           (0o100644 << 16), offset) + self.name + extra
+
+
+class ZipStream(object):
+    """
+    Stored (uncompressed) zip archive of files that gets generated while it is read. The CRC-32 checksums of the
+    members are computed while their data is streamed. Only if a byte range skips the data of a member but contains
+    its checksum, the member gets read once more.
+    """
+
+    def __init__(self, files: List[Tuple[str, Path]], chunk_size: int = 1024 * 1024):
+        """
+        :param files: the names of the members in the archive and the paths of their files
+        :param chunk_size: size of the chunks that are read from the files
+        """
+        self._chunk_size = chunk_size
+        self._members: List[_Member] = []
+        # the segments of the archive as (start, end, kind, index of the member)
+        self._segments: List[Tuple[int, int, str, int]] = []
+
+        offset = 0
+        for idx, (name, path) in enumerate(files):
+            member = _Member(name, path, offset)
+            self._members.append(member)
+            for kind, size in [('header', member.local_header_size),
+                               ('data', member.size),
+                               ('descriptor', member.descriptor_size)]:
+                self._segments.append((offset, offset + size, kind, idx))
+                offset += size
+
+        self._central_directory_offset = offset
+        self._central_directory_size = sum(m.central_header_size for m in self._members)
+        self._zip64 = any(m.zip64 for m in self._members) or len(self._members) >= _ZIP64_COUNT_LIMIT or \
+            offset >= _ZIP64_LIMIT or self._central_directory_size >= _ZIP64_LIMIT
+        end_size = _EOCD_SIZE + (_ZIP64_EOCD_SIZE + _ZIP64_LOCATOR_SIZE if self._zip64 else 0)
+        self._segments.append((offset, offset + self._central_directory_size, 'central_directory', -1))
+        offset += self._central_directory_size
+        self._segments.append((offset, offset + end_size, 'end', -1))
+        self._size = offset + end_size
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def etag(self) -> str:
+        # the archive only changes if the names, sizes or modification times of the files change
+        digest = hashlib.sha1()
+        for m in self._members:
+            digest.update(m.name + f"\0{m.size}\0{m.mtime}\0".encode('utf-8'))
+        return f'"{digest.hexdigest()}"'
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Generates the bytes [start, stop) of the archive
+        :param start: first byte of the range
+        :param stop: end (exclusive) of the range. Defaults to the end of the archive.
+        :return: iterator over the chunks of the range
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        for seg_start, seg_end, kind, idx in self._segments:
+            if seg_end <= start or seg_start >= stop or seg_start == seg_end:
+                continue
+            lo, hi = max(start, seg_start) - seg_start, min(stop, seg_end) - seg_start
+            if kind == 'data':
+                yield from self._read_data(self._members[idx], lo, hi)
+            else:
+                yield self._segment_bytes(kind, idx)[lo:hi]
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.iter_range()
+
+    def _segment_bytes(self, kind: str, idx: int) -> bytes:
+        if kind == 'header':
+            return self._members[idx].local_header()
+        elif kind == 'descriptor':
+            return self._with_crc(self._members[idx]).descriptor()
+        elif kind == 'central_directory':
+            return b''.join(self._with_crc(m).central_header() for m in self._members)
+        return self._end_of_central_directory()
+
+    def _end_of_central_directory(self) -> bytes:
+        count, cd_size, cd_offset = len(self._members), self._central_directory_size, self._central_directory_offset
+        if not self._zip64:
+            return struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, cd_size, cd_offset, 0)
+
+        zip64_eocd_offset = cd_offset + cd_size
+        return struct.pack('<IQHHIIQQQQ', 0x06064b50, _ZIP64_EOCD_SIZE - 12, (3 << 8) | 45, 45, 0, 0, count, count,
+                           cd_size, cd_offset) + \
+            struct.pack('<IIQI', 0x07064b50, 0, zip64_eocd_offset, 1) + \
+            struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, _ZIP64_COUNT_LIMIT, _ZIP64_COUNT_LIMIT, _ZIP64_LIMIT,
+                        _ZIP64_LIMIT, 0)
+
+    def _read_data(self, member: _Member, lo: int, hi: int) -> Iterator[bytes]:
+        # the checksum can only be computed on the fly if the complete data is streamed
+        crc = 0 if lo == 0 and hi == member.size else None
+        with open(member.path, 'rb') as f:
+            f.seek(lo)
+            remaining = hi - lo
+            while remaining > 0:
+                chunk = f.read(min(self._chunk_size, remaining))
+                if len(chunk) == 0:
+                    raise IOError(f"{str(member.path)} changed while it was streamed!")
+                if crc is not None:
+                    crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        if crc is not None:
+            member.crc = crc
+
+    def _with_crc(self, member: _Member) -> _Member:
+        if member.crc is None:
+            crc = 0
+            for chunk in self._read_data(member, 0, member.size):
+                crc = zlib.crc32(chunk, crc)
+            member.crc = crc
+        return member
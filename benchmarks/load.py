@@ -0,0 +1,254 @@
+"""
+Load generator for the prediction routes. Requests to /prediction/single and /prediction/multiple are sent at a
+target rate (open loop, i.e. independent of the response times) with documents built from the texts in sample_txt/
+and a configurable mix of codebooks. Latencies are measured from the scheduled start of a request, so that queueing
+in the client or the API is part of them.
+
+Against a running API:
+
+    python -m benchmarks.load --url http://localhost:8081 --codebook MyCodebook:default:1 --rate 5 --duration 60
+
+Against an in-process app with the offline stand-ins of the benchmarks (the models of the codebooks get trained on
+generated datasets first):
+
+    python -m benchmarks.load --in-process --codebook A:mv1:3 --codebook B:mv1:1 --rate 2 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, NamedTuple, Optional
+
+import httpx
+
+SAMPLE_TXT_DIR = Path(__file__).parent.parent.joinpath("sample_txt")
+
+
+class Codebook(NamedTuple):
+    name: str
+    model_version: str
+    weight: float
+
+    @staticmethod
+    def parse(spec: str) -> 'Codebook':
+        # <name>[:<model_version>[:<weight>]]
+        parts = spec.split(":")
+        if not 1 <= len(parts) <= 3:
+            raise argparse.ArgumentTypeError(f"Invalid codebook '{spec}'! Expected <name>[:<model_version>[:<weight>]]")
+        return Codebook(name=parts[0],
+                        model_version=parts[1] if len(parts) > 1 else "default",
+                        weight=float(parts[2]) if len(parts) > 2 else 1.)
+
+
+class DocumentGenerator(object):
+    """
+    Generates documents from consecutive words of a corpus, starting at random positions. The number of words per
+    document is drawn from the configured length distribution.
+    """
+
+    def __init__(self, corpus_dir: Path, distribution: str = "lognormal", mean_words: int = 200,
+                 max_words: int = 2000, sigma: float = .8, seed: int = 0):
+        self._words = [w for f in sorted(corpus_dir.glob("*.txt")) for w in f.read_text(encoding="utf-8").split()]
+        if len(self._words) == 0:
+            raise ValueError(f"No words in the *.txt files of {corpus_dir}!")
+        self._distribution = distribution
+        self._mean_words = mean_words
+        self._max_words = max_words
+        self._sigma = sigma
+        self._random = random.Random(seed)
+        self._next_doc_id = 0
+
+    def _draw_length(self) -> int:
+        if self._distribution == "fixed":
+            length = self._mean_words
+        elif self._distribution == "uniform":
+            length = self._random.randint(1, 2 * self._mean_words)
+        else:
+            # mean of the lognormal distribution is exp(mu + sigma^2 / 2)
+            mu = math.log(self._mean_words) - self._sigma ** 2 / 2
+            length = int(self._random.lognormvariate(mu, self._sigma))
+        return min(max(length, 1), self._max_words)
+
+    def generate(self, proj_id: int = 1) -> Dict[str, Any]:
+        length, offset = self._draw_length(), self._random.randrange(len(self._words))
+        words = [self._words[(offset + idx) % len(self._words)] for idx in range(length)]
+        self._next_doc_id += 1
+        return {"doc_id": self._next_doc_id, "proj_id": proj_id, "text": " ".join(words)}
+
+
+class RequestResult(NamedTuple):
+    route: str
+    codebook: str
+    num_docs: int
+    latency: float
+    error: Optional[str]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if len(values) == 0:
+        return None
+    # nearest-rank method
+    return sorted(values)[max(int(math.ceil(q * len(values))) - 1, 0)]
+
+
+def summarize(results: List[RequestResult], elapsed: float) -> Dict[str, Any]:
+    succeeded = [r for r in results if r.error is None]
+    latencies = [r.latency for r in succeeded]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "error_rate": (len(results) - len(succeeded)) / len(results) if len(results) > 0 else 0.,
+        "error_types": dict(Counter(r.error for r in results if r.error is not None)),
+        "throughput_rps": len(succeeded) / elapsed,
+        "documents_per_second": sum(r.num_docs for r in succeeded) / elapsed,
+        "latency_mean_seconds": sum(latencies) / len(latencies) if len(latencies) > 0 else None,
+        "latency_p50_seconds": _percentile(latencies, .5),
+        "latency_p95_seconds": _percentile(latencies, .95),
+        "latency_p99_seconds": _percentile(latencies, .99),
+    }
+
+
+async def _send(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, scheduled: float, route: str,
+                codebook: Codebook, payload: Dict[str, Any], num_docs: int, timeout: float) -> RequestResult:
+    error = None
+    async with semaphore:
+        try:
+            resp = await client.post(route, json=payload, timeout=timeout)
+            if resp.status_code >= 400:
+                error = f"HTTP {resp.status_code}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+    return RequestResult(route, codebook.name, num_docs, time.perf_counter() - scheduled, error)
+
+
+async def generate_load(client: httpx.AsyncClient, codebooks: List[Codebook], documents: DocumentGenerator,
+                        rate: float, duration: float, multi_ratio: float = .2, docs_per_request: int = 16,
+                        concurrency: int = 64, timeout: float = 60., seed: int = 0) -> Dict[str, Any]:
+    """
+    Sends prediction requests at a fixed rate and summarizes the latencies, throughput and errors
+    :param client: the client of the API
+    :param codebooks: the codebooks (and model versions) that get requested according to their weights
+    :param documents: the generator of the documents of the requests
+    :param rate: the number of requests per second
+    :param duration: the duration of the load in seconds
+    :param multi_ratio: the fraction of multi document requests
+    :param docs_per_request: the number of documents of multi document requests
+    :param concurrency: the maximum number of concurrent requests
+    :param timeout: the timeout of a request in seconds
+    :param seed: the random seed of the request mix
+    :return: the summaries of all requests, per route and per codebook
+    """
+    rnd = random.Random(seed)
+    semaphore = asyncio.Semaphore(concurrency)
+    weights = [cb.weight for cb in codebooks]
+    tasks = []
+    start = time.perf_counter()
+    for idx in range(int(rate * duration)):
+        scheduled = start + idx / rate
+        await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+
+        codebook = rnd.choices(codebooks, weights=weights)[0]
+        payload = {"cb_name": codebook.name, "model_version": codebook.model_version}
+        if rnd.random() < multi_ratio:
+            route, num_docs = "/prediction/multiple", docs_per_request
+            payload["docs"] = [documents.generate() for _ in range(docs_per_request)]
+        else:
+            route, num_docs = "/prediction/single", 1
+            payload["doc"] = documents.generate()
+        tasks.append(asyncio.ensure_future(_send(client, semaphore, scheduled, route, codebook, payload, num_docs,
+                                                 timeout)))
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_seconds": elapsed,
+        "overall": summarize(results, elapsed),
+        "routes": {route: summarize([r for r in results if r.route == route], elapsed)
+                   for route in sorted({r.route for r in results})},
+        "codebooks": {cb: summarize([r for r in results if r.codebook == cb], elapsed)
+                      for cb in sorted({r.codebook for r in results})}
+    }
+
+
+def _create_in_process_client(codebooks: List[Codebook], train_steps: int, log_level: str) -> httpx.AsyncClient:
+    from benchmarks.offline import configure_process, train_models
+
+    configure_process(log_level)
+    train_models(sorted({(cb.name, cb.model_version) for cb in codebooks}), train_steps, num_samples=2000,
+                 log_level=log_level)
+    # the startup event of the app is not run, because it would download the preloaded embeddings from TF Hub
+    from main import app
+    return httpx.AsyncClient(app=app, base_url="http://cba")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of the API")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Send the requests to an in-process app with the offline stand-ins instead of an API")
+    parser.add_argument("--codebook", type=Codebook.parse, action="append", dest="codebooks",
+                        help="<name>[:<model_version>[:<weight>]] of a requested codebook (repeatable)")
+    parser.add_argument("--rate", type=float, default=5., help="Requests per second")
+    parser.add_argument("--duration", type=float, default=30., help="Duration of the load in seconds")
+    parser.add_argument("--multi-ratio", type=float, default=.2, help="Fraction of multi document requests")
+    parser.add_argument("--docs-per-request", type=int, default=16, help="Documents of multi document requests")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum number of concurrent requests")
+    parser.add_argument("--timeout", type=float, default=60., help="Timeout of a request in seconds")
+    parser.add_argument("--corpus", type=Path, default=SAMPLE_TXT_DIR, help="Directory of *.txt files of the texts")
+    parser.add_argument("--length-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Distribution of the number of words per document")
+    parser.add_argument("--mean-words", type=int, default=200, help="Mean number of words per document")
+    parser.add_argument("--max-words", type=int, default=2000, help="Maximum number of words per document")
+    parser.add_argument("--sigma", type=float, default=.8, help="Sigma of the lognormal length distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--train-steps", type=int, default=200, help="Training steps of the in-process models")
+    parser.add_argument("--output", type=Path, help="JSON file of the results")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the in-process app")
+    args = parser.parse_args()
+
+    if args.in_process == (args.url is not None):
+        parser.error("Either --url or --in-process is required!")
+    codebooks = args.codebooks or [Codebook("Benchmark", "mv1" if args.in_process else "default", 1.)]
+    documents = DocumentGenerator(args.corpus, args.length_distribution, args.mean_words, args.max_words,
+                                  args.sigma, seed=args.seed)
+
+    data_root = None
+    if args.in_process:
+        data_root = tempfile.TemporaryDirectory(prefix="cba_load_")
+        os.environ["CBA_API_DATA_ROOT"] = data_root.name
+        client = _create_in_process_client(codebooks, args.train_steps, args.log_level)
+    else:
+        client = httpx.AsyncClient(base_url=args.url)
+
+    async def run() -> Dict[str, Any]:
+        async with client:
+            return await generate_load(client, codebooks, documents, args.rate, args.duration, args.multi_ratio,
+                                       args.docs_per_request, args.concurrency, args.timeout, args.seed)
+
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "parameters": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items() if k != "codebooks"},
+        "codebooks": [cb._asdict() for cb in codebooks],
+        "results": asyncio.run(run())
+    }
+    if data_root is not None:
+        data_root.cleanup()
+
+    output = json.dumps(results, indent=2)
+    if args.output is not None:
+        args.output.write_text(output)
+        print(f"Wrote load test results to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
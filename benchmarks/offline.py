@@ -0,0 +1,169 @@
+"""
+Offline stand-ins for the external services of the backend, so that the benchmarks run without a Redis server and
+without network access to TF Hub.
+"""
+import io
+import multiprocessing
+import os
+import random
+import sys
+import zipfile
+from pathlib import Path
+from typing import Dict, Set, Union, List, Tuple
+
+import redis
+from loguru import logger as log
+
+DATASET_VERSION = "dv1"
+LABELS = ["food", "tech", "sport", "politics"]
+
+
+class InMemoryRedis(object):
+    """
+    Implements the subset of redis.Redis that is used by the RedisHandler. All instances with the same db index share
+    their data, like connections to the same Redis server do.
+    """
+    _dbs: Dict[int, Dict[str, Set[bytes]]] = dict()
+
+    def __init__(self, host: str = None, port: int = None, db: int = 0, **kwargs):
+        self._data = InMemoryRedis._dbs.setdefault(db, dict())
+
+    def ping(self) -> bool:
+        return True
+
+    def sadd(self, name: str, *values: Union[str, bytes]) -> int:
+        members = self._data.setdefault(name, set())
+        size = len(members)
+        members.update(_encode(v) for v in values)
+        return len(members) - size
+
+    def srem(self, name: str, *values: Union[str, bytes]) -> int:
+        members = self._data.get(name, set())
+        size = len(members)
+        members.difference_update(_encode(v) for v in values)
+        return size - len(members)
+
+    def smembers(self, name: str) -> Set[bytes]:
+        return set(self._data.get(name, set()))
+
+
+def _encode(value: Union[str, bytes]) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def install_in_memory_redis():
+    # the RedisHandler connects via redis.Redis when it gets instantiated
+    redis.Redis = InMemoryRedis
+
+
+def create_embedding_module(path: Path, num_buckets: int = 1000, dim: int = 16) -> Path:
+    """
+    Creates a tiny text embedding module with the interface of TF Hub text embeddings (a batch of strings to a batch
+    of vectors). The tokens are hashed into buckets of a random embedding matrix and averaged.
+    """
+    import tensorflow as tf
+
+    class HashEmbedding(tf.Module):
+        def __init__(self):
+            super().__init__()
+            self.embeddings = tf.Variable(tf.random.normal([num_buckets, dim], seed=1), trainable=False,
+                                          name="embeddings")
+
+        @tf.function(input_signature=[tf.TensorSpec([None], tf.string)])
+        def __call__(self, text):
+            ids = tf.strings.to_hash_bucket_fast(tf.strings.split(tf.strings.lower(text)), num_buckets)
+            return tf.reduce_mean(tf.ragged.map_flat_values(tf.nn.embedding_lookup, self.embeddings, ids), axis=1)
+
+    tf.saved_model.save(HashEmbedding(), str(path))
+    return path
+
+
+def create_dataset_archive(num_train: int, num_test: int, labels: List[str], seed: int = 0) -> io.BytesIO:
+    """
+    Creates a dataset zip archive with train.csv and test.csv. Every label has its own vocabulary, so that models
+    can actually learn the labels.
+    """
+    rnd = random.Random(seed)
+    vocabulary = {label: [f"{label}{i}" for i in range(50)] for label in labels}
+
+    def rows(n: int) -> str:
+        lines = ["text,label"]
+        for _ in range(n):
+            label = rnd.choice(labels)
+            lines.append(" ".join(rnd.choice(vocabulary[label]) for _ in range(rnd.randint(5, 30))) + "," + label)
+        return "\n".join(lines)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("train.csv", rows(num_train))
+        z.writestr("test.csv", rows(num_test))
+    archive.seek(0)
+    return archive
+
+
+def configure_process(log_level: str):
+    """
+    Prepares a benchmark process: no GPUs, logging to stderr and the in-memory Redis stand-in
+    """
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+    log.remove()
+    log.add(sys.stderr, level=log_level)
+    install_in_memory_redis()
+    # the backend singletons get instantiated at startup of the API
+    from backend import DataHandler, RedisHandler
+    DataHandler()
+    RedisHandler()
+
+
+def create_dataset_upload(num_train: int, seed: int = 0):
+    from fastapi import UploadFile
+    return UploadFile(filename="dataset.zip",
+                      file=create_dataset_archive(num_train, max(num_train // 4, 1), LABELS, seed=seed))
+
+
+def get_embedding_directory() -> Path:
+    # directories starting with '_' are no Codebooks
+    return Path(os.environ["CBA_API_DATA_ROOT"]).joinpath("_benchmark_embedding")
+
+
+def build_training_request(cb_name: str, model_version: str, train_steps: int):
+    from api.model import TrainingRequest, ModelConfig
+    return TrainingRequest(cb_name=cb_name, model_version=model_version, dataset_version=DATASET_VERSION,
+                           model_config=ModelConfig(embedding_type=str(get_embedding_directory()), hidden_units=[32]),
+                           max_steps_train=train_steps)
+
+
+def _train_models(models: List[Tuple[str, str]], train_steps: int, num_samples: int, log_level: str):
+    configure_process(log_level)
+    from backend import DatasetManager
+    from backend.training.trainer import train_eval_export
+
+    create_embedding_module(get_embedding_directory())
+    for idx, cb_name in enumerate(sorted({cb_name for cb_name, _ in models})):
+        DatasetManager.store_archive(cb_name, DATASET_VERSION, create_dataset_upload(num_samples, seed=idx))
+    for cb_name, model_version in models:
+        train_eval_export(build_training_request(cb_name, model_version, train_steps), {}, {})
+
+
+def train_models(models: List[Tuple[str, str]], train_steps: int, num_samples: int, log_level: str):
+    """
+    Trains models on generated datasets and registers them in the in-memory Redis stand-in of this process. The
+    training runs in its own process, because predictions get forked from this process and TF must not be
+    initialized before.
+    :param models: the Codebook names and model versions of the models
+    :param train_steps: the number of training steps per model
+    :param num_samples: the number of training samples of the generated datasets
+    :param log_level: the log level of the training process
+    """
+    setup = multiprocessing.get_context("spawn").Process(target=_train_models,
+                                                         args=(models, train_steps, num_samples, log_level))
+    setup.start()
+    setup.join()
+    if setup.exitcode != 0:
+        raise RuntimeError(f"Training of the benchmark models failed with exit code {setup.exitcode}!")
+
+    from backend import DataHandler, RedisHandler
+    # the in-memory Redis of the training process is gone
+    for cb_name, model_version in models:
+        RedisHandler().register_dataset(cb_name, DataHandler.get_dataset_metadata(cb_name, DATASET_VERSION))
+        RedisHandler().register_model(cb_name, DataHandler.get_model_metadata(cb_name, model_version))
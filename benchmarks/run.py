@@ -0,0 +1,187 @@
+"""
+Offline benchmarks of the prediction, training input and metadata paths of the backend. A tiny generated embedding
+module stands in for TF Hub and an in-memory stand-in for Redis, so the benchmarks need neither network access nor a
+Redis server. The results are written as JSON so that they can be compared across commits:
+
+    python -m benchmarks.run --output benchmark.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Any
+
+from benchmarks.offline import DATASET_VERSION, configure_process, create_dataset_upload, build_training_request, \
+    train_models
+
+CB_NAME = "Benchmark"
+MODEL_VERSION = "mv1"
+
+
+def _summarize(durations: List[float], items_per_call: int = 1) -> Dict[str, float]:
+    durations = sorted(durations)
+    return {
+        "calls": len(durations),
+        "mean_seconds": statistics.mean(durations),
+        "p50_seconds": durations[len(durations) // 2],
+        "p95_seconds": durations[min(int(len(durations) * .95), len(durations) - 1)],
+        "items_per_second": items_per_call * len(durations) / sum(durations)
+    }
+
+
+def _measure(fn: Callable, iterations: int, items_per_call: int = 1) -> Dict[str, float]:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return _summarize(durations, items_per_call)
+
+
+def benchmark_redis_lookups(sizes: List[int], iterations: int) -> List[Dict[str, Any]]:
+    """
+    Measures the cost of metadata lookups of the RedisHandler for Codebooks with a growing number of models
+    """
+    from backend import RedisHandler, DataHandler
+
+    metadata = DataHandler.get_model_metadata(CB_NAME, MODEL_VERSION)
+    results = []
+    for size in sizes:
+        cb_name = f"RedisBenchmark{size}"
+        for idx in range(size):
+            RedisHandler().register_model(cb_name, metadata.copy(update={"codebook_name": cb_name,
+                                                                         "version": f"v{idx}"}))
+        results.append({
+            "num_models": size,
+            "get_model_metadata": _measure(lambda: RedisHandler().get_model_metadata(cb_name, f"v{size // 2}"),
+                                           iterations),
+            "list_models": _measure(lambda: RedisHandler().list_models(cb_name), iterations)
+        })
+    return results
+
+
+def benchmark_ingestion(sizes: List[int]) -> List[Dict[str, Any]]:
+    """
+    Measures storing, scanning and caching of uploaded datasets of growing size
+    """
+    from backend import DatasetManager
+
+    results = []
+    for size in sizes:
+        upload = create_dataset_upload(size, seed=size)
+        num_rows = size + max(size // 4, 1)
+        start = time.perf_counter()
+        DatasetManager.store_archive(f"IngestionBenchmark{size}", DATASET_VERSION, upload)
+        duration = time.perf_counter() - start
+        results.append({"num_rows": num_rows, "seconds": duration, "rows_per_second": num_rows / duration})
+    return results
+
+
+def benchmark_predictions(batch_sizes: List[int], iterations: int) -> Dict[str, Any]:
+    """
+    Measures the latency and throughput of single and multi document predictions including the prediction processes
+    and loading the model
+    """
+    from backend import Predictor
+    from api.model import PredictionRequest, MultiDocumentPredictionRequest, DocumentDTO
+
+    texts = ["food1 food7 food12 food3", "tech4 tech9 tech2", "sport1 sport5 sport30 sport8", "politics7 politics2"]
+    docs = [DocumentDTO(doc_id=idx, proj_id=1, text=texts[idx % len(texts)]) for idx in range(max(batch_sizes))]
+
+    single = PredictionRequest(cb_name=CB_NAME, model_version=MODEL_VERSION, doc=docs[0])
+    results = {"single": _measure(lambda: Predictor().predict(single), iterations), "multi": []}
+    for batch_size in batch_sizes:
+        multi = MultiDocumentPredictionRequest(cb_name=CB_NAME, model_version=MODEL_VERSION, docs=docs[:batch_size])
+        results["multi"].append({"batch_size": batch_size,
+                                 **_measure(lambda: Predictor().predict(multi), iterations, batch_size)})
+    return results
+
+
+def benchmark_input_fn(train_steps: int, num_batches: int, warmup_batches: int = 5) -> Dict[str, Any]:
+    """
+    Measures the examples per second of the training and evaluation input pipelines. This initializes TF in the
+    benchmark process, so no predictions can be forked afterwards.
+    """
+    from backend.training.trainer import input_fn
+
+    req = build_training_request(CB_NAME, MODEL_VERSION, train_steps)
+    results = {}
+    for split, train in [("train", True), ("test", False)]:
+        # the training input repeats endlessly, the test input is read once
+        batches = iter(input_fn(req, train=train))
+        if train:
+            for _ in range(warmup_batches):
+                next(batches)
+            batches = itertools.islice(batches, num_batches)
+        num_examples, start = 0, time.perf_counter()
+        for _, labels in batches:
+            num_examples += int(labels.shape[0])
+        duration = time.perf_counter() - start
+        results[split] = {"examples": num_examples, "seconds": duration,
+                          "examples_per_second": num_examples / duration}
+    return results
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=Path(__file__).parent).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"), help="JSON file of the results")
+    parser.add_argument("--iterations", type=int, default=20, help="Number of calls per latency measurement")
+    parser.add_argument("--codebook-sizes", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Numbers of models per Codebook for the Redis lookups")
+    parser.add_argument("--dataset-sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Numbers of training samples of the ingested datasets")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 64],
+                        help="Numbers of documents of the multi document predictions")
+    parser.add_argument("--train-steps", type=int, default=200, help="Training steps of the benchmark model")
+    parser.add_argument("--train-samples", type=int, default=2000, help="Training samples of the benchmark model")
+    parser.add_argument("--input-batches", type=int, default=100, help="Batches read from the training input")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    data_root = tempfile.TemporaryDirectory(prefix="cba_benchmark_")
+    os.environ["CBA_API_DATA_ROOT"] = data_root.name
+    configure_process(args.log_level)
+    train_models([(CB_NAME, MODEL_VERSION)], args.train_steps, args.train_samples, args.log_level)
+
+    import tensorflow as tf
+
+    results = {
+        "commit": _get_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python_version": platform.python_version(),
+        "tensorflow_version": tf.__version__,
+        "parameters": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "results": {}
+    }
+    suites = [("redis_lookups", lambda: benchmark_redis_lookups(args.codebook_sizes, args.iterations)),
+              ("ingestion", lambda: benchmark_ingestion(args.dataset_sizes)),
+              ("predictions", lambda: benchmark_predictions(args.batch_sizes, args.iterations)),
+              # has to be the last suite (see docs)
+              ("input_fn", lambda: benchmark_input_fn(args.train_steps, args.input_batches))]
+    for name, suite in suites:
+        print(f"Running benchmark '{name}' ...", file=sys.stderr)
+        results["results"][name] = suite()
+
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Wrote benchmark results to {args.output}", file=sys.stderr)
+    data_root.cleanup()
+
+
+if __name__ == "__main__":
+    main()
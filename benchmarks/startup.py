@@ -0,0 +1,133 @@
+"""
+Startup benchmark of the API. Each run starts a fresh interpreter that imports the app, runs its startup (without
+preloading embeddings from TF Hub and with the in-memory Redis stand-in) and sends a metadata request, and measures
+the duration and the resident memory (RSS) after each of these phases as well as whether TensorFlow was loaded:
+
+    python -m benchmarks.startup --output startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List
+
+import psutil
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def _rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def _is_tensorflow_loaded() -> bool:
+    # the tensorflow module can be registered without being executed (lazy import), its submodules cannot
+    return "tensorflow.python" in sys.modules
+
+
+def measure_startup(data_root: str) -> Dict[str, Any]:
+    """
+    Measures the startup phases in the current process, which has to be a fresh interpreter in the repository root
+    """
+    from loguru import logger as log
+    log.remove()
+    log.add(sys.stderr, level="WARNING")
+    results = {"baseline_rss_mb": _rss_mb()}
+
+    start = time.perf_counter()
+    import main
+    results["import_seconds"] = time.perf_counter() - start
+    results["import_rss_mb"] = _rss_mb()
+
+    from benchmarks.offline import install_in_memory_redis
+    from config import conf
+    install_in_memory_redis()
+    conf.backend.tfhub.preload = []
+    # the log file of the API is created relative to the working directory
+    os.chdir(data_root)
+    start = time.perf_counter()
+    main.startup_event()
+    results["startup_seconds"] = time.perf_counter() - start
+    results["startup_rss_mb"] = _rss_mb()
+
+    import httpx
+
+    async def request_metadata() -> float:
+        async with httpx.AsyncClient(app=main.app, base_url="http://cba") as client:
+            request_start = time.perf_counter()
+            await client.get("/model/list/", params={"cb_name": "Benchmark"})
+            await client.get("/embedding/list/")
+            return time.perf_counter() - request_start
+
+    results["metadata_request_seconds"] = asyncio.run(request_metadata())
+    results["metadata_request_rss_mb"] = _rss_mb()
+    results["total_seconds"] = results["import_seconds"] + results["startup_seconds"]
+    # ru_maxrss is in KB on Linux
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+    results["tensorflow_loaded"] = _is_tensorflow_loaded()
+
+    main.Trainer.shutdown()
+    return results
+
+
+def run_startup(data_root: str) -> Dict[str, Any]:
+    env = dict(os.environ, CBA_API_DATA_ROOT=data_root, CUDA_VISIBLE_DEVICES="-1",
+               PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT_DIR), os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", data_root], cwd=str(ROOT_DIR),
+                          env=env, stdout=subprocess.PIPE, check=True)
+    return json.loads(proc.stdout.decode().splitlines()[-1])
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: statistics.median(r[k] for r in runs) if not isinstance(runs[0][k], bool) else runs[0][k]
+            for k in runs[0]}
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=str(ROOT_DIR)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=Path("startup.json"), help="JSON file of the results")
+    parser.add_argument("--runs", type=int, default=5, help="Number of measured startups")
+    parser.add_argument("--child", metavar="DATA_ROOT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure_startup(args.child)))
+        return
+
+    runs = []
+    for idx in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="cba_startup_") as data_root:
+            runs.append(run_startup(data_root))
+        print(f"Startup {idx + 1}/{args.runs}: {runs[-1]['total_seconds']:.2f}s, "
+              f"{runs[-1]['metadata_request_rss_mb']:.0f} MB RSS", file=sys.stderr)
+
+    results = {
+        "commit": _get_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python_version": platform.python_version(),
+        "parameters": {"runs": args.runs},
+        "median": summarize(runs),
+        "runs": runs
+    }
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Wrote startup benchmark results to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
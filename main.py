@@ -3,13 +3,17 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from loguru import logger as log
 
-from api.routers import general, model, prediction, training, dataset, mapping
-from backend import DataHandler, ModelFactory, ModelManager, Predictor, Trainer, DatasetManager, RedisHandler
+from api.middleware import MetricsMiddleware, TracingMiddleware
+from api.routers import general, model, prediction, training, dataset, mapping, embedding, profiling
+from backend import DataHandler, ModelFactory, ModelManager, Predictor, Trainer, DatasetManager, RedisHandler, \
+    EmbeddingManager, Profiler, JobBroker
 from backend.exceptions import ModelNotAvailableException, ErroneousMappingException, ErroneousModelException, \
     PredictionError, ModelInitializationException, ErroneousDatasetException, \
     NoDataForCodebookException, DatasetNotAvailableException, InvalidModelIdException, \
     TagLabelMappingNotAvailableException, ModelMetadataNotAvailableException, DatasetMetadataNotAvailableException, \
-    StoringError, RedisError
+    StoringError, RedisError, WarmStartException, EmbeddingNotAvailableException, TFHubEmbeddingException, \
+    ErroneousArchiveException, UploadSessionNotAvailableException, ErroneousUploadException, ProfilingException, \
+    ProfileNotAvailableException
 from config import conf
 
 # create the main app
@@ -27,11 +31,21 @@ def startup_event():
         # instantiate singletons
         DataHandler()
         RedisHandler()
+        if conf.backend.workers.mode == "redis":
+            JobBroker()
         DatasetManager()
+        EmbeddingManager()
         ModelFactory()
         ModelManager()
         Predictor()
         Trainer()
+        Profiler()
+
+        # make sure the configured embedding modules are in the local module registry
+        EmbeddingManager.preload()
+
+        # see the /ready endpoint
+        app.state.started = True
     except Exception as e:
         msg = f"Error while starting the API! Exception: {str(e)}"
         log.error(msg)
@@ -40,9 +54,14 @@ def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    await Trainer.shutdown()
+    Trainer.shutdown()
 
 
+# record latencies and in-flight requests of all routes
+app.add_middleware(MetricsMiddleware)
+# record the phases of requests as trace spans
+app.add_middleware(TracingMiddleware)
+
 # include the routers
 app.include_router(general.router)
 app.include_router(dataset.router, prefix=dataset.PREFIX)
@@ -50,6 +69,8 @@ app.include_router(model.router, prefix=model.PREFIX)
 app.include_router(prediction.router, prefix=prediction.PREFIX)
 app.include_router(training.router, prefix=training.PREFIX)
 app.include_router(mapping.router, prefix=mapping.PREFIX)
+app.include_router(embedding.router, prefix=embedding.PREFIX)
+app.include_router(profiling.router, prefix=profiling.PREFIX)
 
 
 # custom exception handlers
@@ -98,6 +119,24 @@ async def mapping_not_available_exception_handler(request: Request, exc: TagLabe
     )
 
 
+@app.exception_handler(EmbeddingNotAvailableException)
+async def embedding_not_available_exception_handler(request: Request, exc: EmbeddingNotAvailableException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=404,
+        content={"message": exc.message}
+    )
+
+
+@app.exception_handler(TFHubEmbeddingException)
+async def tfhub_embedding_exception_handler(request: Request, exc: TFHubEmbeddingException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=500,
+        content={"message": exc.message}
+    )
+
+
 @app.exception_handler(ModelInitializationException)
 async def model_initialization_exception_handler(request: Request, exc: ModelInitializationException):
     log.error(exc.message)
@@ -136,6 +175,33 @@ async def erroneous_dataset_exception_handler(request: Request, exc: ErroneousDa
     )
 
 
+@app.exception_handler(ErroneousArchiveException)
+async def erroneous_archive_exception_handler(request: Request, exc: ErroneousArchiveException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=400,
+        content={"message": exc.message}
+    )
+
+
+@app.exception_handler(UploadSessionNotAvailableException)
+async def upload_session_not_available_exception_handler(request: Request, exc: UploadSessionNotAvailableException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=404,
+        content={"message": exc.message}
+    )
+
+
+@app.exception_handler(ErroneousUploadException)
+async def erroneous_upload_exception_handler(request: Request, exc: ErroneousUploadException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=400,
+        content={"message": exc.message}
+    )
+
+
 @app.exception_handler(NoDataForCodebookException)
 async def no_data_for_codebook_exception_handler(request: Request, exc: NoDataForCodebookException):
     log.error(exc.message)
@@ -145,6 +211,16 @@ async def no_data_for_codebook_exception_handler(request: Request, exc: NoDataFo
     )
 
 
+@app.exception_handler(WarmStartException)
+async def warm_start_exception_handler(request: Request, exc: WarmStartException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=400,
+        content={"message": exc.message,
+                 "caused_by": exc.caused_by}
+    )
+
+
 @app.exception_handler(InvalidModelIdException)
 async def invalid_model_id_exception_exception_handler(request: Request, exc: InvalidModelIdException):
     log.error(exc.message)
@@ -183,6 +259,24 @@ async def dataset_metadata_not_available_exception_exception_handler(request: Re
     )
 
 
+@app.exception_handler(ProfilingException)
+async def profiling_exception_handler(request: Request, exc: ProfilingException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=400,
+        content={"message": exc.message}
+    )
+
+
+@app.exception_handler(ProfileNotAvailableException)
+async def profile_not_available_exception_handler(request: Request, exc: ProfileNotAvailableException):
+    log.error(exc.message)
+    return JSONResponse(
+        status_code=404,
+        content={"message": exc.message}
+    )
+
+
 if __name__ == "__main__":
     # read port from config
     port = int(conf.api.port)
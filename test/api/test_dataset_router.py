@@ -1,3 +1,4 @@
+import hashlib
 import os
 import sys
 
@@ -8,7 +9,7 @@ sys.path.append(str(os.getcwd()))
 from fastapi.testclient import TestClient
 
 from main import app
-from api.model import BooleanResponse, DatasetMetadata
+from api.model import BooleanResponse, DatasetMetadata, UploadSession, DatasetStatistics
 
 
 @pytest.fixture
@@ -63,21 +64,100 @@ def test_dataset_list(cb_name: str, dsv: str, client: TestClient):
 
 
 @pytest.mark.run(order=5)
+def test_dataset_statistics(cb_name: str, dsv: str, client: TestClient):
+    response = client.get("/dataset/stats/", params={"cb_name": cb_name, "dataset_version": dsv})
+    assert response.status_code == status.HTTP_200_OK
+    stats = DatasetStatistics.parse_obj(response.json())
+    metadata = DatasetMetadata.parse_obj(client.get("/dataset/metadata/", params={"cb_name": cb_name,
+                                                                                 "dataset_version": dsv}).json())
+    assert stats.train.num_samples == metadata.num_training_samples
+    assert stats.test.num_samples == metadata.num_test_samples
+
+
+@pytest.mark.run(order=6)
 def test_dataset_remove(cb_name: str, dsv: str, client: TestClient):
     response = client.delete("/dataset/remove/", params={"cb_name": cb_name, "dataset_version": dsv})
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == BooleanResponse(value=True)
 
 
-@pytest.mark.run(order=6)
+@pytest.mark.run(order=7)
 def test_dataset_is_not_available(cb_name: str, dsv: str, client: TestClient):
     response = client.get("/dataset/available/", params={"cb_name": cb_name, "dataset_version": dsv})
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == BooleanResponse(value=False)
 
 
-@pytest.mark.run(order=7)
+@pytest.mark.run(order=8)
 def test_dataset_list_empty(cb_name: str, dsv: str, client: TestClient):
     response = client.get("/dataset/list/", params={"cb_name": cb_name, "dataset_version": dsv})
     assert response.status_code == status.HTTP_200_OK
     assert len(response.json()) == 0
+
+
+@pytest.mark.run(order=9)
+def test_dataset_chunked_upload(cb_name: str, dsv: str, client: TestClient):
+    with open(os.getcwd() + '/test/resources/product_type_ds.zip', "rb") as f:
+        archive = f.read()
+    chunk_size = len(archive) // 3 + 1
+    chunks = [archive[i:i + chunk_size] for i in range(0, len(archive), chunk_size)]
+
+    response = client.post("/dataset/upload/init/", json={"cb_name": cb_name,
+                                                          "dataset_version": dsv,
+                                                          "total_size": len(archive),
+                                                          "chunk_size": chunk_size,
+                                                          "checksum": hashlib.sha256(archive).hexdigest()})
+    assert response.status_code == status.HTTP_200_OK
+    session = UploadSession.parse_obj(response.json())
+    assert session.num_chunks == len(chunks)
+
+    # corrupted chunks get rejected
+    response = client.put("/dataset/upload/chunk/",
+                          data={"upload_id": session.upload_id, "index": 0, "checksum": "0" * 64},
+                          files={"chunk": ("chunk", chunks[0])})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # chunks can be uploaded in any order
+    for index in reversed(range(len(chunks))):
+        response = client.put("/dataset/upload/chunk/",
+                              data={"upload_id": session.upload_id,
+                                    "index": index,
+                                    "checksum": hashlib.sha256(chunks[index]).hexdigest()},
+                              files={"chunk": ("chunk", chunks[index])})
+        assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/dataset/upload/status/", params={"upload_id": session.upload_id})
+    assert response.status_code == status.HTTP_200_OK
+    assert UploadSession.parse_obj(response.json()).received_chunks == list(range(len(chunks)))
+
+    # a chunk that was corrupted before its checksum was computed fails the completion but can be replaced
+    corrupted = bytes([chunks[1][0] ^ 0xff]) + chunks[1][1:]
+    response = client.put("/dataset/upload/chunk/",
+                          data={"upload_id": session.upload_id, "index": 1,
+                                "checksum": hashlib.sha256(corrupted).hexdigest()},
+                          files={"chunk": ("chunk", corrupted)})
+    assert response.status_code == status.HTTP_200_OK
+    response = client.post("/dataset/upload/complete/", params={"upload_id": session.upload_id})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    response = client.get("/dataset/upload/status/", params={"upload_id": session.upload_id})
+    assert UploadSession.parse_obj(response.json()).received_chunks == list(range(len(chunks)))
+    response = client.put("/dataset/upload/chunk/",
+                          data={"upload_id": session.upload_id, "index": 1,
+                                "checksum": hashlib.sha256(chunks[1]).hexdigest()},
+                          files={"chunk": ("chunk", chunks[1])})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.post("/dataset/upload/complete/", params={"upload_id": session.upload_id})
+    assert response.status_code == status.HTTP_200_OK
+    assert isinstance(DatasetMetadata.parse_obj(response.json()), DatasetMetadata)
+
+    response = client.get("/dataset/upload/status/", params={"upload_id": session.upload_id})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.run(order=10)
+def test_dataset_remove_chunked_upload(cb_name: str, dsv: str, client: TestClient):
+    response = client.delete("/dataset/remove/", params={"cb_name": cb_name, "dataset_version": dsv})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == BooleanResponse(value=True)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+from starlette import status
+
+sys.path.append(str(os.getcwd()))
+from fastapi.testclient import TestClient
+
+from main import app
+from api.model import BooleanResponse, EmbeddingMetadata
+
+client = TestClient(app)
+
+
+def test_embedding_is_not_available():
+    response = client.get("/embedding/available/", params={"handle": "https://tfhub.dev/not/available/1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == BooleanResponse(value=False)
+
+
+def test_embedding_list():
+    response = client.get("/embedding/list/")
+    assert response.status_code == status.HTTP_200_OK
+    assert all(isinstance(EmbeddingMetadata.parse_obj(item), EmbeddingMetadata) for item in response.json())
+
+
+def test_remove_unavailable_embedding():
+    response = client.delete("/embedding/remove/", params={"handle": "https://tfhub.dev/not/available/1"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == BooleanResponse(value=False)
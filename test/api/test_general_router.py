@@ -16,3 +16,30 @@ def test_heartbeat():
     response = client.get("/heartbeat")
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == BooleanResponse(value=True)
+
+
+def test_metrics():
+    client.get("/heartbeat")
+    client.get("/not/a/route")
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    # latencies are recorded per route template and unknown paths share a single time series
+    assert 'cba_http_request_duration_seconds_count{method="GET",route="/heartbeat",status="200"}' in response.text
+    assert 'cba_http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}' in response.text
+
+
+def test_ready():
+    # the startup event of the app did not run
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json() == BooleanResponse(value=False)
+
+    app.state.started = True
+    try:
+        response = client.get("/ready")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == BooleanResponse(value=True)
+    finally:
+        del app.state.started
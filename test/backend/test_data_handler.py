@@ -1,12 +1,16 @@
+import hashlib
+import io
 import os
 import sys
+import zipfile
 
 sys.path.append(str(os.getcwd()))
 
 import pytest
+from fastapi import UploadFile
 
 from backend.data_handler import DataHandler
-from backend.exceptions import NoDataForCodebookException
+from backend.exceptions import NoDataForCodebookException, ErroneousArchiveException, DatasetNotAvailableException
 
 
 @pytest.fixture
@@ -34,3 +38,133 @@ def test_get_and_purge_data_directory(dh: DataHandler):
     dh._purge_data(cb2)
     assert not cb1_dir.exists()
     assert not cb2_dir.exists()
+
+
+def _zip_archive(files) -> io.BytesIO:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, content in files.items():
+            z.writestr(name, content)
+    archive.seek(0)
+    return archive
+
+
+def test_store_dataset_rejects_erroneous_archives(dh: DataHandler):
+    cb, dsv = "CB1", "ErroneousArchive"
+    zip_bomb = _zip_archive({"train.csv": b"\0" * 50_000_000, "test.csv": "text,label"})
+    traversal = _zip_archive({"../train.csv": "text,label", "test.csv": "text,label"})
+    missing_split = _zip_archive({"train.csv": "text,label"})
+
+    for archive in [zip_bomb, traversal, missing_split]:
+        with pytest.raises(ErroneousArchiveException):
+            dh.store_dataset(cb, UploadFile(filename="ds.zip", file=archive), dsv)
+        # nothing of the archive is kept
+        with pytest.raises(DatasetNotAvailableException):
+            dh.get_dataset_directory(cb, dsv)
+
+    dh._purge_data(cb)
+
+
+def test_store_dataset_deduplicates_files(dh: DataHandler):
+    files = {"train.csv": "text,label\nfoo,a\nbar,b", "test.csv": "text,label\nbaz,a"}
+    dh.store_dataset("CB1", UploadFile(filename="ds.zip", file=_zip_archive(files)), "v1")
+    dh.store_dataset("CB2", UploadFile(filename="ds.zip", file=_zip_archive(files)), "v1")
+
+    m1 = dh.get_dataset_manifest("CB1", "v1")
+    m2 = dh.get_dataset_manifest("CB2", "v1")
+    assert m1.content_hash == m2.content_hash
+    assert dh.get_dataset_cache_directory("CB1", "v1") == dh.get_dataset_cache_directory("CB2", "v1")
+
+    # both versions link the same object
+    train_csv = dh.get_dataset_directory("CB1", "v1").joinpath("train.csv")
+    obj = dh._get_cas_object(m1.files["train.csv"].sha256)
+    assert train_csv.samefile(dh.get_dataset_directory("CB2", "v1").joinpath("train.csv"))
+    assert train_csv.samefile(obj)
+
+    # objects are removed after the last dataset linking them is removed
+    dh._purge_data("CB1")
+    assert obj.exists()
+    dh._purge_data("CB2")
+    assert not obj.exists()
+
+
+def test_store_dataset_keeps_stored_version_if_overwrite_fails(dh: DataHandler):
+    old = {"train.csv": "text,label\nfoo,a\nbar,b", "test.csv": "text,label\nbaz,a"}
+    new = {"train.csv": "text,label\nqux,c", "test.csv": "text,label\nquux,c"}
+    dh.store_dataset("CB1", UploadFile(filename="ds.zip", file=_zip_archive(old)), "v1")
+    manifest = dh.get_dataset_manifest("CB1", "v1")
+
+    def invalid(staging_dir):
+        raise ValueError("invalid dataset")
+
+    for archive, validate in [(_zip_archive({"train.csv": "text,label"}), None), (_zip_archive(new), invalid)]:
+        with pytest.raises(Exception):
+            dh.store_dataset("CB1", UploadFile(filename="ds.zip", file=archive), "v1", validate=validate)
+        # the stored version and its objects are untouched and no staging directory is left over
+        assert dh.get_dataset_manifest("CB1", "v1") == manifest
+        assert dh.get_dataset_directory("CB1", "v1").joinpath("train.csv").read_text() == old["train.csv"]
+        assert dh._get_cas_object(manifest.files["train.csv"].sha256).exists()
+        assert [d.name for d in dh.get_dataset_directory("CB1", "v1").parent.iterdir()] == ["v1"]
+
+    # a valid overwrite replaces the version and the objects only it linked are removed
+    dh.store_dataset("CB1", UploadFile(filename="ds.zip", file=_zip_archive(new)), "v1")
+    assert dh.get_dataset_directory("CB1", "v1").joinpath("train.csv").read_text() == new["train.csv"]
+    assert not dh._get_cas_object(manifest.files["train.csv"].sha256).exists()
+
+    dh._purge_data("CB1")
+
+
+def test_store_model_keeps_stored_version_if_overwrite_fails(dh: DataHandler):
+    model = {"saved_model.pb": b"model", "variables/variables.index": b"index"}
+    dh.store_model("CB1", UploadFile(filename="model.zip", file=_zip_archive(model)), "v1")
+
+    traversal = _zip_archive({"saved_model.pb": b"other", "../variables.index": b"index"})
+    with pytest.raises(ErroneousArchiveException):
+        dh.store_model("CB1", UploadFile(filename="model.zip", file=traversal), "v1")
+
+    model_dir = dh.get_model_directory("CB1", "v1")
+    assert model_dir.joinpath("saved_model.pb").read_bytes() == b"model"
+    assert [d.name for d in model_dir.parent.iterdir()] == ["v1"]
+
+    dh._purge_data("CB1")
+
+
+def test_prune_model_directory(dh: DataHandler):
+    model_dir = dh.get_model_directory("CB1", "v1", create=True)
+    files = ["saved_model.pb", "variables/variables.index", "metadata.json", "graph.pbtxt", "events.out.tfevents.1",
+             "eval/events.out.tfevents.2", "best_checkpoint/model.ckpt-500.index"]
+    files += [f"model.ckpt-{step}.{ext}" for step in [0, 500, 1000] for ext in ["index", "data-00000-of-00001"]]
+    for f in files:
+        model_dir.joinpath(f).parent.mkdir(parents=True, exist_ok=True)
+        model_dir.joinpath(f).write_bytes(b"x" * 10)
+    model_dir.joinpath("checkpoint").write_text('model_checkpoint_path: "model.ckpt-1000"\n')
+
+    compaction = dh.prune_model_directory("CB1", "v1", keep_checkpoints=1)
+    assert compaction.removed_checkpoints == 2
+    assert compaction.bytes_freed == 8 * 10
+    assert sorted(str(f.relative_to(model_dir)) for f in model_dir.rglob("*") if f.is_file()) == \
+        ["checkpoint", "metadata.json", "model.ckpt-1000.data-00000-of-00001", "model.ckpt-1000.index",
+         "saved_model.pb", "variables/variables.index"]
+    assert "model.ckpt-500" not in model_dir.joinpath("checkpoint").read_text()
+
+    dh._purge_data("CB1")
+
+
+def test_share_model_files(dh: DataHandler):
+    shards = []
+    for cb in ["CB1", "CB2"]:
+        shard = dh.get_model_directory(cb, "v1", create=True).joinpath("variables", "variables.data-00000-of-00002")
+        shard.parent.mkdir()
+        shard.write_bytes(b"embedding" * 100)
+        shards.append(shard)
+
+    assert dh.share_model_files("CB1", "v1", [shards[0]]) == 0
+    assert dh.share_model_files("CB2", "v1", [shards[1]]) == 900
+    assert shards[0].samefile(shards[1])
+
+    # the shared object is removed with the last model linking it
+    dh.purge_model_directory("CB1", "v1")
+    assert shards[1].read_bytes() == b"embedding" * 100
+    dh._purge_data("CB1")
+    dh._purge_data("CB2")
+    assert not dh._get_cas_object(hashlib.sha256(b"embedding" * 100).hexdigest()).exists()
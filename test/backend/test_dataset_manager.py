@@ -0,0 +1,96 @@
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+
+sys.path.append(str(os.getcwd()))
+
+from backend import DatasetManager, DataHandler
+from backend.dataset_cache import SplitCache, build_split_cache
+from backend.dataset_statistics import build_dataset_statistics
+from backend.exceptions import ErroneousDatasetException, ErroneousArchiveException
+from config import conf
+
+
+def test_scan_csv_counts_labels_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(conf.backend.datasets, "csv_chunk_size", 2)
+    csv = tmp_path.joinpath("train.csv")
+    csv.write_text("text,label\nfoo,a\nbar,b\nbaz,a\n,b\nqux,a\n")
+
+    # rows with missing values are dropped
+    assert DatasetManager._scan_csv(csv, "cb").label_counts == {"a": 3, "b": 1}
+
+
+def test_scan_csv_rejects_wrong_number_of_columns(tmp_path):
+    csv = tmp_path.joinpath("train.csv")
+    csv.write_text("text,label,other\nfoo,a,x\n")
+
+    with pytest.raises(ErroneousDatasetException):
+        DatasetManager._scan_csv(csv, "cb")
+
+
+def test_dataset_statistics(tmp_path, monkeypatch):
+    monkeypatch.setattr(conf.backend.datasets, "csv_chunk_size", 2)
+    train_csv = tmp_path.joinpath("train.csv")
+    train_csv.write_text("text,label\nfoo bar,a\nbaz,b\nfoo bar,a\nqux quux corge,c\n")
+    test_csv = tmp_path.joinpath("test.csv")
+    test_csv.write_text("text,label\nbaz,b\nnew one,d\n")
+
+    train = DatasetManager._scan_csv(train_csv, "cb")
+    test = DatasetManager._scan_csv(test_csv, "cb")
+    stats = build_dataset_statistics("cb", "v1", train, test)
+
+    assert stats.train.num_samples == 4
+    assert stats.train.label_distribution == {"a": 0.5, "b": 0.25, "c": 0.25}
+    assert stats.train.num_duplicates == 2
+    assert stats.train.duplicate_rate == 0.5
+    assert stats.train.token_lengths.min == 1
+    assert stats.train.token_lengths.p50 == 2
+    assert stats.train.token_lengths.max == 3
+    assert stats.train.char_lengths.max == len("qux quux corge")
+    assert stats.shared_labels == ["b"]
+    assert stats.train_only_labels == ["a", "c"]
+    assert stats.test_only_labels == ["d"]
+    assert stats.num_test_samples_in_train == 1
+
+
+def test_split_cache(tmp_path):
+    csv = tmp_path.joinpath("test.csv")
+    csv.write_text("text,label\nfoo,a\nbär,b\nbaz,unknown\nqux,a\n")
+
+    num_cached, num_dropped = build_split_cache(csv, tmp_path, "test", {"a": 0, "b": 1}, chunk_size=2)
+    assert (num_cached, num_dropped) == (3, 1)
+
+    cache = SplitCache(tmp_path, "test")
+    assert len(cache) == 3
+    assert [cache.text(i).decode('utf-8') for i in range(len(cache))] == ["foo", "bär", "qux"]
+    assert list(cache.labels) == [0, 1, 0]
+
+
+def _upload(files) -> UploadFile:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        for name, content in files.items():
+            z.writestr(name, content)
+    archive.seek(0)
+    return UploadFile(filename="ds.zip", file=archive)
+
+
+def test_store_archive_keeps_stored_version_if_overwrite_fails():
+    cb = "StoreArchiveCB"
+    DatasetManager.store_archive(cb, "v1", _upload({"train.csv": "text,label\nfoo,a\nbar,b",
+                                                    "test.csv": "text,label\nbaz,a"}))
+
+    with pytest.raises(ErroneousArchiveException):
+        DatasetManager.store_archive(cb, "v1", _upload({"train.csv": "text,label\nfoo,a"}))
+    with pytest.raises(ErroneousDatasetException):
+        DatasetManager.store_archive(cb, "v1", _upload({"train.csv": "text,label,other\nfoo,a,x",
+                                                        "test.csv": "text,label\nbaz,a"}))
+
+    assert sorted(DatasetManager.get_metadata(cb, "v1").labels.values()) == ["a", "b"]
+    assert DatasetManager.get_statistics(cb, "v1").train.num_samples == 2
+
+    DataHandler._purge_data(cb)
@@ -0,0 +1,72 @@
+import os
+import pickle
+import sys
+
+sys.path.append(str(os.getcwd()))
+
+from prometheus_client import REGISTRY
+
+from api.model import TrainingStatus, TrainingState
+from backend import JobBroker
+from backend.db.job_broker import SharedDict, WORKER_WARMING_UP, WORKER_READY, PREDICTION_QUEUE, TRAINING_QUEUE
+
+
+def test_shared_dict_stores_pickled_values():
+    status = SharedDict("test:status")
+    status.clear()
+    status["mid"] = TrainingStatus(state=TrainingState.training)
+    status[42] = "mid"
+
+    # e.g. passed to a training process
+    same = pickle.loads(pickle.dumps(status))
+    assert same["mid"].state == TrainingState.training
+    assert 42 in same and len(same.values()) == 2
+    assert same.pop(42) == "mid" and same.get(42) is None
+    status.clear()
+
+
+def test_jobs_are_processed_in_order():
+    broker = JobBroker()
+    broker.push("test", "first")
+    broker.push("test", "second")
+    assert broker.queue_length("test") == 2
+    assert broker.pop("test", timeout=1) == "first"
+    assert broker.pop("test", timeout=1) == "second"
+    assert broker.pop("test", timeout=1) is None
+
+    job_id = broker.new_job_id()
+    broker.put_result(job_id, {"result": 1}, ttl=10)
+    assert broker.wait_for_result(job_id, timeout=1) == {"result": 1}
+    assert broker.wait_for_result(job_id, timeout=1) is None
+
+
+def test_queue_length_gauge():
+    broker = JobBroker()
+    broker.push(TRAINING_QUEUE, "job")
+    assert REGISTRY.get_sample_value("cba_job_queue_length", {"queue": TRAINING_QUEUE}) == 1
+    assert REGISTRY.get_sample_value("cba_job_queue_length", {"queue": PREDICTION_QUEUE}) == 0
+    assert broker.pop(TRAINING_QUEUE, timeout=1) == "job"
+    assert REGISTRY.get_sample_value("cba_job_queue_length", {"queue": TRAINING_QUEUE}) == 0
+
+
+def test_recently_used_models_and_worker_states():
+    broker = JobBroker()
+    for cb_name in ["A", "B", "A", "C"]:
+        broker.record_model_use(cb_name, "default", keep=2)
+    assert broker.list_recently_used_models(5) == [("C", "default"), ("A", "default")]
+
+    # all prediction workers of the worker services have to be ready
+    broker.report_worker_service("test", 2, ttl=10)
+    broker.report_worker_state("test:1", WORKER_WARMING_UP, ttl=10)
+    assert not broker.are_prediction_workers_ready()
+    broker.report_worker_state("test:1", WORKER_READY, ttl=10)
+    assert broker.list_worker_states()["test:1"] == WORKER_READY
+    assert not broker.are_prediction_workers_ready()
+    broker.report_worker_state("test:2", WORKER_READY, ttl=10)
+    assert broker.are_prediction_workers_ready()
+
+    broker.remove_worker_service("test")
+    assert broker.count_expected_prediction_workers() == 0
+    assert not broker.are_prediction_workers_ready()
+    broker.remove_worker_state("test:1")
+    broker.remove_worker_state("test:2")
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+sys.path.append(str(os.getcwd()))
+
+from backend.lazy_import import LazyModule, is_imported, ensure_imported
+
+
+def test_backend_does_not_import_tensorflow():
+    # in a fresh interpreter, because other tests import TensorFlow
+    code = "import sys, backend; print('tensorflow' in sys.modules, 'tensorflow_hub' in sys.modules)"
+    out = subprocess.check_output([sys.executable, "-c", code], cwd=os.getcwd(), stderr=subprocess.DEVNULL)
+    assert out.decode().split() == ["False", "False"]
+
+
+def test_module_is_imported_on_first_access():
+    sys.modules.pop("colorsys", None)
+    colorsys = LazyModule("colorsys")
+    assert not is_imported(colorsys)
+    assert colorsys.rgb_to_hsv(1., 0., 0.) == (0., 1., 1.)
+    assert is_imported(colorsys)
+
+    sys.modules.pop("colorsys")
+    ensure_imported(colorsys)
+    assert is_imported(colorsys)
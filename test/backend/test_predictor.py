@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(str(os.getcwd()))
+
+from api.model import ProbabilityOutputOptions
+from backend import Predictor
+from backend.exceptions import ErroneousMappingException
+
+
+def test_select_probabilities():
+    probs = np.array([[0.1, 0.5, 0.3, 0.1],
+                      [0.7, 0.05, 0.05, 0.2]])
+
+    selected = Predictor._select_probabilities(probs, ProbabilityOutputOptions(top_k=2))
+    assert selected.tolist() == [[False, True, True, False], [True, False, False, True]]
+
+    selected = Predictor._select_probabilities(probs, ProbabilityOutputOptions(top_k=2, min_probability=0.25))
+    assert selected.tolist() == [[False, True, True, False], [True, False, False, False]]
+
+    selected = Predictor._select_probabilities(probs, ProbabilityOutputOptions(argmax_only=True))
+    assert selected.tolist() == [[False, True, False, False], [True, False, False, False]]
+
+    # all probabilities by default
+    assert Predictor._select_probabilities(probs, ProbabilityOutputOptions()).all()
+
+
+def test_compile_mapping():
+    classes = ("a", "b", "c")
+    mapping = (("tag_c", "c"), ("tag_a", "a"), ("tag_b", "b"))
+    tags, class_of_tag, tag_of_class = Predictor._compile_mapping("CB", "default", classes, mapping)
+    assert tags == ("tag_c", "tag_a", "tag_b")
+    probs = np.array([[0.2, 0.3, 0.5]])
+    assert probs[:, class_of_tag].tolist() == [[0.5, 0.2, 0.3]]
+    assert [tags[idx] for idx in tag_of_class] == ["tag_a", "tag_b", "tag_c"]
+    # cached
+    assert Predictor._compile_mapping("CB", "default", classes, mapping)[1] is class_of_tag
+
+    with pytest.raises(ErroneousMappingException):
+        Predictor._compile_mapping("CB", "default", classes, (("tag_a", "a"), ("tag_b", "a"), ("tag_c", "c")))
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.append(str(os.getcwd()))
+
+import pytest
+
+from api.model import ProfilingRequest, ProfilingTarget
+from backend import DataHandler, Profiler, ModelManager
+from backend.exceptions import ProfileNotAvailableException
+
+
+def test_profiling_session_applies_to_next_training():
+    req = ProfilingRequest(cb_name="CB1", model_version="v1", target=ProfilingTarget.training)
+    Profiler.start_session(req)
+    assert Profiler.take(ProfilingTarget.prediction, "CB1", "v1") is None
+    assert Profiler.take(ProfilingTarget.training, "CB1", "v1") == req
+    # a session for a training applies to the next training only
+    assert Profiler.take(ProfilingTarget.training, "CB1", "v1") is None
+    assert Profiler.list_sessions() == []
+
+
+def test_profiling_session_counts_predictions(monkeypatch):
+    # sessions for predictions can only be started for available models
+    monkeypatch.setattr(ModelManager, "is_available", staticmethod(lambda cb_name, model_version: True))
+    req = ProfilingRequest(cb_name="CB1", model_version="v1", target=ProfilingTarget.prediction, num_predictions=2)
+    Profiler.start_session(req)
+    assert Profiler.take(ProfilingTarget.training, "CB1", "v1") is None
+    assert Profiler.take(ProfilingTarget.prediction, "CB1", "v1") == req
+    assert len(Profiler.list_sessions()) == 1
+    assert Profiler.take(ProfilingTarget.prediction, "CB1", "v1") == req
+    # the session is consumed after num_predictions predictions
+    assert Profiler.take(ProfilingTarget.prediction, "CB1", "v1") is None
+    assert Profiler.list_sessions() == []
+
+
+def test_profile_is_stored_next_to_model():
+    DataHandler.get_model_directory("CB1", "v1", create=True)
+    req = ProfilingRequest(cb_name="CB1", model_version="v1", target=ProfilingTarget.training,
+                           tensorflow_profiler=False)
+    with Profiler.profile(req):
+        sorted(range(1000))
+
+    profiles = Profiler.list_profiles("CB1", "v1")
+    assert len(profiles) == 1 and profiles[0].target == ProfilingTarget.training
+    assert profiles[0].files == ["python.prof", "python.txt"]
+    assert Profiler.get_archive("CB1", "v1", profiles[0].name).size > profiles[0].size
+
+    with pytest.raises(ProfileNotAvailableException):
+        Profiler.get_archive("CB1", "v1", "../../v1")
+    Profiler.remove("CB1", "v1", profiles[0].name)
+    assert Profiler.list_profiles("CB1", "v1") == []
+
+    DataHandler._purge_data("CB1")
@@ -0,0 +1,59 @@
+import json
+import multiprocessing
+import os
+import sys
+
+sys.path.append(str(os.getcwd()))
+
+from backend import tracing
+from config import conf
+
+
+def _load_model(queue: multiprocessing.Queue):
+    # runs in a forked prediction process, which inherits a copy of the trace and of its current span
+    with tracing.collect_spans() as spans:
+        with tracing.span("model.load", variant="optimized"):
+            pass
+    queue.put(spans)
+
+
+def test_spans_are_nested_and_exported(tmp_path):
+    export_file = tmp_path.joinpath("traces.jsonl")
+    conf.backend.tracing.export_file = str(export_file)
+    ctx = multiprocessing.get_context("fork")
+    try:
+        with tracing.trace("POST /prediction/single") as t:
+            with tracing.span("predictor.process") as process:
+                # the spans of the prediction process are sent back pickled
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_load_model, args=(queue,))
+                proc.start()
+                spans = queue.get(timeout=30)
+                proc.join()
+            tracing.add_spans(spans)
+            tracing.add_span("predictor.spawn_process", process.start_ns, process.start_ns + 1000000)
+    finally:
+        conf.backend.tracing.export_file = ""
+
+    assert [name for name, _ in t.phases()] == ["predictor.process", "predictor.spawn_process", "model.load"]
+    assert len(spans) == 1 and spans[0].parent_id == process.span_id
+
+    otlp = json.loads(export_file.read_text().splitlines()[0])
+    otlp_spans = {s["name"]: s for s in otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert len(otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]) == len(otlp_spans) == 4
+    assert len({s["traceId"] for s in otlp_spans.values()}) == 1
+
+    root = otlp_spans["POST /prediction/single"]
+    assert root["kind"] == 2 and "parentSpanId" not in root
+    assert otlp_spans["predictor.process"]["parentSpanId"] == root["spanId"]
+    assert otlp_spans["predictor.spawn_process"]["parentSpanId"] == root["spanId"]
+    assert otlp_spans["model.load"]["parentSpanId"] == otlp_spans["predictor.process"]["spanId"]
+    assert {"key": "variant", "value": {"stringValue": "optimized"}} in otlp_spans["model.load"]["attributes"]
+
+
+def test_spans_outside_of_traces_are_not_recorded():
+    with tracing.span("model.load") as s:
+        assert s is None
+    with tracing.collect_spans() as spans:
+        tracing.add_span("predictor.spawn_process", 0, 1)
+    assert spans == []
@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import time
+
+sys.path.append(str(os.getcwd()))
+
+import pytest
+from pydantic import ValidationError
+
+from api.model import EarlyStoppingMetric, TrainingRequest, ModelConfig
+from backend.exceptions import TrainingError
+from backend.training import trainer
+from backend.training.trainer import _is_improvement, _build_tf_configs, _scaling_efficiency, PerformanceRecorder, \
+    train_with_early_stopping
+
+
+def test_early_stopping_improvement():
+    # the first evaluation is always an improvement
+    assert _is_improvement(1.0, None, EarlyStoppingMetric.loss, 0.0)
+
+    # losses have to decrease by more than min delta
+    assert _is_improvement(0.5, 0.6, EarlyStoppingMetric.loss, 0.01)
+    assert not _is_improvement(0.595, 0.6, EarlyStoppingMetric.loss, 0.01)
+    assert not _is_improvement(0.7, 0.6, EarlyStoppingMetric.average_loss, 0.0)
+
+    # accuracy has to increase by more than min delta
+    assert _is_improvement(0.8, 0.7, EarlyStoppingMetric.accuracy, 0.01)
+    assert not _is_improvement(0.705, 0.7, EarlyStoppingMetric.accuracy, 0.01)
+    assert not _is_improvement(0.6, 0.7, EarlyStoppingMetric.accuracy, 0.0)
+
+
+class _StubEstimator(object):
+    """
+    Estimator whose validation losses are scripted. A training runs until max_steps.
+    """
+
+    def __init__(self, losses):
+        self.losses = list(losses)
+        self.max_steps = []
+        self.step = 0
+
+    def train(self, input_fn, max_steps):
+        self.max_steps.append(max_steps)
+        self.step = max_steps
+
+    def evaluate(self, input_fn, name):
+        return {"global_step": self.step, "loss": self.losses.pop(0)}
+
+    def latest_checkpoint(self):
+        return f"model.ckpt-{self.step}"
+
+
+def test_train_with_early_stopping(monkeypatch):
+    monkeypatch.setattr(trainer.DataHandler, "snapshot_checkpoint",
+                        staticmethod(lambda cb_name, model_version, checkpoint: f"best/{checkpoint}"))
+    mconf = ModelConfig(early_stopping=True, early_stopping_eval_interval=10, early_stopping_patience=2)
+    req = TrainingRequest(cb_name="cb", model_config=mconf, max_steps_train=100)
+
+    # stops after two evaluations without improvement
+    model = _StubEstimator([1.0, 0.8, 0.85, 0.8, 0.5])
+    assert train_with_early_stopping(model, req, "mid", PerformanceRecorder()) == ("best/model.ckpt-20", 40, 20)
+    assert model.max_steps == [10, 20, 30, 40]
+
+    # the last interval is capped at max_steps_train
+    model = _StubEstimator([1.0, 0.9, 0.8, 0.7])
+    req = req.copy(update={"model_config": mconf.copy(update={"early_stopping_eval_interval": 30})})
+    assert train_with_early_stopping(model, req, "mid", PerformanceRecorder()) == ("best/model.ckpt-100", 100, 100)
+    assert model.max_steps == [30, 60, 90, 100]
+
+
+def test_build_tf_configs():
+    tf_configs = [json.loads(c) for c in _build_tf_configs(3)]
+
+    # all workers share the cluster with a distinct local port per worker, the first one is the chief
+    workers = tf_configs[0]["cluster"]["worker"]
+    assert all(c["cluster"] == {"worker": workers} for c in tf_configs)
+    assert len({int(w.split(":")[1]) for w in workers}) == 3 and all(w.startswith("localhost:") for w in workers)
+    assert [c["task"] for c in tf_configs] == [{"type": "worker", "index": i} for i in range(3)]
+
+
+def test_scaling_efficiency():
+    # every worker processes a batch per step, so equal step rates are perfect scaling
+    assert _scaling_efficiency(10., 10.) == 1.
+    assert _scaling_efficiency(7.5, 10.) == 0.75
+    assert _scaling_efficiency(None, 10.) is None
+    assert _scaling_efficiency(10., None) is None
+    assert _scaling_efficiency(10., 0.) is None
+
+
+def _fake_train_worker(req, n_classes, tf_config, index, results):
+    results.put((index, 10. + index))
+
+
+def _failing_train_worker(req, n_classes, tf_config, index, results):
+    if index == 1:
+        sys.exit(1)
+    # waits for the failed worker like a worker of a real cluster
+    time.sleep(60)
+
+
+def test_train_data_parallel(monkeypatch):
+    with pytest.raises(ValidationError):
+        TrainingRequest(cb_name="cb", model_config=ModelConfig(), num_workers=0)
+    req = TrainingRequest(cb_name="cb", model_config=ModelConfig(), num_workers=2)
+
+    # the steps per second of the chief are returned
+    monkeypatch.setattr(trainer, "train_worker", _fake_train_worker)
+    recorder = PerformanceRecorder()
+    assert trainer.train_data_parallel(req, 2, "mid", recorder) == 10.
+    assert recorder.train_seconds > 0
+
+    # the other workers are stopped if a worker fails
+    monkeypatch.setattr(trainer, "train_worker", _failing_train_worker)
+    start = time.perf_counter()
+    with pytest.raises(TrainingError):
+        trainer.train_data_parallel(req, 2, "mid", PerformanceRecorder())
+    assert time.perf_counter() - start < 30
+
+
+def _allocating_train_worker(req, n_classes, tf_config, index, results):
+    if index == 1:
+        # the memory is written, so that it is resident
+        data = b"x" * (256 * 2 ** 20)
+        del data
+    results.put((index, 10.))
+
+
+def test_data_parallel_peak_rss(monkeypatch):
+    monkeypatch.setattr(trainer, "train_worker", _allocating_train_worker)
+    req = TrainingRequest(cb_name="cb", model_config=ModelConfig(), num_workers=2)
+    recorder = PerformanceRecorder()
+    trainer.train_data_parallel(req, 2, "mid", recorder)
+
+    # the peak resident set size of the training includes the workers
+    assert recorder.worker_peak_rss >= 256 * 2 ** 20
+    performance = recorder.build_performance(train_steps=10, examples_per_step=64, model_size=1, num_workers=2)
+    assert performance.peak_rss >= recorder.worker_peak_rss
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.append(str(os.getcwd()))
+
+from backend import DataHandler, ModelManager
+from backend.worker import ModelCache
+
+
+def test_model_cache_evicts_least_recently_used_model(monkeypatch):
+    loaded = []
+
+    def load(cb_name, model_version="default", optimized=True):
+        loaded.append(model_version)
+        return object()
+
+    monkeypatch.setattr(ModelManager, "load", load)
+    for version in ["v1", "v2", "v3"]:
+        DataHandler.get_model_directory("CB1", version, create=True).joinpath("saved_model.pb").write_bytes(b"")
+
+    cache = ModelCache(capacity=2)
+    model, was_loaded, evicted = cache.get("CB1", "v1")
+    assert was_loaded and evicted == 0
+    assert cache.get("CB1", "v1") == (model, False, 0)
+    cache.get("CB1", "v2")
+    # v1 was used more recently than v2
+    cache.get("CB1", "v1")
+    assert cache.get("CB1", "v3")[1:] == (True, 1)
+    assert ("CB1", "v1") in cache and ("CB1", "v2") not in cache and len(cache) == 2
+
+    # a model that was trained again gets loaded again
+    saved_model = DataHandler.get_model_directory("CB1", "v1").joinpath("saved_model.pb")
+    os.utime(saved_model, ns=(0, saved_model.stat().st_mtime_ns + 1))
+    assert cache.get("CB1", "v1")[1]
+    assert loaded == ["v1", "v2", "v3", "v1"]
+
+    DataHandler._purge_data("CB1")
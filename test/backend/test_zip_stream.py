@@ -0,0 +1,43 @@
+import io
+import os
+import sys
+import zipfile
+
+sys.path.append(str(os.getcwd()))
+
+import pytest
+
+from backend.zip_stream import ZipStream
+
+
+@pytest.fixture
+def files(tmp_path):
+    tmp_path.joinpath("variables").mkdir()
+    files = {"saved_model.pb": os.urandom(3000), "variables/variables.index": b"", "metadata.json": b"{}"}
+    for name, content in files.items():
+        tmp_path.joinpath(name).write_bytes(content)
+    return [(name, tmp_path.joinpath(name)) for name in files]
+
+
+def test_zip_stream_is_valid_archive(files):
+    stream = ZipStream(files, chunk_size=1000)
+    archive = b"".join(stream)
+    assert len(archive) == stream.size
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert z.testzip() is None
+        assert z.namelist() == ["saved_model.pb", "variables/variables.index", "metadata.json"]
+        for name in z.namelist():
+            assert z.read(name) == dict(files)[name].read_bytes()
+
+
+def test_zip_stream_ranges(files):
+    archive = b"".join(ZipStream(files))
+
+    # the ranges of fresh streams add up to the complete archive, even if the data of a member gets split
+    ranges = [(0, 10), (10, 2000), (2000, 3100), (3100, len(archive))]
+    assert b"".join(b"".join(ZipStream(files, chunk_size=1000).iter_range(start, stop))
+                    for start, stop in ranges) == archive
+
+    # the central directory can be served without streaming the data before
+    assert b"".join(ZipStream(files).iter_range(len(archive) - 100)) == archive[-100:]
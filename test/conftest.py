@@ -3,7 +3,8 @@ import sys
 
 sys.path.append(str(os.getcwd()))
 
-from backend import DataHandler, RedisHandler, DatasetManager, ModelFactory, ModelManager, Predictor, Trainer
+from backend import DataHandler, RedisHandler, DatasetManager, ModelFactory, ModelManager, Predictor, Trainer, \
+    EmbeddingManager
 
 
 def pytest_runtest_setup(item):
@@ -14,6 +15,7 @@ def pytest_runtest_setup(item):
         DataHandler()
         RedisHandler()
         DatasetManager()
+        EmbeddingManager()
         ModelFactory()
         ModelManager()
         Predictor()